@@ -1,111 +1,42 @@
 # Ketron EVM Arranger Controller - Plus
 
-import board, displayio, digitalio
-import terminalio
+# Boot profile: (stage, time.monotonic_ns(), gc.mem_free()) at the end of each startup stage, see BootProfile
 import time
+import gc
+boot_marks = [("Boot", time.monotonic_ns(), gc.mem_free())]
+
+import board
+import supervisor
 
-from adafruit_display_text import bitmap_label as label
-from adafruit_displayio_layout.layouts.grid_layout import GridLayout
 from adafruit_macropad import MacroPad
+boot_marks.append(("Libraries", time.monotonic_ns(), gc.mem_free()))
 
-import usb_midi
-import adafruit_midi
-from adafruit_midi.control_change import ControlChange
-from adafruit_midi.note_off import NoteOff
-from adafruit_midi.note_on import NoteOn
-from adafruit_midi.system_exclusive import SystemExclusive
+# Shared core, see lib/evmcore.py. The controller itself is evmcore.EVMController
+import evmcore
+from evmcore import (MIDIType, ShiftKeyMode, ticks_diff, SliderCC, DeviceProfile, LoopStage)
+boot_marks.append(("Core", time.monotonic_ns(), gc.mem_free()))
 
 from rainbowio import colorwheel
 
-import adafruit_seesaw.digitalio
-import adafruit_seesaw.neopixel
-import adafruit_seesaw.rotaryio
-import adafruit_seesaw.seesaw
-
 # Set to FALSE for no startup test
 TEST_CONNECT = False
 
 # --- Constants and Enums ---
-class EncoderMode:
-    ROTOR = 0
-    TEMPO = 1
-    VOLUME = 2
-    VALUE = 3
-
-class MIDIType:
-    PEDAL = 0
-    TAB = 1
-    MACRO = 2
-    
-class MIDIStatus:
-    OFF = 0x00
-    ON = 0x7F
-
-class EncoderMode:
-    ROTOR = 0
-    TEMPO = 1
-    VOLUME = 2
-    VALUE = 3
-
-class ShiftKeyMode:
-    OFF = 0
-    PENDING = 1
-    ACTIVE_SHIFT = 2
-    ACTIVE_LOCK = 3
-
-class EFXLevel:
-    Voice1 = 0x07
-    Voice2 = 0x3D
-    RealChord = 0x08
-    LeftGM = 0x3F
-
-# Manage Control Panel Volume Sliders via midi CC
-class SliderCC:
-    PLAYER_CC = 0x66   #CC 102
-    STYLE_CC = 0x67
-    DRUM_CC = 0x68
-    BASS_CC = 0x69
-    CHORD_CC = 0x6A
-    REALCHORD_CC = 0x6B
-    LOWERS_CC = 0x6C
-    USER2_CC = 0x6D
-    USER3_CC = 0x6E
-    VOICE1_CC = 0x72     #CC 114
-    VOICE2_CC = 0x73
-    DRAWBARS_CC = 0x74
-    MICRO1_CC = 0x75
-    VOCAL_CC = 0x76
-
-class Colors:
-    WHITE = 0x606060
-    BLUE = 0x000020
-    GREEN = 0x002000
-    RED = 0x200000
-    ORANGE = 0x701E02
-    PURPLE = 0x800080
-    YELLOW = 0x808000
-    TEAL = 0x004040
-    OFFWHITE = 0xA47474
+class SwitchEvent:
+    NONE = 0
+    PRESS = 1
+    RELEASE = 2
+    LONG = 3
+
 
-# Color mapping dictionary
-COLOR_MAP = {
-    'red': Colors.RED,
-    'green': Colors.GREEN,
-    'blue': Colors.BLUE,
-    'purple': Colors.PURPLE,
-    'yellow': Colors.YELLOW,
-    'orange': Colors.ORANGE,
-    'white': Colors.WHITE,
-    'teal': Colors.TEAL,
-    'offwhite': Colors.OFFWHITE
-}
-
-# Key used to trigger test tune
-TUNE_KEY = 11
+class Colors(evmcore.Colors):
+    OFFWHITE = 0xA47474
 
 # --- Configuration Class ---
-class EVMConfig:
+class EVMConfig(evmcore.EVMConfig):
     def __init__(self):
+        super().__init__()
+
         #self.display_banner =     "   Ketron EVM Plus   "
         #self.display_sub_banner = "Arranger Controller "
         #self.version = "1.2"
@@ -113,26 +44,13 @@ class EVMConfig:
         self.display_sub_banner = "Pad Controller   "
         self.version = "1.2.0"
 
-        # USB port on the left side of the MacroPad
-        self.usb_left = True
+        self.colors = Colors
 
-        # MIDI Out Channel to be matched in EVM Global RX
-        self.midi_out_channel = 15
-        
-        # Key used to reflect timed Eccoder mode changes on LED
-        # Enable or disable Layer Shift Mode for users who prefer single layer only 
-        self.key_variation = 0
-        self.shift_enable = True
-
-        # Timers for tempo, volume, key brightness, etc
-        self.key_bright_timer = 0.20
-        self.shift_hold_timer = 0.25
-
-        self.tempo_timer = 60
-        self.volume_timer = 60
-        self.value_timer = 60
-        self.version_timer = 15
-        self.tune_hold_timer = 2
+        # Default encoder acceleration profile for quad encoders
+        self.accel_quad = ""
+
+        # Scene snapshot slots of all slider volumes, captured with SNAP1.. and recalled with SCENE1.. Bank (4) keys
+        self.scene_slots = 8
         
         # Quad Encoder configs loaded from keymap.cfg
         self.is_quadencoder = True
@@ -141,147 +59,35 @@ class EVMConfig:
         self.encoder_grad = False
         self.encoder_vol = 96
 
-        self.quad_switch_timer = .5
-        
-        # Quad encoder variables
-        self.quad_encoders = []
-        self.quad_switches = []
-        self.quad_switches_toggle = []
-        self.quad_pixels = []
-
-        # Initialize MacroPad key mappings
-        self.key_map = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
-        if not self.usb_left:
-            self.key_map = [11 - i for i in range(12)]
-
-    def get_key(self, key):
-        """Safe key mapping with bounds checking"""
-        
-        if key < 0 or key > 11:
-            print("Invalid key map request: {}".format(key))
-            return 0
-        return self.key_map[key]
-
-# --- MIDI Handler Class ---
-class MIDIHandler:
-    def __init__(self, midi_instance, config, key_cache):
-        self.midi = midi_instance
-        self.config = config
-        self.key_cache = key_cache
-        
-        self.manufacturer_id_pedal = bytearray([0x26, 0x79])
-        self.manufacturer_id_tab = bytearray([0x26, 0x7C])
-        self.manufacturer_id_efx = bytearray([0x26, 0x7B])
-        
-        # Pre-allocate bytearrays for memory efficiency
-        self.pedal_sysex_1 = bytearray([0x03, 0x00, 0x00])
-        self.pedal_sysex_2 = bytearray([0x05, 0x00, 0x00, 0x00])
-        self.tab_sysex = bytearray([0x00, 0x00])
+        # Soft takeover: hold quad encoder volumes until they reach the slider value learned from the EVM
+        self.encoder_pickup = False
 
-        # EFX Level/Volume
-        self.efx_level_sysex = bytearray([0x00, 0x05, 0x00])
+        # Quad encoder switch debounce and long press in milliseconds
+        self.quad_debounce = 20
+        self.quad_long_press = 800
 
-        self.cur_volume = 100
+        # Quad encoder boards chained on the STEMMA QT I2C bus, 4 encoders each, numbered in address order
+        self.quad_max_boards = 4
+        self.quad_max_encoders = self.quad_max_boards * 4
 
-    def send_pedal_sysex(self, midi_value):
-        """Send SysEx for Pedal commands"""
-        
-        try:
-            # Send ON followed by OFF Message
-            if midi_value < 128:
-                self.pedal_sysex_1[1] = midi_value
-                self.pedal_sysex_1[2] = MIDIStatus.ON
-                sysex_message = SystemExclusive(self.manufacturer_id_pedal, self.pedal_sysex_1)
-                self.midi.send(sysex_message)
-
-                self.pedal_sysex_1[2] = MIDIStatus.OFF
-                sysex_message = SystemExclusive(self.manufacturer_id_pedal, self.pedal_sysex_1)
-                self.midi.send(sysex_message)
-            else:
-                self.pedal_sysex_2[1] = (midi_value >> 7) & 0x7F
-                self.pedal_sysex_2[2] = midi_value & 0x7F
-                self.pedal_sysex_2[3] = MIDIStatus.ON
-                sysex_message = SystemExclusive(self.manufacturer_id_pedal, self.pedal_sysex_2)
-                self.midi.send(sysex_message)
-
-                self.pedal_sysex_2[3] = MIDIStatus.OFF
-                sysex_message = SystemExclusive(self.manufacturer_id_pedal, self.pedal_sysex_2)
-                self.midi.send(sysex_message)
-            return True
-        except Exception as e:
-            print("Error sending pedal SysEx: {}".format(e))
-            return False
-
-    def send_tab_sysex(self, midi_value):
-        """Send SysEx for Tab commands"""
-        
-        try:
-            self.tab_sysex[0] = midi_value
-            self.tab_sysex[1] = MIDIStatus.ON
-            sysex_message = SystemExclusive(self.manufacturer_id_tab, self.tab_sysex)
-            self.midi.send(sysex_message)
-
-            self.tab_sysex[1] = MIDIStatus.OFF
-            sysex_message = SystemExclusive(self.manufacturer_id_tab, self.tab_sysex)
-            self.midi.send(sysex_message)
-            return True
-        except Exception as e:
-            print("Error sending tab SysEx: {}".format(e))
-            return False
-
-    def send_macro_sysex(self, midi_key):
-        """Send one or more macro list values as SysEx Pedal or Tab message(s)"""
-
-        try:
-            
-            for macro, items in self.key_cache.user_macro_midis.items():
-                #print(f"Macro: {macro}")
-                if macro == midi_key:
-                    for item in items:
-                        #print(f"  - {item}")
-                        if ':' in item:
-                            macro_parts = item.split(':')
-                            #print(f"macro_parts: {macro_parts}")
-                            if len(macro_parts) >= 2:
-                                lookup_key = int(macro_parts[0].strip())
-                                value = macro_parts[1].strip()
-
-                                if lookup_key == MIDIType.PEDAL:
-                                    hex_value = self.key_cache.pedal_midis.get(value, "")
-                                    if hex_value:
-                                        self.send_pedal_sysex(hex_value)
-                                elif lookup_key == MIDIType.TAB:
-                                    hex_value = self.key_cache.tab_midis.get(value, "")                            
-                                    if hex_value:
-                                        self.send_tab_sysex(hex_value)
-            return True
-        except Exception as e:
-            print("Error sending macros SysEx: {}".format(e))
-            return False
+        # Probe interval in milliseconds for missing quad encoder boards, doubled after every failed probe
+        self.quad_retry_min = 500
+        self.quad_retry_max = 16000
 
-    def send_master_volume(self, config, updown):
-        """Send volume control via CC11"""
-        self.config = config
-        
-        try:
-            # Change volume in 8-unit increments
-            if updown == -1:
-                self.cur_volume = max(0, self.cur_volume - 8)
-            else:
-                self.cur_volume = min(127, self.cur_volume + 8)
+# --- MIDI Handler Class ---
+class MIDIHandler(evmcore.MIDIHandler):
+    def __init__(self, midi_instance, midi_out, config, key_cache):
+        super().__init__(midi_instance, midi_out, config, key_cache)
 
-            self.midi.send(ControlChange(11, self.cur_volume), channel=self.config.midi_out_channel)
-            return True
-        except Exception as e:
-            print("Error sending volume: {}".format(e))
-            return False
+        # EFX Level/Volume, manufacturer ID 0x26 0x7B
+        self.efx_level_sysex = bytearray([0xF0, 0x26, 0x7B, 0x00, 0x05, 0x00, 0xF7])
 
     def send_quad_volume(self, config, volume):
         """Send volume CC for Quad Encoder on special EVM CCs"""
         self.config = config
         
         try:
-            self.midi.send(ControlChange(11, volume), self.config.midi_out_channel)
+            self.send_control_change(11, volume, self.config.midi_out_channel)
         except Exception as e:
             print("Error sending volume: {}".format(e))
             return False        
@@ -290,7 +96,7 @@ class MIDIHandler:
         """Send volume CC for Quad Encoder configured channels"""
         
         try:
-            self.midi.send(ControlChange(ccCode, volume), midi_channel)
+            self.send_control_change(ccCode, volume, midi_channel)
         except Exception as e:
             print("Error sending volume: {}".format(e))
             return False        
@@ -299,1391 +105,883 @@ class MIDIHandler:
         """Send SysEx EFX Level/Volume commands"""
         
         try:
-            self.efx_level_sysex[0] = efxcode
-            self.efx_level_sysex[2] = volume
-            sysex_message = SystemExclusive(self.manufacturer_id_efx, self.efx_level_sysex)
-            self.midi.send(sysex_message)
+            self.efx_level_sysex[3] = efxcode
+            self.efx_level_sysex[5] = volume
+            self.midi_out.write(self.efx_level_sysex, 7)
 
             return True
         except Exception as e:
             print("Error sending EFX Level SysEx: {}".format(e))
             return False
 
-    def test_connectivity(self):
-        """Test MIDI connectivity with audible notes"""
-        
-        try:
-            # Notes for a short segment of "Ode to Joy"
-            # Using MIDI note numbers (C4=60, D4=62, E4=64, F4=65, G4=67, A4=69, B4=71, C5=72)
-            notes = [64, 64, 65, 67, 67, 65, 64, 62, 60, 60, 62, 64, 64, 62, 62] 
-            durations = [0.4] * len(notes)       
-
-            for note, duration in zip(notes, durations):
-                self.midi.send(NoteOn(note, 120))
-                time.sleep(duration)
-                self.midi.send(NoteOff(note, 0))
-                time.sleep(duration/4)
-            return True
-        except Exception as e:
-            print("MIDI test failed: {}".format(e))
-            return False
+# --- Quad Switch Debouncer ---
+class SwitchDebouncer:
+    """Edge detecting debouncer for active low switches read together as one GPIO bit mask.
+    A change is taken on its first edge, then bounces are ignored for debounce_ms.
+    update() leaves one SwitchEvent per switch in events, NONE when nothing happened.
+    long_sent stays set until the next press, so a RELEASE can tell whether LONG came first"""
+
+    def __init__(self, pins, debounce_ms, long_press_ms):
+        self.pins = pins
+        self.debounce_ms = debounce_ms
+        self.long_press_ms = long_press_ms
+
+        self.mask = 0
+        for pin in pins:
+            self.mask |= 1 << pin
+
+        # Preallocated per switch state, nothing is allocated by update()
+        count = len(pins)
+        self.pressed = bytearray(count)
+        self.long_sent = bytearray(count)
+        self.events = bytearray(count)
+        self.change_ticks = [0] * count
+
+    def update(self, bits, ticks_now):
+        """Detect press, release and long press edges from one bulk read of the switch pins"""
+
+        for i in range(len(self.pins)):
+            self.events[i] = SwitchEvent.NONE
+            pressed = 0 if bits & (1 << self.pins[i]) else 1
+            held_ms = ticks_diff(ticks_now, self.change_ticks[i])
+
+            if pressed != self.pressed[i]:
+                if held_ms >= self.debounce_ms:
+                    self.pressed[i] = pressed
+                    if pressed:
+                        self.long_sent[i] = 0
+                    self.change_ticks[i] = ticks_now
+                    self.events[i] = SwitchEvent.PRESS if pressed else SwitchEvent.RELEASE
+            elif pressed and not self.long_sent[i] and held_ms >= self.long_press_ms:
+                self.long_sent[i] = 1
+                self.events[i] = SwitchEvent.LONG
+
+# --- Quad Encoder Board ---
+class QuadBoard:
+    """One Adafruit I2C Quad Rotary Encoder board with 4 encoders, their switches and 4 NeoPixels.
+    Its encoders are first to first + 3 in the flat quad encoder numbering"""
+
+    FIRST_ADDRESS = 0x49
+    LAST_ADDRESS = 0x50
+    PRODUCT_ID = 5752
+    # Seesaw pins of the switches of encoders 0 to 3, so switch i is the switch of encoder i
+    SWITCH_PINS = (12, 14, 17, 9)
+
+    def __init__(self, i2c, address, first, config, reset=True):
+        self.address = address
+        self.first = first
+
+        # The seesaw libraries are only imported once a board answers on the bus
+        import adafruit_seesaw.neopixel
+        import adafruit_seesaw.rotaryio
+        import adafruit_seesaw.seesaw
+
+        # The reset takes 0.5s, skipped when a board is attached while playing as it just powered up
+        self.seesaw = adafruit_seesaw.seesaw.Seesaw(i2c, address, reset=reset)
+        product_id = (self.seesaw.get_version() >> 16) & 0xFFFF
+        if product_id != self.PRODUCT_ID:
+            raise ValueError("Not a quad encoder board: product {}".format(product_id))
+
+        self.encoders = [adafruit_seesaw.rotaryio.IncrementalEncoder(self.seesaw, n) for n in range(4)]
+
+        # Encoder switches with pullups, read together in one bulk GPIO read
+        self.switches = SwitchDebouncer(self.SWITCH_PINS, config.quad_debounce, config.quad_long_press)
+        self.seesaw.pin_mode_bulk(self.switches.mask, self.seesaw.INPUT_PULLUP)
+
+        # Encoder positions, filled by read_positions()
+        self.positions = [0, 0, 0, 0]
+
+        # four neopixels per PCB
+        self.pixels = adafruit_seesaw.neopixel.NeoPixel(self.seesaw, 18, 4)
+        self.pixels.brightness = 0.5
+
+    def read_positions(self):
+        """Read the 4 encoder positions into the positions list"""
+
+        for i in range(4):
+            self.positions[i] = self.encoders[i].position
+
+    def read_switches(self, ticks_now):
+        """Update the switch debouncer from one bulk GPIO read"""
+
+        self.switches.update(self.seesaw.digital_read_bulk(self.switches.mask), ticks_now)
 
 # --- Key Lookup Cache for Performance ---
-class KeyLookupCache:
+class KeyLookupCache(evmcore.KeyLookupCache):
     def __init__(self, config):
+        # Set before the shared cache is built, _build_cache() compiles the quad encoders too
         self.config = config
-        self.cache = {}
-        self.cache_shift = {}
-
-        # Initialize MacroPad key & color mappings to default MIDI message values
-        # USB drive keymap.cfg file will override if present
-        self.macropad_key_map = [
-            "1:VARIATION", "0:Arr.A", "0:Intro/End1", "0:Fill",
-            "0:Arr.B", "0:Intro/End2","0:Break", "0:Arr.C",
-            "0:Intro/End3", "0:Start/Stop", "0:Arr.D", "0:To End"
-        ]
-        self.macropad_color_map = [
-            Colors.BLUE, Colors.BLUE, Colors.GREEN, Colors.GREEN,
-            Colors.BLUE, Colors.GREEN, Colors.ORANGE, Colors.BLUE,
-            Colors.GREEN, Colors.RED, Colors.BLUE, Colors.RED
-        ]
 
-        self.macropad_key_map_shift = [
-            "1:VARIATION", "0:Low. Mute", "1:TRANSP_DOWN", "0:HALF BAR",
-            "0:FILL & DRUM IN", "1:TRANSP_UP", "0:Arr.Off", "2:UNPLUGGED",
-            "1:OCTAVE_DOWN", "0:Start/Stop", "2:PLUGGED", "1:OCTAVE_UP"
+        # Quad encoder rotation and switch maps for the Base and Shift layers, compiled into quad_cache by _build_cache()
+        # Encoder: "type:name[:label[:channel[:toggle volume]]]" with type CC (3) or a Macro (2) of CCs
+        # Switch: "type:name" to toggle other CCs than the encoder, or "" to toggle the encoder CCs
+        # Encoders of chained boards after the first are unassigned ("") unless set in keymap.cfg
+        unassigned = [""] * (self.config.quad_max_encoders - 4)
+        self.quad_encoder_map = [
+            ["3:LOWERS_CC:Lower", "3:VOICE1_CC:Voice1", "3:VOICE2_CC:Voice2", "3:DRAWBARS_CC:DrwBar"] + unassigned,
+            ["3:DRUM_CC:Drum", "3:BASS_CC:Bass", "3:CHORD_CC:Chord", "3:REALCHORD_CC:R/Chrd"] + unassigned
         ]
-        self.macropad_color_map_shift = [
-            Colors.RED, Colors.BLUE, Colors.YELLOW, Colors.PURPLE,
-            Colors.GREEN, Colors.YELLOW, Colors.RED, Colors.ORANGE,
-            Colors.TEAL, Colors.RED, Colors.ORANGE, Colors.TEAL
+        self.quad_switch_map = [
+            [""] * self.config.quad_max_encoders,
+            [""] * self.config.quad_max_encoders
         ]
+        self.quad_cache = ()
 
-        self.user_macro_midis = {
-            "UNPLUGGED":["0:FILL & DRUM IN"],
-            "PLUGGED":["0:Drum Mute"],
-            "FArr.A":["1:FILL","0:Arr.A"],
-            "FArr.B":["1:FILL","0:Arr.B"],
-            "FArr.C":["1:FILL","0:Arr.C"],
-            "FArr.D":["1:FILL","0:Arr.D"],
-            "SStop":["0:Start/Stop"],
-            "SStop":["0:Start/Stop"],
-            "SStop":["0:Start/Stop"],
-            "SStop":["0:Start/Stop"]
-        }
+        # High resolution parameter (parameter, start value) of NRPN (6) quad encoders, else None
+        self.quad_hires = ()
+
+        # Slider snapshot {CC: value} from keymap.cfg and the quad encoders tracking each CC {CC: [(layer, encoder)]}
+        self.slider_snapshot = {}
+        self.quad_cc_map = {}
 
-        # Ketron Pedal and Tab MIDI lookup dictionaries
-        self.pedal_midis = self._init_pedal_midis()
-        self.tab_midis = self._init_tab_midis()
         self.cc_midis = self._init_cc_midis()
 
-        self._build_cache()
+        # Slider CC numbers, the mixer values captured by scene snapshots
+        self.slider_ccs = tuple(sorted(set(self.cc_midis.values())))
 
-    def _init_pedal_midis(self):
-        """Initialize pedal MIDI dictionary"""
-        
-        return {
-            "Sustain": 0x00, "Soft": 0x01, "Sostenuto": 0x02, "Arr.A": 0x03,
-            "Arr.B": 0x04, "Arr.C": 0x05, "Arr.D": 0x06, "Fill1": 0x07,
-            "Fill2": 0x08, "Fill3": 0x09, "Fill4": 0x0A, "Break1": 0x0B,
-            "Break2": 0x0C, "Break3": 0x0D, "Break4": 0x0E, "Intro/End1": 0x0F,
-            "Intro/End2": 0x10, "Intro/End3": 0x11, "Start/Stop": 0x12,
-            "Tempo Up": 0x13, "Tempo Down": 0x14, "Fill": 0x15, "Break": 0x16,
-            "To End": 0x17, "Bass to Lowest": 0x18, "Bass to Root": 0x19,
-            "Live Bass": 0x1A, "Acc.BassToChord": 0x1B, "Manual Bass": 0x1C,
-            "Voice Lock Bass": 0x1D, "Bass Mono/Poly": 0x1E, "Dial Down": 0x1F,
-            "Dial Up": 0x20, "Auto Fill": 0x21, "Fill to Arr.": 0x22,
-            "After Fill": 0x23, "Low. Hold Start": 0x24, "Low. Hold Stop": 0x25,
-            "Low. Hold Break": 0x26, "Low. Stop Mute": 0x27, "Low. Mute": 0x28,
-            "Low. and Bass": 0x29, "Low. Voice Lock": 0x2A, "Pianist": 0x2B,
-            "Pianist Auto/Stand.": 0x2C, "Pianist Sustain": 0x2D, "Bassist": 0x2E,
-            "Bassist Easy/Exp.": 0x2F, "Key Start": 0x30, "Key Stop": 0x31,
-            "Enter": 0x32, "Exit": 0x33, "Registration": 0x34, "Fade": 0x35,
-            "Harmony": 0x36, "Octave Up": 0x37, "Octave Down": 0x38,
-            "RestartCount In": 0x39, "Micro1 On/Off": 0x3A, "Micro1 Down": 0x3B,
-            "Micro1 Up": 0x3C, "Voicetr.On/Off": 0x3D, "Voicetr.Down": 0x3E,
-            "Voicetr.Up": 0x3F, "Micro2 On/Off": 0x40, "EFX1 On/Off": 0x41,
-            "EFX2 On/Off": 0x42, "Arabic.Set1": 0x43, "Arabic.Set2": 0x44,
-            "Arabic.Set3": 0x45, "Arabic.Set4": 0x46, "Dry On Stop": 0x47,
-            "Pdf Page Down": 0x48, "Pdf Page Up": 0x49, "Pdf Scroll Down": 0x4A,
-            "Pdf Scroll Up": 0x4B, "Glide Down": 0x4C, "Lead Mute": 0x4D,
-            "Expr. Left/Style": 0x4E, "Arabic Reset": 0x4F, "Hold": 0x50,
-            "2nd On/Off": 0x51, "Pause": 0x52, "Talk On/Off": 0x53,
-            "Manual Drum": 0x54, "Kick Off": 0x55, "Snare Off": 0x56,
-            "Rimshot Off": 0x57, "Hit-Hat Off": 0x58, "Cymbal Off": 0x59,
-            "Tom Off": 0x5A, "Latin1 Off": 0x5B, "Latin2 Off": 0x5C,
-            "Latin3/Tamb Off": 0x5D, "Clap/fx Off": 0x5E, "Voice Down": 0x5F,
-            "Voice Up": 0x60, "Regis Down": 0x61, "Regis Up": 0x62,
-            "Style Voice Down": 0x63, "Style Voice Up": 0x64, "EFX1 Preset Down": 0x65,
-            "EFX1 Preset Up": 0x66, "Multi": 0x67, "Page<<": 0x68, "Page>>": 0x69,
-            "RegisVoice<<": 0x6A, "RegisVoice>>": 0x6B, "Text Page": 0x6E,
-            "Text Page+": 0x6F, "Style Voice 1": 0x70, "Style Voice 2": 0x71,
-            "Style Voice 3": 0x72, "Style Voice 4": 0x73, "VIEW & MODELING": 0x74,
-            "Lock Bass": 0x75, "LockChord": 0x76, "Lyrics": 0x77,
-            "VoiceToABCD": 0x87, "TAP": 0x88, "Autocrash": 0x89,
-            "Transp Down": 0x8A, "Transp Up": 0x8B, "Text Record": 0x8C,
-            "Bass & Drum": 0x8D, "Pdf Clear": 0x8E, "Record": 0x90, "Play": 0x91,
-            "DoubleDown": 0x92, "DoubleUp": 0x93, "Arr.Off": 0x94,
-            "FILL & DRUM IN": 0x95, "Wah to Pedal": 0x96, "Overdrive to Pedal": 0x98,
-            "Drum Mute": 0x99, "Bass Mute": 0x9A, "Chords Mute": 0x9B,
-            "Real Chords Mute": 0x9C, "Voice2 to Pedal": 0x9D, "Micro Edit": 0x9E,
-            "Micro2 Edit": 0x9F, "HALF BAR": 0xA0, "Bs Sust Pedal": 0xA1,
-            "Scale": 0xA2, "End Swap": 0xA3, "Set Down": 0xA4, "Set Up": 0xA5,
-            "FswChDelay": 0xA6, "IntroOnArr.": 0xA7, "EndingOnArr.": 0xA8,
-            "Arr. Down": 0xA9, "Arr. Up": 0xAA, "Ending1": 0xAB, "Ending2": 0xAC,
-            "Ending3": 0xAD, "Bass Lock": 0xAE, "Intro Loop": 0xB0,
-            "Scene Down": 0xB1, "Scene Up": 0xB2, "STEM Scene A": 0xB3,
-            "STEM Scene B": 0xB4, "STEM Scene C": 0xB5, "STEM Scene D": 0xB6,
-            "STEM Solo": 0xB7, "STEM Autoplay": 0xB8, "STEM A On/Off": 0xB9,
-            "STEM B On/Off": 0xBA, "STEM C On/Off": 0xBB, "STEM D On/Off": 0xBC,
-            "STEM Lead On/Off": 0xBD, "Art. Toggle": 0xBE, "Key Tune On/Off": 0xBF,
-            "Txt Clear": 0xC0, "Voicetr. Edit": 0xC1, "Clear Image": 0xC2
-        }
-
-    def _init_tab_midis(self):
-        """Initialize tab MIDI dictionary"""
-        
-        return {
-            "DIAL_DOWN": 0x0, "DIAL_UP": 0x1, "PLAYER_A": 0x2, "PLAYER_B": 0x3,
-            "ENTER": 0x4, "MENU": 0x6, "LYRIC": 0x7, "LEAD": 0x8, "VARIATION": 0x9,
-            "DRAWBARS_VIEW": 0x0a, "DRAWBARS": 0x10, "DRUMSET": 0x11, "TALK": 0x12,
-            "VOICETRON": 0x13, "STYLE_BOX": 0x14, "VOICE1": 0x19, "VOICE2": 0x1a,
-            "USER_VOICE": 0x1b, "XFADE": 0x1c, "INTRO1": 0x1d, "INTRO2": 0x1e,
-            "INTRO3": 0x1f, "BASSIST": 0x20, "DRUM_MIXER": 0x22, "OCTAVE_UP": 0x24,
-            "OCTAVE_DOWN": 0x25, "USER_STYLE": 0x26, "DSP": 0x27, "ADSR_FILTER": 0x28,
-            "MICRO": 0x29, "ARRA": 0x2c, "ARRB": 0x2d, "ARRC": 0x2e, "ARRD": 0x2f,
-            "FILL": 0x30, "BREAK": 0x31, "JUKE_BOX": 0x32, "STEM": 0x33,
-            "PIANIST": 0x34, "BASS_TO_LOWEST": 0x40, "MANUAL_BASS": 0x41,
-            "PORTAMENTO": 0x48, "HARMONY": 0x49, "PAUSE": 0x4a, "TEMPO_SLOW": 0x4b,
-            "TEMPO_FAST": 0x4c, "START_STOP": 0x4d, "TRANSP_DOWN": 0x59,
-            "TRANSP_UP": 0x5a, "AFTERTOUCH": 0x5e, "EXIT": 0x5f, "ROTOR_SLOW": 0x60,
-            "ROTOR_FAST": 0x61, "PIANO_FAM": 0x62, "ETHNIC_FAM": 0x63,
-            "ORGAN_FAM": 0x64, "GUITAR_FAM": 0x65, "BASS_FAM": 0x66,
-            "STRING_FAM": 0x67, "BRASS_FAM": 0x68, "SAX_FAM": 0x69, "HOLD": 0x6f,
-            "PAD_FAM": 0x70, "SYNTH_FAM": 0x71, "FADEOUT": 0x73, "BASS_TO_ROOT": 0x74,
-            "GM": 0x77
-        }
+        super().__init__(config)
 
     def _init_cc_midis(self):
         """Initialize MIDI CC dictionary"""
         
         return {
-            "PLAYER": SliderCC.PLAYER_CC, "STYLE": SliderCC.STYLE_CC, "DRUM": SliderCC.DRUM_CC, 
-            "CHORD": SliderCC.CHORD_CC, "REALCHORD": SliderCC.REALCHORD_CC, 
-            "BASS": SliderCC.BASS_CC, "LOWERS": SliderCC.LOWERS_CC, "USER2": SliderCC.USER2_CC, "USER3": SliderCC.USER3_CC, 
-            "VOICE1": SliderCC.VOICE1_CC, "VOICE2": SliderCC.VOICE2_CC, "DRAWBARS": SliderCC.DRAWBARS_CC,
-            "MICRO1": SliderCC.MICRO1_CC, "VOCAL": SliderCC.VOCAL_CC
+            "PLAYER_CC": SliderCC.PLAYER_CC, "STYLE_CC": SliderCC.STYLE_CC, "DRUM_CC": SliderCC.DRUM_CC, 
+            "CHORD_CC": SliderCC.CHORD_CC, "REALCHORD_CC": SliderCC.REALCHORD_CC, 
+            "BASS_CC": SliderCC.BASS_CC, "LOWERS_CC": SliderCC.LOWERS_CC, "USER2_CC": SliderCC.USER2_CC, "USER3_CC": SliderCC.USER3_CC, 
+            "VOICE1_CC": SliderCC.VOICE1_CC, "VOICE2_CC": SliderCC.VOICE2_CC, "DRAWBARS_CC": SliderCC.DRAWBARS_CC,
+            "MICRO1_CC": SliderCC.MICRO1_CC, "VOCAL_CC": SliderCC.VOCAL_CC
     }
 
-
     def _build_cache(self):
-        """Build lookup cache at startup"""
-        
-        # Build Default layer cache
-        for i in range(12):
-            key_id = self.config.get_key(i)
-            mapped_key = self.macropad_key_map[key_id]
-
-            if mapped_key and len(mapped_key) > 2 and mapped_key[1] == ':':
+        """Build lookup tables and LED frames for all banks, then the quad encoder layer caches"""
+
+        super()._build_cache()
+
+        # Build Quad Encoder layer caches
+        quad_cache = []
+        quad_hires = []
+        for layer in range(2):
+            quad_layer = []
+            hires_layer = []
+            for n in range(self.config.quad_max_encoders):
+                hires_layer.append(self._build_quad_hires(layer, n))
+                if not self.quad_encoder_map[layer][n]:
+                    quad_layer.append(((), (), self.config.midi_out_channel, "KNB{}: - ".format(n + 1), 0, self.accel.get_table("none")))
+                    continue
                 try:
-                    lookup_key = int(mapped_key[0])
-                    midi_key = mapped_key[2:]
-
-                    if lookup_key == MIDIType.PEDAL:
-                        midi_value = self.pedal_midis.get(midi_key, 0)
-                    else:
-                        midi_value = self.tab_midis.get(midi_key, 0)
-
-                    self.cache[i] = (lookup_key, midi_key, midi_value)
-                except (ValueError, IndexError):
-                    print("Error caching key {}: {}".format(i, mapped_key))
-                    self.cache[i] = (0, "", 0)
-            else:
-                self.cache[i] = (0, "", 0)
+                    quad_layer.append(self._build_quad_entry(layer, n))
+                except (ValueError, IndexError, KeyError) as e:
+                    print("Error caching quad encoder {}{}: {}".format(layer, n, e))
+                    quad_layer.append(((), (), self.config.midi_out_channel, "KNB{}: - ".format(n + 1), 0, self.accel.get_table("none")))
+            quad_cache.append(tuple(quad_layer))
+            quad_hires.append(tuple(hires_layer))
+        self.quad_cache = tuple(quad_cache)
+        self.quad_hires = tuple(quad_hires)
+
+        # Index the quad encoders by their first CC so slider values reported by the EVM can be matched
+        self.quad_cc_map = {}
+        for layer in range(2):
+            for n in range(self.config.quad_max_encoders):
+                cc_list = self.quad_cache[layer][n][0]
+                if cc_list:
+                    self.quad_cc_map.setdefault(cc_list[0], []).append((layer, n))
+
+    def _build_cc_list(self, quad_string):
+        """Resolve a "type:name" CC (3) or Macro (2) reference into a tuple of CC numbers"""
+
+        quad_parts = quad_string.split(':')
+        lookup_key = int(quad_parts[0])
+        name = quad_parts[1]
+
+        if lookup_key == MIDIType.CC:
+            return (self.cc_midis[name],)
+        elif lookup_key == MIDIType.NRPN:
+            return ()
+        elif lookup_key == MIDIType.MACRO:
+            cc_list = []
+            for item in self.user_macro_midis[name]:
+                macro_parts = item.split(':')
+                if int(macro_parts[0].strip()) == MIDIType.CC:
+                    cc_list.append(self.cc_midis[macro_parts[1].strip()])
+            return tuple(cc_list)
+
+        raise ValueError("Invalid quad type {}".format(lookup_key))
+
+    def _build_quad_hires(self, layer, n):
+        """Resolve a "6:name" quad encoder into its high resolution (parameter, start value, highest value), else None"""
+
+        quad_parts = self.quad_encoder_map[layer][n].split(':')
+        if len(quad_parts) < 2 or quad_parts[0] != str(MIDIType.NRPN):
+            return None
 
-        # Build Shift Layer cache
-        for i in range(12):
-            key_id = self.config.get_key(i)
-            mapped_key = self.macropad_key_map_shift[key_id]
+        index = self.find_hires(quad_parts[1])
+        if index < 0:
+            print("Error caching quad encoder {}{}: no nrp line or Ketron NRPN for {}".format(layer, n, quad_parts[1]))
+            return None
+        return self.hires[index]
 
-            if mapped_key and len(mapped_key) > 2 and mapped_key[1] == ':':
-                try:
-                    lookup_key = int(mapped_key[0])
-                    midi_key = mapped_key[2:]
+    def _build_quad_entry(self, layer, n):
+        """Compile a quad encoder map entry into (encoder CCs, switch CCs, channel, display label, toggle volume, accel table)"""
 
-                    if lookup_key == MIDIType.PEDAL:
-                        midi_value = self.pedal_midis.get(midi_key, 0)
-                    else:
-                        midi_value = self.tab_midis.get(midi_key, 0)
+        quad_string = self.quad_encoder_map[layer][n]
+        quad_parts = quad_string.split(':')
 
-                    self.cache_shift[i] = (lookup_key, midi_key, midi_value)
-                except (ValueError, IndexError):
-                    print("Error caching shift key {}: {}".format(i, mapped_key))
-                    self.cache_shift[i] = (0, "", 0)
-            else:
-                self.cache_shift[i] = (0, "", 0)
+        cc_list = self._build_cc_list(quad_string)
 
-    def get_key_midi(self, key_id, shift_mode):
-        """Get cached MIDI data for key"""
-        
-        if (shift_mode == ShiftKeyMode.ACTIVE_SHIFT) or (shift_mode == ShiftKeyMode.ACTIVE_LOCK):
-            return self.cache_shift.get(key_id, (0, "", 0))
+        if self.quad_switch_map[layer][n]:
+            switch_cc_list = self._build_cc_list(self.quad_switch_map[layer][n])
         else:
-            return self.cache.get(key_id, (0, "", 0))
+            switch_cc_list = cc_list
+
+        # Default label from the CC or macro name, e.g. LOWERS_CC is shown as Lowers
+        if len(quad_parts) > 2 and quad_parts[2]:
+            name = quad_parts[2]
+        elif int(quad_parts[0]) == MIDIType.CC:
+            name = quad_parts[1].replace("_CC", "")
+            name = name[:1] + name[1:].lower()
+        else:
+            name = quad_parts[1]
 
-    def validate_color_string(self, color_string):
-        """Validate and return color code"""
-        
-        return COLOR_MAP.get(color_string.lower(), Colors.WHITE)
+        channel = self.config.midi_out_channel
+        if len(quad_parts) > 3 and quad_parts[3]:
+            channel = int(quad_parts[3]) - 1
 
-# --- Configuration File Handler ---
-class ConfigFileHandler:
-    def __init__(self, key_cache, config):
-        self.key_cache = key_cache
-        self.config = config
-        self.config_error = False
+        toggle_volume = self.config.encoder_vol
+        if len(quad_parts) > 4 and quad_parts[4]:
+            toggle_volume = int(quad_parts[4])
 
-    def safe_file_read(self, filename):
-        """Safely read file with error handling"""
+        # Acceleration profile for this encoder, else AccQuad, else grad or none following EncGrad
+        if len(quad_parts) > 5 and quad_parts[5]:
+            accel_name = quad_parts[5]
+        elif self.config.accel_quad:
+            accel_name = self.config.accel_quad
+        else:
+            accel_name = "grad" if self.config.encoder_grad else "none"
 
-        try:
-            with open(filename, "r") as f:
-                return f.readlines()
-        except (OSError, IOError) as e:
-            print("Error reading {}: {}".format(filename, e))
-            return []
-
-    def parse_key_config_line(self, line):
-        """Parse a single key config line with validation"""
-        
-        #key00=1:VARIATION:blue
-        try:
-            line = line.strip()
-            if line.startswith('#') or not line:
-                return None
+        # High resolution parameters show their 14-bit value rather than a volume
+        label = "KNB{}: {} " if int(quad_parts[0]) == MIDIType.NRPN else "KNB{}: {} Vol "
 
-            if '=' not in line or line.count(':') < 2:
-                raise ValueError("Invalid format")
+        return (cc_list, switch_cc_list, channel, label.format(n + 1, name), toggle_volume, self.accel.get_table(accel_name))
 
-            line_parts = line.split('=', 1)
-            if len(line_parts) != 2 or not line_parts[0].startswith('key'):
-                raise ValueError("Invalid key format")
+# --- Configuration File Handler ---
+class ConfigFileHandler(evmcore.ConfigFileHandler):
+    def parse_quad_config_line(self, line):
+        """Parse a single quad encoder or switch config line, raising ValueError so load_config records bad rows"""
+        
+        #enc00=3:LOWERS_CC:Lower:16:96:fast
+        #enc012=3:PLAYER_CC:Player
+        #swi00=2:Lower.Voices
+        line = line.strip()
+        if line.startswith('#') or not line:
+            return None
 
-            key_parts = line_parts[1].split(':')
-            if len(key_parts) != 3:
-                raise ValueError("Invalid value format")
+        line_parts = line.split('=', 1)
+        if len(line_parts) != 2 or len(line_parts[0]) not in (5, 6):
+            raise ValueError("Invalid quad format")
+
+        # Layer digit followed by a one or two digit encoder number
+        quad_kind = line_parts[0][:3]
+        layer = int(line_parts[0][3])
+        encoder = int(line_parts[0][4:])
+        if quad_kind not in ('enc', 'swi') or layer > 1 or encoder >= self.config.quad_max_encoders:
+            raise ValueError("Invalid quad encoder")
+
+        quad_parts = line_parts[1].split(':')
+        if len(quad_parts) < 2 or (quad_kind == 'swi' and len(quad_parts) != 2) or len(quad_parts) > 6:
+            raise ValueError("Invalid quad value format")
+
+        lookup_key = int(quad_parts[0])
+        if lookup_key == MIDIType.CC:
+            if quad_parts[1] not in self.key_cache.cc_midis:
+                raise ValueError("Invalid CC: {}".format(quad_parts[1]))
+        elif lookup_key != MIDIType.MACRO and lookup_key != MIDIType.NRPN:
+            raise ValueError("Invalid quad type {}".format(lookup_key))
+
+        if len(quad_parts) > 3 and quad_parts[3]:
+            channel = int(quad_parts[3])
+            if channel < 1 or channel > 16:
+                raise ValueError("Invalid channel {}".format(channel))
+
+        if len(quad_parts) > 4 and quad_parts[4]:
+            volume = int(quad_parts[4])
+            if volume < 0 or volume > 127:
+                raise ValueError("Invalid volume {}".format(volume))
 
-            return {
-                'key': line_parts[0],
-                'type': int(key_parts[0]),
-                'command': key_parts[1],
-                'color': key_parts[2]
-            }
-        except (ValueError, IndexError) as e:
-            print("Error parsing key line '{}': {}".format(line, e))
-            return None
+        return {
+            'kind': quad_kind,
+            'layer': layer,
+            'encoder': encoder,
+            'value': line_parts[1]
+        }
 
-    def parse_macro_config_line(self, line):
-        """Parse a single macro config line with validation"""
+    def parse_slider_config_line(self, line):
+        """Parse a single slider snapshot config line with validation"""
         
-        #mac00=PLUGGED:[1:FILL,0:Sostenuto]
+        #sld00=LOWERS_CC:96
         try:
             line = line.strip()
             if line.startswith('#') or not line:
                 return None
 
-            if '=' not in line:
-                raise ValueError("Invalid format")
-
             line_parts = line.split('=', 1)
-            if len(line_parts) != 2 or not line_parts[0].startswith('mac'):
-                raise ValueError("Invalid macro format")
-
-            # Extract the macro key
-            macro_parts = line_parts[1].split(':[')
-            if len(macro_parts) != 2:
-                raise ValueError("Invalid macro format")
-
-            # Extract the macro list
-            # Split by ',' and strip trailing ']' after last macro in list
-            macro_list = []
-            list_parts = macro_parts[1].split(',') 
-            for part in list_parts:
-                str_part = str(part).replace("]","")                
-                macro_list.append(str_part)
+            if len(line_parts) != 2 or not line_parts[0].startswith('sld'):
+                raise ValueError("Invalid slider format")
+
+            slider_parts = line_parts[1].split(':')
+            if len(slider_parts) != 2:
+                raise ValueError("Invalid slider format")
+
+            cc = self.key_cache.cc_midis[slider_parts[0].strip()]
+            value = int(slider_parts[1])
+            if value < 0 or value > 127:
+                raise ValueError("Slider value out of range")
 
             return {
-                'macro': str(line_parts[0]),
-                'macro_key': str(macro_parts[0]),
-                'macro_list': macro_list,
+                'cc': cc,
+                'value': value
             }
-        except (ValueError, IndexError) as e:
-            print("Error parsing macro line '{}': {}".format(line, e))
+        except (ValueError, IndexError, KeyError) as e:
+            print("Error parsing slider line '{}': {}".format(line, e))
             return None
 
-    def parse_var_config_line(self, line):
-        """Parse a single variable config line with validation"""
-        
-        #var00=EncQuad:True
-        try:
-            line = line.strip()
-            if line.startswith('#') or not line:
-                return None
-
-            if '=' not in line:
-                raise ValueError("Invalid format")
+    def parse_device_line(self, line):
+        """Parse the slider snapshot and quad encoder lines, True if the line was one of them"""
 
-            line_parts = line.split('=', 1)
-            if len(line_parts) != 2 or not line_parts[0].startswith('var'):
-                raise ValueError("Invalid variable format")
-
-            # Extract the variable key
-            macro_parts = line_parts[1].split(':')
-            if len(macro_parts) != 2:
-                raise ValueError("Invalid variable format")
-                
-            #print(f"var line: {line_parts[1]}")
-
-            if macro_parts[0] == 'EncQuad':
-                if macro_parts[1].strip() == "True":
-                    self.config.is_quadencoder = True
-                else: 
-                    self.config.is_quadencoder = False
-                print(f"Var Quad Encoder Enable: {self.config.is_quadencoder}")
-
-            elif macro_parts[0] == 'EncStep':
-                step = int(macro_parts[1])
-                if step == 2:
-                    self.config.encoder_step = 2
-                elif step == 4:
-                    self.config.encoder_step = 4
-                else: 
-                    self.config.encoder_step = 8
-                print(f"Var Encoder Step: {self.config.encoder_step}")
-
-            elif macro_parts[0] == 'EncFwd':
-                if macro_parts[1].strip() == "True":
-                    self.config.encoder_fwd = True
-                else: 
-                    self.config.encoder_fwd = False
-                print(f"Var Encoder FWD/BKWD: {self.config.encoder_fwd}")
-            
-            elif macro_parts[0] == 'EncGrad':
-                if macro_parts[1].strip() == "True":
-                    self.config.encoder_grad = True
-                else: 
-                    self.config.encoder_grad = False
-                print(f"Var Encoder Graduation: {self.config.encoder_grad}")
-            
-            elif macro_parts[0] == 'EncVol':
-                vol = int(macro_parts[1])
-                if vol > 0 and vol < 128:
-                    self.config.encoder_vol = vol
-                else:
-                    self.config.encoder_vol = 96
-                print(f"Var Encoder Volume: {self.config.encoder_vol}")
-
-            elif macro_parts[0] == 'KeyVar':
-                varkey = int(macro_parts[1])
-                if varkey >= 0 and varkey < 12:
-                    self.config.key_variation = varkey
-                print(f"Var Key Variation: {self.config.key_variation}")
-
-            elif macro_parts[0] == 'ModShift':
-                if macro_parts[1].strip() == "True":
-                    self.config.shift_enable = True
-                else: 
-                    self.config.shift_enable = False
-                print(f"Var Shift Enable: {self.config.shift_enable}")
-
-            elif macro_parts[0] == 'TimVar':
-                timvar = int(macro_parts[1])
-                if timvar >= 250 and timvar < 10000:
-                    self.config.shift_hold_timer = timvar/1000
-                else:
-                    self.config.shift_hold_timer = 0.25
-                print(f"Var Variation Timer: {self.config.shift_hold_timer}")
-            
-            elif macro_parts[0] == 'TimTempo':
-                timtempo = int(macro_parts[1])
-                if timtempo >= 10000 and timtempo < 60000:
-                    self.config.tempo_timer = timtempo/1000
-                else:
-                    self.config.tempo_timer = 6
-                print(f"Var Tempo Timer: {self.config.tempo_timer}")
+        if line.startswith("sld"):
+            parsed = self.parse_slider_config_line(line)
+            if parsed is not None:
+                self.key_cache.slider_snapshot[parsed['cc']] = parsed['value']
+            return True
 
-            elif macro_parts[0] == 'MIDChan':
-                midchan = int(macro_parts[1])
-                if midchan >= 1 and midchan <= 16:
-                    self.config.midi_out_channel = midchan - 1
+        if line.startswith("enc") or line.startswith("swi"):
+            parsed = self.parse_quad_config_line(line)
+            if parsed is not None:
+                if parsed['kind'] == 'enc':
+                    self.key_cache.quad_encoder_map[parsed['layer']][parsed['encoder']] = parsed['value']
                 else:
-                    self.config.midi_out_channel = 15
-                print(f"Var MIDI Chan Out: {self.config.midi_out_channel}")
-                        
+                    self.key_cache.quad_switch_map[parsed['layer']][parsed['encoder']] = parsed['value']
             return True
-        except (ValueError, IndexError) as e:
-            print("Error parsing variable line '{}': {}".format(line, e))
-            return None
-
-    def validate_midi_string(self, midi_type, command):
-        """Validate MIDI command against known commands"""
-        
-        if midi_type == MIDIType.PEDAL:
-            return command in self.key_cache.pedal_midis
-        elif midi_type == MIDIType.TAB:
-            return command in self.key_cache.tab_midis
-            
-        # To do: Initially macros hard coded, now loaded after keys. Validate after macros loaded
-        #elif midi_type == MIDIType.MACRO:
-        #    for macro in self.key_cache.user_macro_midis:
-        #        #print(f"Checking command: {command}, {macro}, return {macro.get(command, [])}, type {isinstance(macro.get(command, []), list)}")
-        #        if command in macro: return True
-                    
-        return True
-
-    def load_config(self):
-        """Load and validate configuration file"""
-        
-        self.key_index = 0
-        self.shift = False
-        self.config_errors = []
-        
-        # print(f"macros list: {self.key_cache.user_macro_midis}")
-        self.key_cache.user_macro_midis.clear()
-        
-        try:
-            lines = self.safe_file_read("/keymap.cfg")
-            if not lines:
-                self.config_error = True
-                print("Using default Config")
-                return False
-        except Exception as e:
-            print("Config file missing")
-            return False
 
-        # Load Layer: Base
-        for line_num, line in enumerate(lines, 1):
-            
-            try:
-                if "key" in line:
-                    parsed = self.parse_key_config_line(line)
-                    if parsed is None:
-                        # print(f"Skipping line: {line}")
-                        continue
-
-                    # Validate MIDI command
-                    if not self.validate_midi_string(parsed['type'], parsed['command']):
-                        raise ValueError("Invalid MIDI command: {}".format(parsed['command']))
+        return False
 
-                    mapped_key_index = self.config.get_key(self.key_index)
+    def parse_device_var(self, name, value):
+        """Set the quad encoder pickup and acceleration variables"""
 
-                    # Apply configuration
-                    if self.shift == False :
+        if name == 'EncPickup':
+            if value.strip() == "True":
+                self.config.encoder_pickup = True
+            else: 
+                self.config.encoder_pickup = False
+            print(f"Var Encoder Pickup: {self.config.encoder_pickup}")
+            return True
 
-                        # print(f"Base - Number: {line_num}, Line: {line}, Mapped Key Index: {mapped_key_index}")
+        if name == 'AccQuad':
+            self.config.accel_quad = value.strip()
+            print(f"Var Quad Acceleration: {self.config.accel_quad}")
+            return True
 
-                        # Set MIDI string and color for base layer 
-                        midi_string = "{}:{}".format(parsed['type'], parsed['command'])
-                        self.key_cache.macropad_key_map[mapped_key_index] = midi_string
+        return False
 
-                        # Set color
-                        color_code = self.key_cache.validate_color_string(parsed['color'])
-                        self.key_cache.macropad_color_map[mapped_key_index] = color_code
+# --- State Manager ---
+class StateManager(evmcore.StateManager):
+    def __init__(self, config):
+        super().__init__(config)
 
-                    elif self.shift == True:
+        # Tracks if I2C devices is attached.
+        self.is_quadencoder = True
 
-                        # print(f"Shift - Number: {line_num}, Line: {line}, Mapped Key Index: {mapped_key_index}")
+        # Quad encoder volumes indexed by layer (0: Base, 1: Shift) and encoder
+        quad_count = self.config.quad_max_encoders
+        self.quad_volumes = [[0] * quad_count, [0] * quad_count]
 
-                        # Set MIDI string and color in shift layer
-                        midi_string = "{}:{}".format(parsed['type'], parsed['command'])
-                        self.key_cache.macropad_key_map_shift[mapped_key_index] = midi_string
+        # Slider values learned from the EVM (-1 unknown) and whether each quad encoder has picked them up
+        self.evm_volumes = [[-1] * quad_count, [-1] * quad_count]
+        self.quad_pickup = [[True] * quad_count, [True] * quad_count]
 
-                        # Set color
-                        color_code = self.key_cache.validate_color_string(parsed['color'])
-                        self.key_cache.macropad_color_map_shift[mapped_key_index] = color_code
+        # Last detent time per quad encoder in supervisor.ticks_ms(), used for acceleration
+        self.quad_encoders_ticks = [self.encoder_ticks] * quad_count
 
-                    # Read all 24 keys in the Base and Shift Layers. resetting the key index to start with shift layer
-                    self.key_index += 1
-                    if (self.key_index > 11) and (self.shift == False):
-                        self.key_index = 0
-                        self.shift = True
+# --- Device Profile ---
+# MIDI in on all channels for the slider values reported by the EVM, out on the MIDChan out channel
+PROFILE = DeviceProfile("EVM Plus", EVMConfig, KeyLookupCache, ConfigFileHandler, StateManager, MIDIHandler,
+                        midi_in_channel="ALL")
 
-                elif "mac" in line:                    
-                    parsed = self.parse_macro_config_line(line)
-                    if parsed is None:
-                        continue
+# --- Main Controller Class ---
+class EVMController(evmcore.EVMController):
+    PROFILE = PROFILE
 
-                    # Add a new macro entry in dictionary
-                    self.key_cache.user_macro_midis[parsed['macro_key']] = parsed['macro_list']
+    def _init_device(self):
+        """Set up the quad encoder state, and the scene snapshot slots of the quad encoder volumes"""
 
-                elif "var" in line:                    
-                    parsed = self.parse_var_config_line(line)
-                    if parsed is None:
-                        continue
+        self._init_quadencoder()
+        self.scenes = [None] * self.config.scene_slots
 
-            except Exception as e:
-                print(f"Exception in line {line_num}: {line}")
-                self.config_errors.append("Line {}: {}".format(line_num, e))
+    def _startup_steps(self):
+        """Attach the quad encoder boards first, then the shared start up steps"""
 
-        if self.config_errors:
-            print("Configuration file parsing errors:")
-            for error in self.config_errors[:5]:  # Limit error display
-                print("  {}".format(error))
-            self.config_error = True
-            return False
+        return [("Quad", self._start_quadencoder)] + super()._startup_steps()
 
-        # Rebuild cache with new configuration
-        self.key_cache._build_cache()
-        
-        print("Config file processed.")
-        return True
+    def _midi_listener(self):
+        """Slider values reported by the EVM are learned by the quad encoders"""
 
-# --- Display Manager ---
-class DisplayManager:
-    def __init__(self, macropad, config):
-        self.macropad = macropad
-        self.config = config
-        self.labels = []
-        self._init_display()
+        return self._learn_slider if self.config.is_quadencoder else None
 
-    def _init_display(self):
-        """Initialize display layout"""
-        
-        main_group = displayio.Group()
-        self.macropad.display.root_group = main_group
+    def _state_volumes(self):
+        """Quad encoder volumes and toggles are kept with the state in NVM"""
 
-        title = label.Label(
-            y=6,
-            font=terminalio.FONT,
-            color=0x0,
-            text=self.config.display_banner,
-            background_color=0xFFFFFF,
-        )
+        return self.state.quad_volumes, self.quad_encoders_toggle
 
-        # Configure Display Grid
-        layout = GridLayout(x=0, y=8, width=128, height=54, grid_size=(3, 4), cell_padding=5)
+    def _loop_stages(self):
+        """The quad encoders run right after the main encoder"""
 
-        for _ in range(12):
-            self.labels.append(label.Label(terminalio.FONT, text=""))
+        stages = super()._loop_stages()
+        index = [stage[0] for stage in stages].index(LoopStage.ENCODER) + 1
+        return stages[:index] + ((LoopStage.QUAD, self._run_quad),) + stages[index:]
 
-        for index in range(12):
-            x = index % 3
-            y = index // 3
-            layout.add_content(self.labels[index], grid_position=(x, y), cell_size=(1, 1))
+    def _shift_changed(self):
+        """Refresh the LEDs and the quad encoder positions after the shift layer was switched"""
 
-        main_group.append(title)
-        main_group.append(layout)
+        self._preset_pixels()
+        self.preset_quad_positions()
 
-        # Display startup info
-        self.show_startup_info()
+    def _init_quadencoder(self):
+        """Initialize the Adafruit Quad Encoder state. The boards are attached by _start_quadencoder()"""
 
-    def show_startup_info(self):
-        """Display startup information"""
-        
-        self.labels[3].text = self.config.display_sub_banner
-        self.labels[6].text = "KNOB MODE: Rotor"
-        # self.labels[9].text = "Version: {}".format(self.config.version)
-        self.labels[9].text = "OS: {}".format(self.config.version)
+        # Boards attached now, and the first encoder number of every board seen so a re-attached board keeps its encoders
+        self.quad_boards = []
+        self.quad_slots = {}
+        self.quad_i2c = None
 
-    def update_text(self, index, text):
-        """Update label text safely"""
-        
-        if 0 <= index < len(self.labels):
-            self.labels[index].text = text
+        # Boards are read one per loop in turn so more boards do not slow down the keys
+        self.quad_board_index = 0
 
-# --- State Manager ---
-class StateManager:
-    def __init__(self, config):
-        self.config = config
-        
-        self.encoder_mode = EncoderMode.ROTOR
-        self.encoder_position = 0
-        self.encoder_sign = False
-        self.rotor_flag = 0  # -1=slow, 0=off, 1=fast
-        
-        # Controller Shift Mode based on Variation Key
-        self.shift_mode = ShiftKeyMode.OFF
+        # Exponential backoff between probes for missing boards
+        self.quad_retry_ms = self.config.quad_retry_min
+        self.quad_retry_ticks = supervisor.ticks_ms()
 
-        # Timing trackers
-        self.tempo_start_time = 0
-        self.volume_start_time = 0
-        self.value_start_time = 0
-        self.version_start_time = 0
-        self.led_start_time = 0
+        # Encoder positions are tracked per physical encoder, colors and toggles per layer and encoder
+        quad_count = self.config.quad_max_encoders
+        self.quad_last_positions = [-1] * quad_count
+        self.quad_colors = [[0] * quad_count, [0] * quad_count]  # Start at red (muted)
+        self.quad_encoders_toggle = [[False] * quad_count, [False] * quad_count]
+        self.quad_switch_layers = bytearray(quad_count)  # Layer in use when each switch was pressed
 
-        # Track last quad encoder switch pressed to avoid duplicates and timer that re-enables dups after 500ms
-        self.quad_switch_start_time = 0
-        self.last_quad_switch = 10
+        # Default all encoder starting volumes to 96, then apply the slider snapshot from keymap.cfg
+        self.preset_quad_volumes(2, 96)
+        for cc, value in self.key_cache.slider_snapshot.items():
+            self._learn_slider(cc, value, None)
 
-        # Preset version display to end after 15s
-        self.version_start_time = time.time()
+        self.state.is_quadencoder = False
 
-        # Tracks if I2C devices is attached.
-        self.is_quadencoder = True
+    def _start_quadencoder(self):
+        """Attach the Adafruit Quad Encoder boards found on the I2C bus. Missing boards are retried from the main loop"""
 
-        self.quad_volumes = [0, 0, 0, 0]
-        self.quad_volumes_shift = [0, 0, 0, 0]
-        
-        time_now = time.monotonic()
-        self.quad_encoders_time = [time_now, time_now, time_now, time_now]
+        if not self.config.is_quadencoder:
+            print("Quad Encoders disabled")
+            return
 
-        # LED state
-        self.lit_keys = [False] * 12
-        
+        self.state.is_quadencoder = self._attach_quad_boards(True)
+        if self.state.is_quadencoder:
+            print("Quad Encoders configured")
+        else:
+            print("No Quad Encoder board found")
+        self.quad_retry_ticks = supervisor.ticks_ms()
 
-    def update_encoder_mode(self, new_mode):
-        """Update encoder mode with timed reset"""
-        
-        self.encoder_mode = new_mode
-        current_time = time.time()
-
-        if new_mode == EncoderMode.TEMPO:
-            self.tempo_start_time = current_time
-        elif new_mode == EncoderMode.VOLUME:
-            self.volume_start_time = current_time
-        elif new_mode == EncoderMode.VALUE:
-            self.value_start_time = current_time
-
-    def check_timeouts(self):
-        """Check and handle encoder mode timeouts"""
-        
-        current_time = time.time()
-
-        # Revert tempo to rotor after timeout
-        if (self.encoder_mode == EncoderMode.TEMPO and
-            self.tempo_start_time != 0 and
-            current_time - self.tempo_start_time > self.config.tempo_timer):
-            self.encoder_mode = EncoderMode.ROTOR
-            return "timeout_tempo"
-
-        # Revert volume to rotor after timeout
-        if (self.encoder_mode == EncoderMode.VOLUME and
-            self.volume_start_time != 0 and
-            current_time - self.volume_start_time > self.config.volume_timer):
-            self.encoder_mode = EncoderMode.ROTOR
-            return "timeout_volume"
-
-        # Revert value to rotor after timeout
-        if (self.encoder_mode == EncoderMode.VALUE and
-            self.value_start_time != 0 and
-            current_time - self.value_start_time > self.config.value_timer):
-            self.encoder_mode = EncoderMode.ROTOR
-            return "timeout_value"
-
-        # Re-enable quad switch duplicates timeout
-        if (self.quad_switch_start_time != 0 and
-            current_time - self.quad_switch_start_time > self.config.quad_switch_timer):
-            self.last_quad_switch = 10
-            self.quad_switch_start_time = 0
-            return "quad_switch_timeout"
-            
-        # Clear version value after timeout
-        if (self.version_start_time != 0 and
-            current_time - self.version_start_time > self.config.version_timer):
-            self.version_start_time = 0
-            return "timeout_version"
-
-        # Check LED timeout
-        if (self.led_start_time != 0 and
-            current_time - self.led_start_time > self.config.key_bright_timer):
-            self.led_start_time = 0
-            return "timeout_led"
-
-        return None
+    def _scan_quad_addresses(self):
+        """Addresses in the quad encoder range that acknowledge on the I2C bus"""
 
-# --- Main Controller Class ---
-class EVMController:
-    def __init__(self):
-        print("Initializing EVM Controller...")
+        i2c = self.quad_i2c
+        while not i2c.try_lock():
+            pass
 
-        # Initialize components
-        self.config = EVMConfig()
-        self.state = StateManager(self.config)
+        addresses = []
+        try:
+            for address in range(QuadBoard.FIRST_ADDRESS, QuadBoard.LAST_ADDRESS + 1):
+                try:
+                    i2c.writeto(address, b"")
+                    addresses.append(address)
+                except OSError:
+                    pass
+        finally:
+            i2c.unlock()
 
-        # Initialize key cache and config
-        self.key_cache = KeyLookupCache(self.config)
-        self.config_handler = ConfigFileHandler(self.key_cache, self.config)
+        return addresses
 
-        # Initialize MIDI
-        self._init_midi(self.config, self.key_cache)
+    def _attach_quad_boards(self, reset):
+        """Attach quad encoder boards found on the bus that are not attached yet. True if any board is attached"""
 
-        # Initialize MacroPad
-        self._init_macropad()
-        
-        # Load configuration
-        config_loaded = self.config_handler.load_config()
+        try:
+            if self.quad_i2c is None:
+                # For boards/chips that don't handle clock-stretching well, try running I2C at 50KHz
+                # import busio
+                # i2c = busio.I2C(board.SCL, board.SDA, frequency=50000)
+                # For using the built-in STEMMA QT connector on a microcontroller
+                self.quad_i2c = board.STEMMA_I2C()
+            addresses = self._scan_quad_addresses()
+        except (RuntimeError, OSError, ValueError) as e:
+            print("Error: Quad Encoder I2C: {}".format(e))
+            return len(self.quad_boards) > 0
+
+        attached = [quad_board.address for quad_board in self.quad_boards]
+        for address in addresses:
+            if address in attached:
+                continue
+
+            # One flat encoder array across all boards, in the order they are first found
+            first = self.quad_slots.get(address)
+            if first is None:
+                if len(self.quad_slots) >= self.config.quad_max_boards:
+                    continue
+                first = len(self.quad_slots) * 4
 
-        # Initialize display
-        self.display = DisplayManager(self.macropad, self.config)
+            try:
+                quad_board = QuadBoard(self.quad_i2c, address, first, self.config, reset)
+            except (ValueError, RuntimeError, OSError) as e:
+                print("Skipping I2C device at 0x{:02X}: {}".format(address, e))
+                continue
 
-        if not config_loaded:
-            self.display.update_text(9, "Config File Error!")
+            self.quad_slots[address] = first
+            self.quad_boards.append(quad_board)
 
-        # Initialize pixels
-        self._preset_pixels()
+            # Re-initialize the encoder last position tracked by reading the current state
+            # No MIDI message sent since we do not know if the EVM is online yet
+            self._preset_board_positions(quad_board)
+            print("Quad Encoder board at 0x{:02X}: KNB{}-{}".format(address, first + 1, first + 4))
 
-        # Initialize the Adafruit Quad Encoder
-        self.state.is_quadencoder = self._init_quadencoder()
-        
-        print("Pad Controller Ready")
+        return len(self.quad_boards) > 0
 
-    def _init_midi(self, config, key_cache):
-        """Initialize MIDI connections"""
-        self.config = config
-        
-        print("Preparing Macropad Midi")
+    def _detach_quad_board(self, quad_board, error):
+        """Drop a board that stopped answering and start probing for it again"""
 
-        midi = adafruit_midi.MIDI(
-            midi_in=usb_midi.ports[0], in_channel=0,
-            midi_out=usb_midi.ports[1], out_channel=self.config.midi_out_channel
-        )
+        print("Quad Encoder board at 0x{:02X} detached: {}".format(quad_board.address, error))
+        self.quad_boards.remove(quad_board)
+        self.quad_board_index = 0
+        self.state.is_quadencoder = len(self.quad_boards) > 0
 
-        self.midi_handler = MIDIHandler(midi, config, key_cache)
+        self.quad_retry_ms = self.config.quad_retry_min
+        self.quad_retry_ticks = supervisor.ticks_ms()
+        self.display.update_text(9, "Quad Encoders: {}".format(len(self.quad_boards)))
 
-    def _init_macropad(self):
-        """Initialize MacroPad hardware"""
-        
-        print("Preparing MacroPad Display")
-        self.macropad = MacroPad(rotation=0)
-        self.state.encoder_position = self.macropad.encoder
+    def _probe_quadencoder(self):
+        """Retry missing quad encoder boards with exponential backoff. Each probe is a few short I2C writes"""
 
-    def _init_quadencoder(self):
-        """Initialize the Adafruit Quad Encoder"""
-        
-        try:
-            # For boards/chips that don't handle clock-stretching well, try running I2C at 50KHz
-            # import busio
-            # i2c = busio.I2C(board.SCL, board.SDA, frequency=50000)
-            # For using the built-in STEMMA QT connector on a microcontroller
-            i2c = board.STEMMA_I2C()
-            seesaw = adafruit_seesaw.seesaw.Seesaw(i2c, 0x49)
-
-            self.quad_encoders = [adafruit_seesaw.rotaryio.IncrementalEncoder(seesaw, n) for n in range(4)]
-            self.quad_switches = [adafruit_seesaw.digitalio.DigitalIO(seesaw, pin) for pin in (9, 17, 14, 12)]
-
-            for switch in self.quad_switches:
-                #switch.switch_to_input(adafruit_seesaw.digitalio.Pull.UP)  # input & pullup! Adafruit bug in sample code?
-                switch.switch_to_input(pull=digitalio.Pull.UP)
-
-            # four neopixels per PCB
-            self.quad_pixels = adafruit_seesaw.neopixel.NeoPixel(seesaw, 18, 4)
-            self.quad_pixels.brightness = 0.5
-
-            self.quad_last_positions = [-1, -1, -1, -1]
-            self.quad_last_positions_shift = [-1, -1, -1, -1]
-            self.quad_colors = [0, 0, 0, 0]  # Start at red (muted)
-            self.quad_colors_shift = [0, 0, 0, 0]
-
-            self.quad_encoders_toggle = [False, False, False, False]
-            self.quad_encoders_toggle_shift = [False, False, False, False]
-            
-            # Re-initialize the encoder last position tracked by reading the current state
-            # No MIDI message sent since we do not know if the EVM is online yet
-            self.preset_quad_positions()
+        if not self.config.is_quadencoder:
+            return
+        if self.quad_boards and len(self.quad_boards) == len(self.quad_slots):
+            return
 
-            # Default all encoder starting volumes to 96
-            self.preset_quad_volumes(2, 96)
+        ticks_now = supervisor.ticks_ms()
+        if ticks_diff(ticks_now, self.quad_retry_ticks) < self.quad_retry_ms:
+            return
+        self.quad_retry_ticks = ticks_now
 
-            print("Quad Encoders configured")
-            return True
-            
-        except Exception as e:
-            print("Error: Quad Encoder: {}".format(e))
-            return False
+        count = len(self.quad_boards)
+        self.state.is_quadencoder = self._attach_quad_boards(False)
 
-    def _preset_pixels(self):
-        """Set pixel colors based on configuration"""
-        
-        for pixel in range(12):
-            if self.config_handler.config_error:
-                self.macropad.pixels[pixel] = Colors.RED
-            elif pixel == self.config.get_key(self.config.key_variation):  # Variation key
-                if self.state.shift_mode == ShiftKeyMode.ACTIVE_LOCK:
-                    self.macropad.pixels[pixel] = Colors.OFFWHITE                    
-                elif self.state.encoder_mode == EncoderMode.TEMPO:
-                    self.macropad.pixels[pixel] = Colors.YELLOW
-                elif self.state.encoder_mode == EncoderMode.VOLUME:
-                    self.macropad.pixels[pixel] = Colors.PURPLE
-                elif self.state.encoder_mode == EncoderMode.VALUE:
-                    self.macropad.pixels[pixel] = Colors.WHITE
-                else:
-                    self.macropad.pixels[pixel] = self.key_cache.macropad_color_map[pixel]
-            else:
-                if (self.state.shift_mode == ShiftKeyMode.ACTIVE_SHIFT) or (self.state.shift_mode == ShiftKeyMode.ACTIVE_LOCK):
-                    self.macropad.pixels[pixel] = self.key_cache.macropad_color_map_shift[pixel]
-                else:
-                    self.macropad.pixels[pixel] = self.key_cache.macropad_color_map[pixel]
+        if len(self.quad_boards) > count:
+            self.quad_retry_ms = self.config.quad_retry_min
+            self.display.update_text(9, "Quad Encoders: {}".format(len(self.quad_boards)))
+        else:
+            self.quad_retry_ms = min(self.quad_retry_ms * 2, self.config.quad_retry_max)
 
-            self.state.lit_keys[pixel] = False
+    def _select_key_bank(self, midi_key):
+        """Process bank key: SNAPn, SCENEn or a shared bank key"""
 
-    def _handle_key_press(self, key_number):
-        """Handle key press events"""
-        
-        try:
-            key_id = self.config.get_key(key_number)
-            lookup_key, midi_key, midi_value = self.key_cache.get_key_midi(key_id, self.state.shift_mode)
-
-            # print(f"get_key: {lookup_key}, {midi_key}, {midi_value}")
-
-            # Send MIDI command or lookup and send user macro MIDI commands
-            if lookup_key == MIDIType.PEDAL:
-                self.midi_handler.send_pedal_sysex(midi_value)
-                
-            elif lookup_key == MIDIType.TAB:
-                self.midi_handler.send_tab_sysex(midi_value)
-                
-            elif lookup_key == MIDIType.MACRO:
-                self.midi_handler.send_macro_sysex(midi_key)
-                
-            else:
-                return midi_key
-
-            # Update display
-            self.display.update_text(3, "BUTTON: {}".format(midi_key))
-
-            # Handle special cases: Default encoder to tempo, 
-            # and clearing config read and red LED errors
-            if midi_key == "Start/Stop":
-                self.state.update_encoder_mode(EncoderMode.TEMPO)
-                self.display.update_text(6, "KNOB MODE: *Tempo")
-                
-                self.config_handler.config_error = False
-
-            # Update LEDs
-            self._preset_pixels()
-            self.state.lit_keys[self.config.get_key(key_number)] = True
-            self.state.led_start_time = time.time()
-
-            return midi_key
-            
-        except Exception as e:
-            print(f"Error: Sending key {key_number} ".format(e))
-            return False
-            
-    def _handle_encoder_change(self, config, direction):
-        """Handle encoder rotation"""
-        self.config = config
-        
-        self.state.encoder_sign = not self.state.encoder_sign
-        current_time = time.time()
-
-        if self.state.encoder_mode == EncoderMode.ROTOR:
-            self._process_rotor(direction)
-        elif self.state.encoder_mode == EncoderMode.TEMPO:
-            self._process_tempo(direction)
-            self.state.tempo_start_time = current_time
-        elif self.state.encoder_mode == EncoderMode.VOLUME:
-            self._process_master_volume(self.config, direction)
-            self.state.volume_start_time = current_time
-        elif self.state.encoder_mode == EncoderMode.VALUE:
-            self._process_value(direction)
-            self.state.value_start_time = current_time
-
-    def _process_rotor(self, direction):
-        """Process rotor fast/slow commands"""
-        
-        if direction == 1 and self.state.rotor_flag != 1:
-            midi_value = self.key_cache.tab_midis["ROTOR_FAST"]
-            self.display.update_text(3, "KNOB: Rotor Fast")
-            self.state.rotor_flag = 1
-            self.midi_handler.send_tab_sysex(midi_value)
-        elif direction == -1 and self.state.rotor_flag != -1:
-            midi_value = self.key_cache.tab_midis["ROTOR_SLOW"]
-            self.display.update_text(3, "KNOB: Rotor Slow")
-            self.state.rotor_flag = -1
-            self.midi_handler.send_tab_sysex(midi_value)
-
-    def _process_tempo(self, direction):
-        """Process tempo up/down commands"""
-        
-        sign = "+" if self.state.encoder_sign else ""
-        if direction == 1:
-            midi_value = self.key_cache.pedal_midis["Tempo Up"]
-            self.display.update_text(3, "KNOB: Tempo Up{}".format(sign))
+        if midi_key.startswith("SCENE") and midi_key[5:].isdigit():
+            self._recall_scene(int(midi_key[5:]) - 1)
+        elif midi_key.startswith("SNAP") and midi_key[4:].isdigit():
+            self._capture_scene(int(midi_key[4:]) - 1)
         else:
-            sign = "-" if self.state.encoder_sign else ""
-            midi_value = self.key_cache.pedal_midis["Tempo Down"]
-            self.display.update_text(3, "KNOB: Tempo Down{}".format(sign))
+            super()._select_key_bank(midi_key)
+
+    def _follow_slider(self, cc, value):
+        """The EVM slider of a CC was set by the controller, so the quad encoders tracking it continue from there"""
+
+        super()._follow_slider(cc, value)
+        for layer, n in self.key_cache.quad_cc_map.get(cc, ()):
+            if self.key_cache.quad_cache[layer][n][2] == self.config.midi_out_channel:
+                self.state.quad_volumes[layer][n] = value
+                self.state.evm_volumes[layer][n] = value
+                self.state.quad_pickup[layer][n] = True
+                self.quad_encoders_toggle[layer][n] = value > 0
+
+    def _capture_scene(self, slot):
+        """Store the quad encoder volumes of both layers and the known Slider CC values in a scene slot,
+        together with the Control Changes that recall them packed in one running status buffer"""
+
+        if not 0 <= slot < len(self.scenes):
+            print("Invalid scene: {}".format(slot + 1))
+            return
+
+        # Control Changes by (channel, CC): the known slider values first, overridden by the quad encoders
+        changes = {}
+        channel = self.config.midi_out_channel
+        for cc in self.key_cache.slider_ccs:
+            if self.state.slider_values[cc] != 0xFF:
+                changes[(channel, cc)] = self.state.slider_values[cc]
+        for layer in range(2):
+            for n in range(self.config.quad_max_encoders):
+                cc_list, switch_cc_list, midi_channel, quad_label, toggle_volume, accel_table = self.key_cache.quad_cache[layer][n]
+                for cc in cc_list:
+                    changes[(midi_channel, cc)] = self.state.quad_volumes[layer][n]
+
+        packed = self.midi_handler.pack_control_changes(sorted((key[0], key[1], value) for key, value in changes.items()))
+        volumes = (bytes(self.state.quad_volumes[0]), bytes(self.state.quad_volumes[1]))
+        sliders = tuple((key[1], value) for key, value in changes.items() if key[0] == channel)
+        self.scenes[slot] = (packed, volumes, sliders)
+
+        self.display.update_text(3, "SCENE {}: Stored".format(slot + 1))
+
+    def _recall_scene(self, slot):
+        """Send a scene's Control Changes in one write, then set every quad encoder, LEDs and display once"""
+
+        if not 0 <= slot < len(self.scenes) or self.scenes[slot] is None:
+            self.display.update_text(3, "SCENE {}: Empty".format(slot + 1))
+            return
+        packed, volumes, sliders = self.scenes[slot]
+
+        self.midi_handler.send_packed(packed)
+
+        # The EVM sliders now have the scene values, so every quad encoder continues from them
+        for layer in range(2):
+            for n in range(self.config.quad_max_encoders):
+                volume = volumes[layer][n]
+                self.state.quad_volumes[layer][n] = volume
+                self.state.evm_volumes[layer][n] = volume
+                self.state.quad_pickup[layer][n] = True
+                self.quad_encoders_toggle[layer][n] = volume > 0
+        for cc, value in sliders:
+            self.state.slider_values[cc] = value
 
-        self.midi_handler.send_pedal_sysex(midi_value)
+        self._preset_pixels()
+        self.display.update_text(3, "SCENE {}: Recalled".format(slot + 1))
 
-    def _process_master_volume(self, config, direction):
-        """Process volume up/down commands"""
+    def _process_quad_volume(self, config, layer, encoder_number, volume):
+        """Process Quad Encoder Volumes"""
         self.config = config
-        
-        sign = "+" if self.state.encoder_sign else ""
-        if direction == 1:
-            self.display.update_text(3, "KNOB: Volume Up{}".format(sign))
-        else:
-            self.display.update_text(3, "KNOB: Volume Down{}".format(sign))
 
-        self.midi_handler.send_master_volume(self.config, direction)
+        cc_list, switch_cc_list, midi_channel, quad_label, toggle_volume, accel_table = self.key_cache.quad_cache[layer][encoder_number]
 
-    def _process_value(self, direction):
-        """Process value (DIAL) up/down commands"""
-        
-        sign = "+" if self.state.encoder_sign else ""
-        if direction == 1:
-            midi_value = self.key_cache.tab_midis["DIAL_UP"]
-            self.display.update_text(3, "KNOB: Dial Up{}".format(sign))
-        else:
-            sign = "-" if self.state.encoder_sign else ""
-            midi_value = self.key_cache.tab_midis["DIAL_DOWN"]
-            self.display.update_text(3, "KNOB: Dial Down{}".format(sign))
+        for ccCode in cc_list:
+            self.midi_handler.send_quad_cc_volume(ccCode, volume, midi_channel)
+        self.state.evm_volumes[layer][encoder_number] = volume
+        self.display.update_value(9, quad_label, volume)
 
-        self.midi_handler.send_tab_sysex(midi_value)
+    def _process_quad_hires(self, layer, encoder_number, hires, delta):
+        """Process a Quad Encoder on a high resolution parameter, changed by HiStep per detent, or by one for a Ketron preset NRPN"""
 
-    def _process_quad_volume(self, config, encoder_number, volume):
-        """Process Quad Encoder Volumes"""
-        self.config = config
-        
-        if encoder_number == 0:
-            if self.state.shift_mode == ShiftKeyMode.OFF:
-                self.display.update_text(9, f"KNB1: Lower Vol {volume}")
-                ccCode = SliderCC.LOWERS_CC
-            else:
-                self.display.update_text(9, f"KNB1: Drum Vol {volume}")
-                ccCode = SliderCC.DRUM_CC
-            self.midi_handler.send_quad_cc_volume(ccCode, volume, self.config.midi_out_channel)
-        elif encoder_number == 1:
-            if self.state.shift_mode == ShiftKeyMode.OFF:
-                self.display.update_text(9, f"KNB2: Voice1 Vol {volume}")
-                ccCode = SliderCC.VOICE1_CC
-            else:
-                self.display.update_text(9, f"KNB2: Bass Vol {volume}")
-                ccCode = SliderCC.BASS_CC
-            self.midi_handler.send_quad_cc_volume(ccCode, volume, self.config.midi_out_channel)
-        elif encoder_number == 2:
-            if self.state.shift_mode == ShiftKeyMode.OFF:
-                self.display.update_text(9, f"KNB3: Voice2 Vol {volume}")
-                ccCode = SliderCC.VOICE2_CC
-            else:
-                self.display.update_text(9, f"KNB3: Chord Vol {volume}")
-                ccCode = SliderCC.CHORD_CC
-            self.midi_handler.send_quad_cc_volume(ccCode, volume, self.config.midi_out_channel)
-        elif encoder_number == 3:
-            if self.state.shift_mode == ShiftKeyMode.OFF:
-                self.display.update_text(9, f"KNB4: DrwBar Vol {volume}")
-                ccCode = SliderCC.DRAWBARS_CC
-            else:
-                self.display.update_text(9, f"KNB4: R/Chrd Vol {volume}")
-                ccCode = SliderCC.REALCHORD_CC
-            self.midi_handler.send_quad_cc_volume(ccCode, volume, self.config.midi_out_channel)
+        parameter, start, maximum = hires
+        step = 1 if parameter & MIDIHandler.HIRES_MSB else self.config.hires_step
+        midi_channel = self.key_cache.quad_cache[layer][encoder_number][2]
+        value = self.midi_handler.step_hires(parameter, midi_channel, delta * step, start, maximum)
+        self.display.update_value(9, self.key_cache.quad_cache[layer][encoder_number][3], value)
 
-    def _process_quad_switch(self, config, encoder_number):
-        """Process Quad Encoder Volumes"""
+    def _process_quad_switch(self, config, layer, encoder_number, long_press=False):
+        """Process Quad Encoder Switches: a press toggles volumes between 0 and the configured toggle volume,
+        a long press sets the toggle volume"""
         self.config = config
-        
-        list_style_voices = [SliderCC.STYLE_CC, SliderCC.DRUM_CC, SliderCC.REALCHORD_CC, SliderCC.CHORD_CC]
-        list_all_voices = [SliderCC.BASS_CC, SliderCC.LOWERS_CC, SliderCC.VOICE1_CC, SliderCC.VOICE2_CC, SliderCC.DRAWBARS_CC]
-        list_manual_voices = [SliderCC.LOWERS_CC, SliderCC.VOICE1_CC, SliderCC.VOICE2_CC, SliderCC.DRAWBARS_CC]
-        list_upper_voices = [SliderCC.VOICE1_CC, SliderCC.VOICE2_CC, SliderCC.DRAWBARS_CC]
-
-        list_bass = [SliderCC.BASS_CC]
-        list_drum = [SliderCC.DRUM_CC]
-        list_chord = [SliderCC.CHORD_CC]
-        list_realchord = [SliderCC.REALCHORD_CC]
-        
-        list_lower = [SliderCC.LOWERS_CC]
-        list_voice1 = [SliderCC.VOICE1_CC]
-        list_voice2 = [SliderCC.VOICE2_CC]
-        list_drawbar = [SliderCC.DRAWBARS_CC]
-        
-        if self.state.shift_mode == ShiftKeyMode.OFF:
-            # Process volumes in base layer
-            if encoder_number == 0 and (self.state.last_quad_switch != 0 or self.state.last_quad_switch == 10):
-                if self.quad_encoders_toggle[0] == False: 
-                    volume = self.config.encoder_vol
-                    self.quad_encoders_toggle[0] = True
-                else: 
-                    volume = 0x00
-                    self.quad_encoders_toggle[0] = False
-                for index, ccCode in enumerate(list_drawbar):
-                    self.midi_handler.send_quad_cc_volume(ccCode, volume, self.config.midi_out_channel)
-                self.preset_a_quad_volume(False, 3, volume)
-                self.display.update_text(9, f"KNB4: Drawbar Vol {volume}")
-
-            elif encoder_number == 1 and (self.state.last_quad_switch != 1 or self.state.last_quad_switch == 10):
-                if self.quad_encoders_toggle[1] == False: 
-                    volume = self.config.encoder_vol
-                    self.quad_encoders_toggle[1] = True
-                else: 
-                    volume = 0x00
-                    self.quad_encoders_toggle[1] = False
-                for index, ccCode in enumerate(list_voice2):
-                    self.midi_handler.send_quad_cc_volume(ccCode, volume, self.config.midi_out_channel)
-                self.preset_a_quad_volume(False, 2, volume)
-                self.display.update_text(9, f"KNB3: Voice2 Vol {volume}")
-
-            elif encoder_number == 2 and (self.state.last_quad_switch != 2 or self.state.last_quad_switch == 10):
-                if self.quad_encoders_toggle[2] == False: 
-                    volume = self.config.encoder_vol
-                    self.quad_encoders_toggle[2] = True
-                else: 
-                    volume = 0x00
-                    self.quad_encoders_toggle[2] = False
-                for index, ccCode in enumerate(list_voice1):
-                    self.midi_handler.send_quad_cc_volume(ccCode, volume, self.config.midi_out_channel)        
-                self.preset_a_quad_volume(False, 1, volume)
-                self.display.update_text(9, f"KNB2: Voice1 Vol {volume}")
-
-            elif encoder_number == 3 and (self.state.last_quad_switch != 3 or self.state.last_quad_switch == 10):
-                if self.quad_encoders_toggle[3] == False: 
-                    volume = self.config.encoder_vol
-                    self.quad_encoders_toggle[3] = True
-                else: 
-                    volume = 0x00
-                    self.quad_encoders_toggle[3] = False
-                for index, ccCode in enumerate(list_lower):
-                    self.midi_handler.send_quad_cc_volume(ccCode, volume, self.config.midi_out_channel)        
-                self.preset_a_quad_volume(False, 0, volume)
-                self.display.update_text(9, f"KNB1: Lowers Vol {volume}")
-        
-        else:
-            # Process volumes in shift layer
-            if encoder_number == 0 and (self.state.last_quad_switch != 0 or self.state.last_quad_switch == 10):
-                if self.quad_encoders_toggle_shift[0] == False: 
-                    volume = self.config.encoder_vol
-                    self.quad_encoders_toggle_shift[0] = True
-                else: 
-                    volume = 0x00
-                    self.quad_encoders_toggle_shift[0] = False
-                for index, ccCode in enumerate(list_realchord):
-                    self.midi_handler.send_quad_cc_volume(ccCode, volume, self.config.midi_out_channel)
-                self.preset_a_quad_volume(True, 3, volume)
-                self.display.update_text(9, f"KNB4: R/Chord Vol {volume}")
-
-            elif encoder_number == 1 and (self.state.last_quad_switch != 1 or self.state.last_quad_switch == 10):
-                if self.quad_encoders_toggle_shift[1] == False: 
-                    volume = self.config.encoder_vol
-                    self.quad_encoders_toggle_shift[1] = True
-                else: 
-                    volume = 0x00
-                    self.quad_encoders_toggle_shift[1] = False
-                for index, ccCode in enumerate(list_chord):
-                    self.midi_handler.send_quad_cc_volume(ccCode, volume, self.config.midi_out_channel)
-                self.preset_a_quad_volume(True, 2, volume)
-                self.display.update_text(9, f"KNB3: Chord Vol {volume}")
-
-            elif encoder_number == 2 and (self.state.last_quad_switch != 2 or self.state.last_quad_switch == 10):
-                if self.quad_encoders_toggle_shift[2] == False: 
-                    volume = self.config.encoder_vol
-                    self.quad_encoders_toggle_shift[2] = True
-                else: 
-                    volume = 0x00
-                    self.quad_encoders_toggle_shift[2] = False
-                for index, ccCode in enumerate(list_bass):
-                    self.midi_handler.send_quad_cc_volume(ccCode, volume, self.config.midi_out_channel)
-                self.preset_a_quad_volume(True, 1, volume)
-                self.display.update_text(9, f"KNB2: Bass Vol {volume}")
-
-            elif encoder_number == 3 and (self.state.last_quad_switch != 3 or self.state.last_quad_switch == 10):
-                if self.quad_encoders_toggle_shift[3] == False: 
-                    volume = self.config.encoder_vol
-                    self.quad_encoders_toggle_shift[3] = True
-                else: 
-                    volume = 0x00
-                    self.quad_encoders_toggle_shift[3] = False
-                for index, ccCode in enumerate(list_drum):
-                    self.midi_handler.send_quad_cc_volume(ccCode, volume, self.config.midi_out_channel)        
-                self.preset_a_quad_volume(True, 0, volume)
-                self.display.update_text(9, f"KNB1: Drums Vol {volume}")
-
-        # Remember the last encoder switch pressed to avoid duplicate triggers, but re-enable via timer
-        self.state.last_quad_switch = encoder_number
-        self.state.quad_switch_start_time = time.time()
-
-    def _handle_encoder_switch(self):
-        """Handle encoder switch press. Modes 0:Rotor, 1:Tempo, 2:Volume, 3:Dial (disabled)"""
-        
-        self.state.encoder_mode = self.state.encoder_mode + 1
-        if self.state.encoder_mode > 2: self.state.encoder_mode = 0
-        current_time = time.time()
-
-        if self.state.encoder_mode == EncoderMode.ROTOR:
-            self.display.update_text(3, "KNOB: -")
-            self.display.update_text(6, "KNOB MODE: Rotor")
-        elif self.state.encoder_mode == EncoderMode.TEMPO:
-            self.display.update_text(3, "KNOB: -")
-            self.display.update_text(6, "KNOB MODE: *Tempo")
-            self.state.tempo_start_time = current_time
-        elif self.state.encoder_mode == EncoderMode.VOLUME:
-            self.display.update_text(3, "KNOB: -")
-            self.display.update_text(6, "KNOB MODE: *Volume")
-            self.state.volume_start_time = current_time
-        elif self.state.encoder_mode == EncoderMode.VALUE:
-            self.display.update_text(3, "KNOB: -")
-            self.display.update_text(6, "KNOB MODE: *Dial")
-            self.state.value_start_time = current_time
 
-        self._preset_pixels()
+        cc_list, switch_cc_list, midi_channel, quad_label, toggle_volume, accel_table = self.key_cache.quad_cache[layer][encoder_number]
+
+        toggles = self.quad_encoders_toggle[layer]
+        toggles[encoder_number] = long_press or not toggles[encoder_number]
+        volume = toggle_volume if toggles[encoder_number] else 0x00
+
+        for ccCode in switch_cc_list:
+            self.midi_handler.send_quad_cc_volume(ccCode, volume, midi_channel)
+        self.preset_a_quad_volume(layer, encoder_number, volume)
+        self.display.update_value(9, quad_label, volume)
+
+        # The EVM now has the switch volume, so the encoder is picked up
+        self.state.evm_volumes[layer][encoder_number] = volume
+        self.state.quad_pickup[layer][encoder_number] = True
 
     def preset_quad_positions(self):
         """Preset the encoder position tracking on each shift layer state change to prevent unintended triggers"""
 
-        #  Read current position and preset
-        positions = [encoder.position for encoder in self.quad_encoders]
-        for n, rotary_pos in enumerate(positions):
-            self.quad_last_positions[n] = rotary_pos
-            self.quad_last_positions_shift[n] = rotary_pos
+        #  Read current position and preset. Last board first, a board that fails is detached from the list
+        for index in range(len(self.quad_boards) - 1, -1, -1):
+            quad_board = self.quad_boards[index]
+            try:
+                self._preset_board_positions(quad_board)
+            except (OSError, RuntimeError) as e:
+                self._detach_quad_board(quad_board, e)
+
+    def _preset_board_positions(self, quad_board):
+        """Preset the position tracking of one board's encoders"""
+
+        for i in range(4):
+            self.quad_last_positions[quad_board.first + i] = quad_board.encoders[i].position
                         
+
     def preset_quad_volumes(self, shift_layer, volume):
         """Preset all quad volumes on both layers to volume value - mostly all 0 or all 96"""
 
-        for n in range(4):
+        for n in range(self.config.quad_max_encoders):
             if shift_layer == 0 or shift_layer == 2:
-                self.state.quad_volumes[n] = volume
+                self.state.quad_volumes[0][n] = volume
             if shift_layer == 1 or shift_layer == 2:
-                self.state.quad_volumes_shift[n] = volume
+                self.state.quad_volumes[1][n] = volume
 
-    def preset_a_quad_volume(self, shift_layer, encoder_number, volume):
+    def preset_a_quad_volume(self, layer, encoder_number, volume):
         """Preset a single quad volume to volume value - 0 or all 96"""
 
-        if shift_layer == False:
-            self.state.quad_volumes[encoder_number] = volume
-        else:
-            self.state.quad_volumes_shift[encoder_number] = volume
+        self.state.quad_volumes[layer][encoder_number] = volume
 
-    def adjust_quadencoder_step(self, current_volume, time_delta, step) -> int:
-        """Level adjust the volume steps to avoid to many clicks at lower volumes"""
-        if self.config.encoder_grad == False:
-            return step
-        
-        adjusted_step = step
+    def _learn_slider(self, cc, value, midi_channel):
+        """Record a slider value reported by the EVM, or from the snapshot, for the quad encoders tracking that CC"""
+
+        if midi_channel is None or midi_channel == self.config.midi_out_channel:
+            self.state.slider_values[cc] = value
+
+        for layer, n in self.key_cache.quad_cc_map.get(cc, ()):
+            if midi_channel is not None and midi_channel != self.key_cache.quad_cache[layer][n][2]:
+                continue
+
+            self.state.evm_volumes[layer][n] = value
+            self.quad_encoders_toggle[layer][n] = value > 0
 
-        if time_delta < 100/1000 or current_volume < 32:
-            adjusted_step = step * 4 
-        elif time_delta < 250/1000:
-            adjusted_step = step * 2
+            if self.config.encoder_pickup:
+                # Soft takeover: keep the encoder volume and wait for it to reach the EVM value
+                self.state.quad_pickup[layer][n] = value == self.state.quad_volumes[layer][n]
+            else:
+                # Relative encoders can simply continue from the EVM value
+                self.state.quad_volumes[layer][n] = value
+
+    def _check_quad_pickup(self, layer, encoder_number, previous_volume):
+        """True once the encoder volume reaches or crosses the learned EVM value, else show the gap"""
 
-        return adjusted_step
+        volume = self.state.quad_volumes[layer][encoder_number]
+        evm_volume = self.state.evm_volumes[layer][encoder_number]
+
+        if min(previous_volume, volume) <= evm_volume <= max(previous_volume, volume):
+            self.state.quad_pickup[layer][encoder_number] = True
+            return True
+
+        quad_label = self.key_cache.quad_cache[layer][encoder_number][3]
+        self.display.update_value(9, quad_label, volume, evm_volume)
+        return False
+
+    def adjust_quadencoder_step(self, current_volume, delta, interval_ms, step, accel_table) -> int:
+        """Scale the volume step by the acceleration table for the time between detents"""
+
+        multiplier = self.key_cache.accel.get_multiplier(accel_table, interval_ms)
+
+        # EncGrad also takes larger steps up from low volumes to avoid too many clicks
+        if self.config.encoder_grad and delta > 0 and current_volume < 32 and multiplier < 4:
+            multiplier = 4
+
+        return step * multiplier
 
     def _handle_quadencoder(self, config):
-        """Handle quad encoder rotary encoders and switchs press in base and shift layer modes, as well as for reverse encoders."""
+        """Handle quad encoder rotary encoders and switchs press in every shift mode, as well as for reverse encoders."""
         self.config = config
 
-        # Negate the position to make clockwise rotation positive
-        positions = [encoder.position for encoder in self.quad_encoders]
-        
-        for n, rotary_pos in enumerate(positions):
-            
-            # Use Shift Lock or Shift Normal lists to adjust valyes
-            if self.state.shift_mode == ShiftKeyMode.ACTIVE_LOCK:
-                # If switch not pressed, update volume for encoders 
-                if self.quad_switches[n].value:                  
-
-                    if rotary_pos != self.quad_last_positions_shift[n]:                    
-
-                        time_now = time.monotonic()
-                        time_delta = time_now - self.state.quad_encoders_time[n] 
-
-                        if self.config.encoder_fwd == True:
-
-                            # Update channel volume with new encoder position 
-                            if rotary_pos > self.quad_last_positions_shift[n]:      # Advance forward
-                                self.state.quad_volumes_shift[n] += self.adjust_quadencoder_step(self.state.quad_volumes_shift[n], time_delta, self.config.encoder_step)
-                                
-                            elif rotary_pos < self.quad_last_positions_shift[n]:    # Advance backward
-                                if self.state.quad_volumes_shift[n] == 127:
-                                    self.state.quad_volumes_shift[n] -= self.config.encoder_step - 1                                
-                                else:
-                                    self.state.quad_volumes_shift[n] -= self.config.encoder_step
-
-                        else:
-                            # Update channel volume with new encoder position 
-                            if rotary_pos < self.quad_last_positions_shift[n]:      # Advance forward
-                                self.state.quad_volumes_shift[n] += self.adjust_quadencoder_step(self.state.quad_volumes_shift[n], time_delta, self.config.encoder_step)
-                                
-                            elif rotary_pos > self.quad_last_positions_shift[n]:    # Advance backward
-                                if self.state.quad_volumes_shift[n] == 127:
-                                    self.state.quad_volumes_shift[n] -= self.config.encoder_step - 1                                
-                                else:
-                                    self.state.quad_volumes_shift[n] -= self.config.encoder_step
-                       
-                        # Adjust for the max and min values
-                        if self.state.quad_volumes_shift[n] > 127: self.state.quad_volumes_shift[n] = 127
-                        if self.state.quad_volumes_shift[n] <= 0: self.state.quad_volumes_shift[n] = 0
-                                                     
-                        # Send adjusted volume MIDI message
-                        self._process_quad_volume(self.config, n, self.state.quad_volumes_shift[n])
-                                                            
-                        # Set last position to current position after evaluating
-                        self.quad_last_positions_shift[n] = rotary_pos
-
-                        # Remember last time this encoder was ticked up or down. Used to adjust step size
-                        self.state.quad_encoders_time[n] = time_now
-
-                # Handle switch press for this encoder
-                else:
-                    self._process_quad_switch(config, n)
-                        
-            elif self.state.shift_mode == ShiftKeyMode.OFF:                    
-                # If switch not pressed, update volume for encoders 
-                if self.quad_switches[n].value:  
-                    
-                    if rotary_pos != self.quad_last_positions[n]:                        
-
-                        time_now = time.monotonic()
-                        time_delta = time_now - self.state.quad_encoders_time[n]
-
-                        if self.config.encoder_fwd == True:                 
-                            # Update channel volume with new encoder position 
-                            if rotary_pos > self.quad_last_positions[n]:        # Advance forward
-                                self.state.quad_volumes[n] += self.adjust_quadencoder_step(self.state.quad_volumes[n], time_delta, self.config.encoder_step)
-
-                            elif rotary_pos < self.quad_last_positions[n]:      # Advance backward
-                                if self.state.quad_volumes[n] == 127:
-                                    self.state.quad_volumes[n] -= self.config.encoder_step - 1                                
-                                else:
-                                    self.state.quad_volumes[n] -= self.config.encoder_step
-
-                        else:
-                            # Update channel volume with new encoder position 
-                            if rotary_pos < self.quad_last_positions[n]:        # Advance forward
-                                self.state.quad_volumes[n] += self.adjust_quadencoder_step(self.state.quad_volumes[n], time_delta, self.config.encoder_step)
-
-                            elif rotary_pos > self.quad_last_positions[n]:      # Advance backward
-                                if self.state.quad_volumes[n] == 127:
-                                    self.state.quad_volumes[n] -= self.config.encoder_step - 1                                
-                                else:
-                                    self.state.quad_volumes[n] -= self.config.encoder_step
-                            
-                        # Adjust for the max and min values
-                        if self.state.quad_volumes[n] > 127: self.state.quad_volumes[n] = 127
-                        if self.state.quad_volumes[n] <= 0: self.state.quad_volumes[n] = 0
-                         
-                        # Send adjusted volume MIDI message
-                        self._process_quad_volume(self.config, n, self.state.quad_volumes[n])
-                                                            
-                        # Set last position to current position after evaluating
+        # Read the next board in turn: its four encoders and all four switches in one GPIO read
+        quad_board = self.quad_boards[self.quad_board_index]
+        self.quad_board_index = (self.quad_board_index + 1) % len(self.quad_boards)
+
+        ticks_now = supervisor.ticks_ms()
+        switches = quad_board.switches
+
+        # A board that stops answering is detached and probed for again, the other boards keep working
+        try:
+            quad_board.read_positions()
+            quad_board.read_switches(ticks_now)
+        except (OSError, RuntimeError) as e:
+            self._detach_quad_board(quad_board, e)
+            return
+
+        positions = quad_board.positions
+        for i in range(4):
+            rotary_pos = positions[i]
+            n = quad_board.first + i
+
+            # If switch not pressed, update volume for encoders 
+            if not switches.pressed[i]:
+
+                if rotary_pos != self.quad_last_positions[n]:
+
+                    # Knob turned while the Variation key is held: use the Shift layer
+                    self.state.mark_activity()
+                    self._activate_quad_shift()
+
+                    layer = self.state.get_layer()
+                    volumes = self.state.quad_volumes[layer]
+                    accel_table = self.key_cache.quad_cache[layer][n][5]
+
+                    ticks_delta = ticks_diff(ticks_now, self.state.quad_encoders_ticks[n])
+
+                    # All detents since the last loop, clockwise positive and reversed for encoders mounted backward
+                    delta = rotary_pos - self.quad_last_positions[n]
+                    if not self.config.encoder_fwd:
+                        delta = -delta
+
+                    # High resolution parameters are sent by the loop stage, not as volumes
+                    hires = self.key_cache.quad_hires[layer][n]
+                    if hires:
+                        multiplier = self.key_cache.accel.get_multiplier(accel_table, ticks_delta // abs(delta))
+                        self._process_quad_hires(layer, n, hires, delta * multiplier)
                         self.quad_last_positions[n] = rotary_pos
+                        self.state.quad_encoders_ticks[n] = ticks_now
+                        continue
 
-                        # Remember last time this encoder was ticked up or down
-                        self.state.quad_encoders_time[n] = time_now
+                    # Step size adjusted by the average time per detent
+                    step = self.adjust_quadencoder_step(volumes[n], delta, ticks_delta // abs(delta), self.config.encoder_step, accel_table)
+                    previous_volume = volumes[n]
+                    if delta < 0 and volumes[n] == 127:
+                        volumes[n] += delta * step + 1
+                    else:
+                        volumes[n] += delta * step
 
-                # Handle switch press for this encoder
-                else:
-                    self._process_quad_switch(config, n)
+                    # Adjust for the max and min values
+                    if volumes[n] > 127: volumes[n] = 127
+                    if volumes[n] <= 0: volumes[n] = 0
 
+                    # Send adjusted volume MIDI message, in pickup mode only once the EVM slider value is reached
+                    if self.state.quad_pickup[layer][n] or self._check_quad_pickup(layer, n, previous_volume):
+                        self._process_quad_volume(self.config, layer, n, volumes[n])
 
-    def _update_display(self):
-        """Update display based on timeouts"""
-        
-        timeout_type = self.state.check_timeouts()
-
-        if timeout_type == "timeout_tempo" or timeout_type == "timeout_volume":
-            self.display.update_text(3, "KNOB: -")
-            self.display.update_text(6, "KNOB MODE: Rotor")
-            self._preset_pixels()
-        elif timeout_type == "timeout_version":
-            self.display.update_text(9, "")
-        elif timeout_type == "timeout_led":
-            self._preset_pixels()
-
-    def _update_pixels(self):
-        """Update pixel colors for lit keys"""
-        
-        for pixel in range(12):
-            if self.state.lit_keys[pixel]:
-                self.macropad.pixels[self.config.get_key(pixel)] = Colors.WHITE
+                    # Set last position to current position after evaluating
+                    self.quad_last_positions[n] = rotary_pos
 
-    def run(self):
-        """Main controller loop"""
-        
-        self.key_start_time = 0
-        self.shift_start_time  = 0
-        self.last_key_pressed = self.config.key_variation        
-        
-        while True:
-            try:
-                # Handle key events
-                key_event = self.macropad.keys.events.get()
-                
-                # Pressed: Check for potential Shift Key operation. If Variation key pressed and held in, then
-                # shift key is pending and no MIDI Variation send until key release
-                if key_event and key_event.pressed:
-                    self.last_key_pressed = key_event.key_number
-                    
-                    if key_event.key_number == self.config.key_variation and self.config.shift_enable == True:
-                        if self.state.shift_mode == ShiftKeyMode.ACTIVE_LOCK:
-                            # print("Shift mode: Off")
-                            self.state.shift_mode = ShiftKeyMode.OFF                        
-                            self.display.update_text(9, "")
-                            self._preset_pixels()
-                            self.preset_quad_positions()                        
-                        else:
-                            self.state.shift_mode = ShiftKeyMode.PENDING
-                            # print("Shift mode: Pending")                        
-                            self.state.lit_keys[key_event.key_number] = True
-                            self.state.led_start_time = time.time()
-                            self.shift_start_time = time.time()
-                    else:
-                        # Other non VAR/Shift keys
-                        if self.state.shift_mode == ShiftKeyMode.PENDING:
-                            self.state.shift_mode = ShiftKeyMode.ACTIVE_SHIFT                        
-                            self.display.update_text(9, "Layer: Shift")
-                            # print("Shift mode: Active Shift")
-                        self._handle_key_press(key_event.key_number)        # Send any key MIDI message
-                    self.key_start_time = time.time()
-                    continue
+                    # Remember last time this encoder was ticked up or down. Used to adjust step size
+                    self.state.quad_encoders_ticks[n] = ticks_now
 
-                # Released: If Variation key released and still in pending mode, send MIDI "VARIATION"
-                # Reset shift mode when in pending or active for Variation key release
-                if key_event and key_event.released:
-                    if key_event.key_number == self.config.key_variation:
-                        if (self.state.shift_mode == ShiftKeyMode.PENDING) and ((time.time() - self.shift_start_time) > self.config.shift_hold_timer):
-                            self.state.shift_mode = ShiftKeyMode.ACTIVE_LOCK
-                            self.display.update_text(9, "Layer: Shift Lock")
-                            self._preset_pixels()
-                            self.preset_quad_positions()
-                            # print("Shift mode: Active Lock")
-                        elif (self.state.shift_mode == ShiftKeyMode.PENDING) or (self.state.shift_mode == ShiftKeyMode.ACTIVE_SHIFT):
-                            # Send VAR MIDI message, but only if no other key pressed during shift mode
-                            if self.last_key_pressed == self.config.key_variation:
-                                self._handle_key_press(key_event.key_number)                                    
-                            self.state.shift_mode = ShiftKeyMode.OFF                        
-                            self.display.update_text(9, "")
-                            self._preset_pixels()
-                            self.preset_quad_positions()
-                            # print("Shift mode: Off")
-                                                
-                    elif key_event.key_number == TUNE_KEY: 
-                        if (time.time() - self.key_start_time) > self.config.tune_hold_timer:
-                            print("Starting test tune")
-                            self.display.update_text(9, "CHN #5: Test Tune")
-                            self.midi_handler.test_connectivity()
-                            self.display.update_text(9, "")        
-                    continue
-                            
-                # Handle encoder rotation
-                if self.state.encoder_position != self.macropad.encoder:
-                    direction = 1 if self.state.encoder_position < self.macropad.encoder else -1
-                    self._handle_encoder_change(self.config, direction)
-                    self.state.encoder_position = self.macropad.encoder
+            # A long press sets the toggle volume while held, a short press toggles on release.
+            # The layer is taken at press time, the Variation key may be let go before the switch
+            if switches.events[i]:
+                self.state.mark_activity()
+            if switches.events[i] == SwitchEvent.PRESS:
+                self._activate_quad_shift()
+                self.quad_switch_layers[n] = self.state.get_layer()
+            elif switches.events[i] == SwitchEvent.LONG:
+                self._process_quad_switch(config, self.quad_switch_layers[n], n, long_press=True)
+            elif switches.events[i] == SwitchEvent.RELEASE and not switches.long_sent[i]:
+                self._process_quad_switch(config, self.quad_switch_layers[n], n)
 
-                # Handle encoder switch
-                self.macropad.encoder_switch_debounced.update()
-                if self.macropad.encoder_switch_debounced.pressed:
-                    self._handle_encoder_switch()
+    def _activate_quad_shift(self):
+        """Move a pending shift to active shift when a quad encoder is used while the Variation key is held"""
 
-                # Handle quad encoder board
-                if self.state.is_quadencoder:
-                    self._handle_quadencoder(self.config)
+        if self.state.shift_mode == ShiftKeyMode.PENDING:
+            self.state.shift_mode = ShiftKeyMode.ACTIVE_SHIFT
+            self.display.update_text(9, "Layer: Shift")
 
-                # Update display and handle timeouts
-                self._update_display()
+            # Variation key release must end the shift instead of sending VARIATION
+            self.last_key_pressed = -1
 
-                # Update pixels
-                self._update_pixels()
+    def _run_quad(self):
+        """Main loop stage: quad encoder boards and probing for missing boards"""
 
-            except Exception as e:
-                print("Error in main loop: {}".format(e))
-                time.sleep(0.1)  # Brief delay on error
+        if self.state.is_quadencoder:
+            self._handle_quadencoder(self.config)
+            self.midi_handler.send_hires()
+        self._probe_quadencoder()
 
 # --- Main Execution ---
 if __name__ == "__main__":
     try:
-        controller = EVMController()
+        controller = EVMController(boot_marks)
         controller.run()
         
     except Exception as e:
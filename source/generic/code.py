@@ -3,12 +3,14 @@
 # Note: The Genos does not seem to accept SysEx messages from external controllers.
 # It hadles MIDI NoteOn and NoteOff only and We may remove SysEx support to clean the code up
 
-import board, displayio
-import terminalio
+# Startup benchmark: time since power on and free heap before the imports
 import time
+import gc
+startup_ns = time.monotonic_ns()
+startup_mem = gc.mem_free()
+
+import board
 
-from adafruit_display_text import bitmap_label as label
-from adafruit_displayio_layout.layouts.grid_layout import GridLayout
 from adafruit_macropad import MacroPad
 
 import usb_midi
@@ -18,6 +20,13 @@ from adafruit_midi.note_off import NoteOff
 from adafruit_midi.note_on import NoteOn
 from adafruit_midi.system_exclusive import SystemExclusive
 
+# Shared core, see lib/evmcore.py. The Genos has its own key types and encoder modes
+import evmcore
+from evmcore import (MIDIStatus, ShiftKeyMode, EFXLevel, Colors, COLOR_NAMES, TUNE_KEY, TapTempo, DeviceProfile)
+
+imports_ns = time.monotonic_ns()
+imports_mem = gc.mem_free()
+
 # Set to FALSE for no startup test
 TEST_CONNECT = False
 
@@ -30,48 +39,8 @@ class MIDIType:
     NOTE = 0
     PEDAL = 1
     MACRO = 2
+    TAP = 3
     
-class MIDIStatus:
-    OFF = 0x00
-    ON = 0x7F
-
-class ShiftKeyMode:
-    OFF = 0
-    PENDING = 1
-    ACTIVE_SHIFT = 2
-    ACTIVE_LOCK = 3
-
-class EFXLevel:
-    Voice1 = 0x07
-    Voice2 = 0x3D
-    RealChord = 0x08
-    LeftGM = 0x3F
-
-class Colors:
-    WHITE = 0x606060
-    BLUE = 0x000020
-    GREEN = 0x002000
-    RED = 0x200000
-    ORANGE = 0x701E02
-    PURPLE = 0x800080
-    YELLOW = 0x808000
-    TEAL = 0x004040
-
-# Color mapping dictionary
-COLOR_MAP = {
-    'red': Colors.RED,
-    'green': Colors.GREEN,
-    'blue': Colors.BLUE,
-    'purple': Colors.PURPLE,
-    'yellow': Colors.YELLOW,
-    'orange': Colors.ORANGE,
-    'white': Colors.WHITE,
-    'teal': Colors.TEAL
-}
-
-# Key used to trigger test tune
-TUNE_KEY = 11
-
 # --- Configuration Class ---
 class ControllerConfig:
     def __init__(self):
@@ -89,6 +58,10 @@ class ControllerConfig:
         self.version_timer = 15
         self.key_bright_timer = 0.20
         self.key_hold_timer = 1
+
+        # Tap tempo: tap intervals averaged and the pause in milliseconds that starts a new run of taps
+        self.tap_window = 4
+        self.tap_timeout = 2000
         
         # Initialize MacroPad key mappings for Genos Layout
         self.key_map = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
@@ -102,8 +75,12 @@ class ControllerConfig:
 
 # --- MIDI Handler Class ---
 class MIDIHandler:
-    def __init__(self, midi_instance, key_cache):
+    TEMPO_MIN = 5
+    TEMPO_MAX = 500
+
+    def __init__(self, midi_instance, midi_out, key_cache):
         self.midi = midi_instance
+        self.midi_out = midi_out
         self.key_cache = key_cache
 
         self.manufacturer_id = bytearray([0x43])
@@ -111,7 +88,10 @@ class MIDIHandler:
         # Pre-allocate bytearrays for memory efficiency
         self.section_sysex = bytearray([0x7E, 0x00, 0x00, 0x00])
         self.startstop_sysex = bytearray([0x00, 0x00])
-        self.tempo_sysex = bytearray([0x7E, 0x01, 0x00, 0x00, 0x00, 0x00])    # Tempo 1 to 4 up to value of 127
+        # Complete Tempo SysEx F0 43 7E 01 t4 t3 t2 t1 F7, t4 to t1 copied from the tempo table
+        self.tempo_sysex = bytearray([0xF0, 0x43, 0x7E, 0x01, 0x00, 0x00, 0x00, 0x00, 0xF7])
+        self.tempo_table = None
+        self.tempo_pending = False
 
         self.cur_volume = 100
         self.cur_tempo = 90
@@ -133,25 +113,36 @@ class MIDIHandler:
             print("Error sending pedal SysEx: {}".format(e))
             return False
 
-    def send_tempo_sysex(self, direction):
-        """Send Tempo SysEx command
-            To do: Update for Genos
+    def send_tempo_sysex(self, delta):
+        """Step the tempo by the encoder detents turned, flush_tempo sends it
             F0 43 7E 01 t4 t3 t2 t1 F7"""
 
-        # Tempo max = 127 and min = 0 in increments of 1 (or more) to manage encoder turns
-        if direction == 1:
-            self.cur_tempo = self.cur_tempo + 1
-            if self.cur_tempo > 500:
-                self.cur_tempo = 500
-        else:
-            self.cur_tempo = self.cur_tempo - 1
-            if self.cur_tempo < 0:
-                self.cur_tempo = 0
+        # Detents only move the target, a fast spin sends the final tempo once per loop pass
+        self.cur_tempo = max(self.TEMPO_MIN, min(self.TEMPO_MAX, self.cur_tempo + delta))
+        self.tempo_pending = True
+        return True
+
+    def send_tempo_bpm(self, bpm):
+        """Send an absolute tempo in one Tempo SysEx, the encoder continues from it"""
+
+        self.cur_tempo = max(self.TEMPO_MIN, min(self.TEMPO_MAX, bpm))
+        self.tempo_pending = True
+        return self.flush_tempo()
+
+    def flush_tempo(self):
+        """Send the pending tempo as one write of the prebuilt Tempo SysEx"""
+
+        if not self.tempo_pending:
+            return True
+        self.tempo_pending = False
+
+        if self.tempo_table is None:
+            self.tempo_table = self.tempo_genos()
 
         try:
-            self.tempo_sysex = self.tempo_genos(self.cur_tempo)
-            sysex_message = SystemExclusive(self.manufacturer_id, self.tempo_sysex)
-            self.midi.send(sysex_message)
+            index = (self.cur_tempo - self.TEMPO_MIN) * 4
+            self.tempo_sysex[4:8] = self.tempo_table[index:index + 4]
+            self.midi_out.write(self.tempo_sysex)
             return True
 
         except Exception as e:
@@ -163,35 +154,23 @@ class MIDIHandler:
     See: https://forum.psrtutorial.com/index.php?topic=48303.0
     """
 
-    def hex_convert(self, mynumber):
-        """Convert a number to hexadecimal string with even length padding"""
-        hex_string = hex(mynumber)[2:]  # Remove '0x' prefix
-
-        if len(hex_string) % 2:
-            hex_string = '0' + hex_string
-
-        return hex_string
-
-    def tempo_genos(self, tempo):
-        """Calculate tempo PSR or Genos (Yamaha SysEx format)"""
-        total_tempo = int(60000000 / tempo)
+    def tempo_genos(self):
+        """Build the PSR or Genos (Yamaha SysEx format) tempo bytes t4 t3 t2 t1 for every BPM from TEMPO_MIN to TEMPO_MAX"""
 
-        # Extract 7-bit chunks in Yamaha order (T4, T3, T2, T1)
-        x_tempo4 = (total_tempo >> 21) & 127  # 21 bit shift
-        x_tempo3 = (total_tempo >> 14) & 127  # 14 bit shift
-        x_tempo2 = (total_tempo >> 7) & 127   # 7 bit shift
-        x_tempo1 = total_tempo & 127          # 0 bit shift
+        table = bytearray(4 * (self.TEMPO_MAX - self.TEMPO_MIN + 1))
+        index = 0
+        for tempo in range(self.TEMPO_MIN, self.TEMPO_MAX + 1):
+            # Microseconds per quarter note
+            total_tempo = 60000000 // tempo
 
-        # Build SysEx message - minus start and end which is added by Adafruit MIDI library
-        sysex_parts = bytearray([
-            0x01,     # Sub-status
-            x_tempo4,   # Tempo byte 4
-            x_tempo3,   # Tempo byte 3
-            x_tempo2,   # Tempo byte 2
-            x_tempo1    # Tempo byte 1
-        ])
+            # Extract 7-bit chunks in Yamaha order (T4, T3, T2, T1)
+            table[index] = (total_tempo >> 21) & 127        # 21 bit shift
+            table[index + 1] = (total_tempo >> 14) & 127    # 14 bit shift
+            table[index + 2] = (total_tempo >> 7) & 127     # 7 bit shift
+            table[index + 3] = total_tempo & 127            # 0 bit shift
+            index += 4
 
-        return sysex_parts
+        return table
 
     def send_note(self, note):
         """Send a MIDI note"""
@@ -263,16 +242,17 @@ class KeyLookupCache:
             Colors.ORANGE, Colors.TEAL, Colors.GREEN
         ]
 
+        # The last Shift layer key taps the tempo, the encoder switch locks the Shift layer
         self.macropad_key_map_shift = [
             "0:G#1", "0:E1", "0:C1", "0:A1",
             "0:F1", "0:C#1","0:A#1", "0:F#1",
-            "0:D1", "0:B1", "0:G1", "0:D#1"
+            "0:D1", "0:B1", "0:G1", "3:TAP"
         ]
         self.macropad_color_map_shift = [
             Colors.ORANGE, Colors.BLUE, Colors.GREEN,
             Colors.ORANGE, Colors.BLUE, Colors.GREEN,
             Colors.ORANGE, Colors.BLUE, Colors.GREEN,
-            Colors.ORANGE, Colors.BLUE, Colors.GREEN
+            Colors.ORANGE, Colors.BLUE, Colors.YELLOW
         ]
 
         self.user_macro_midis = [
@@ -302,66 +282,6 @@ class KeyLookupCache:
             "C2": 0x30, "C#2": 0x31
         }
 
-    def _init_pedal_midis(self):
-        """Initialize pedal MIDI dictionary"""
-        return {
-            "Sustain": 0x00, "Soft": 0x01, "Sostenuto": 0x02, "Arr.A": 0x03,
-            "Arr.B": 0x04, "Arr.C": 0x05, "Arr.D": 0x06, "Fill1": 0x07,
-            "Fill2": 0x08, "Fill3": 0x09, "Fill4": 0x0A, "Break1": 0x0B,
-            "Break2": 0x0C, "Break3": 0x0D, "Break4": 0x0E, "Intro/End1": 0x0F,
-            "Intro/End2": 0x10, "Intro/End3": 0x11, "Start/Stop": 0x12,
-            "Tempo Up": 0x13, "Tempo Down": 0x14, "Fill": 0x15, "Break": 0x16,
-            "To End": 0x17, "Bass to Lowest": 0x18, "Bass to Root": 0x19,
-            "Live Bass": 0x1A, "Acc.BassToChord": 0x1B, "Manual Bass": 0x1C,
-            "Voice Lock Bass": 0x1D, "Bass Mono/Poly": 0x1E, "Dial Down": 0x1F,
-            "Dial Up": 0x20, "Auto Fill": 0x21, "Fill to Arr.": 0x22,
-            "After Fill": 0x23, "Low. Hold Start": 0x24, "Low. Hold Stop": 0x25,
-            "Low. Hold Break": 0x26, "Low. Stop Mute": 0x27, "Low. Mute": 0x28,
-            "Low. and Bass": 0x29, "Low. Voice Lock": 0x2A, "Pianist": 0x2B,
-            "Pianist Auto/Stand.": 0x2C, "Pianist Sustain": 0x2D, "Bassist": 0x2E,
-            "Bassist Easy/Exp.": 0x2F, "Key Start": 0x30, "Key Stop": 0x31,
-            "Enter": 0x32, "Exit": 0x33, "Registration": 0x34, "Fade": 0x35,
-            "Harmony": 0x36, "Octave Up": 0x37, "Octave Down": 0x38,
-            "RestartCount In": 0x39, "Micro1 On/Off": 0x3A, "Micro1 Down": 0x3B,
-            "Micro1 Up": 0x3C, "Voicetr.On/Off": 0x3D, "Voicetr.Down": 0x3E,
-            "Voicetr.Up": 0x3F, "Micro2 On/Off": 0x40, "EFX1 On/Off": 0x41,
-            "EFX2 On/Off": 0x42, "Arabic.Set1": 0x43, "Arabic.Set2": 0x44,
-            "Arabic.Set3": 0x45, "Arabic.Set4": 0x46, "Dry On Stop": 0x47,
-            "Pdf Page Down": 0x48, "Pdf Page Up": 0x49, "Pdf Scroll Down": 0x4A,
-            "Pdf Scroll Up": 0x4B, "Glide Down": 0x4C, "Lead Mute": 0x4D,
-            "Expr. Left/Style": 0x4E, "Arabic Reset": 0x4F, "Hold": 0x50,
-            "2nd On/Off": 0x51, "Pause": 0x52, "Talk On/Off": 0x53,
-            "Manual Drum": 0x54, "Kick Off": 0x55, "Snare Off": 0x56,
-            "Rimshot Off": 0x57, "Hit-Hat Off": 0x58, "Cymbal Off": 0x59,
-            "Tom Off": 0x5A, "Latin1 Off": 0x5B, "Latin2 Off": 0x5C,
-            "Latin3/Tamb Off": 0x5D, "Clap/fx Off": 0x5E, "Voice Down": 0x5F,
-            "Voice Up": 0x60, "Regis Down": 0x61, "Regis Up": 0x62,
-            "Style Voice Down": 0x63, "Style Voice Up": 0x64, "EFX1 Preset Down": 0x65,
-            "EFX1 Preset Up": 0x66, "Multi": 0x67, "Page<<": 0x68, "Page>>": 0x69,
-            "RegisVoice<<": 0x6A, "RegisVoice>>": 0x6B, "Text Page": 0x6E,
-            "Text Page+": 0x6F, "Style Voice 1": 0x70, "Style Voice 2": 0x71,
-            "Style Voice 3": 0x72, "Style Voice 4": 0x73, "VIEW & MODELING": 0x74,
-            "Lock Bass": 0x75, "LockChord": 0x76, "Lyrics": 0x77,
-            "VoiceToABCD": 0x87, "TAP": 0x88, "Autocrash": 0x89,
-            "Transp Down": 0x8A, "Transp Up": 0x8B, "Text Record": 0x8C,
-            "Bass & Drum": 0x8D, "Pdf Clear": 0x8E, "Record": 0x90, "Play": 0x91,
-            "DoubleDown": 0x92, "DoubleUp": 0x93, "Arr.Off": 0x94,
-            "FILL & DRUM IN": 0x95, "Wah to Pedal": 0x96, "Overdrive to Pedal": 0x98,
-            "Drum Mute": 0x99, "Bass Mute": 0x9A, "Chords Mute": 0x9B,
-            "Real Chords Mute": 0x9C, "Voice2 to Pedal": 0x9D, "Micro Edit": 0x9E,
-            "Micro2 Edit": 0x9F, "HALF BAR": 0xA0, "Bs Sust Pedal": 0xA1,
-            "Scale": 0xA2, "End Swap": 0xA3, "Set Down": 0xA4, "Set Up": 0xA5,
-            "FswChDelay": 0xA6, "IntroOnArr.": 0xA7, "EndingOnArr.": 0xA8,
-            "Arr. Down": 0xA9, "Arr. Up": 0xAA, "Ending1": 0xAB, "Ending2": 0xAC,
-            "Ending3": 0xAD, "Bass Lock": 0xAE, "Intro Loop": 0xB0,
-            "Scene Down": 0xB1, "Scene Up": 0xB2, "STEM Scene A": 0xB3,
-            "STEM Scene B": 0xB4, "STEM Scene C": 0xB5, "STEM Scene D": 0xB6,
-            "STEM Solo": 0xB7, "STEM Autoplay": 0xB8, "STEM A On/Off": 0xB9,
-            "STEM B On/Off": 0xBA, "STEM C On/Off": 0xBB, "STEM D On/Off": 0xBC,
-            "STEM Lead On/Off": 0xBD, "Art. Toggle": 0xBE, "Key Tune On/Off": 0xBF,
-            "Txt Clear": 0xC0, "Voicetr. Edit": 0xC1, "Clear Image": 0xC2
-        }
-
     def _init_section_midis(self):
         """Initialize Section MIDI dictionary"""
         return {
@@ -441,24 +361,13 @@ class KeyLookupCache:
 
     def validate_color_string(self, color_string):
         """Validate and return color code"""
-        return COLOR_MAP.get(color_string.lower(), Colors.WHITE)
+        color_name = color_string.lower()
+        if color_name in COLOR_NAMES:
+            return getattr(Colors, color_name.upper())
+        return Colors.WHITE
 
 # --- Configuration File Handler ---
-class ConfigFileHandler:
-    def __init__(self, key_cache, config):
-        self.key_cache = key_cache
-        self.config = config
-        self.config_error = False
-
-    def safe_file_read(self, filename):
-        """Safely read file with error handling"""
-        try:
-            with open(filename, "r") as f:
-                return f.readlines()
-        except (OSError, IOError) as e:
-            print("Error reading {}: {}".format(filename, e))
-            return []
-
+class ConfigFileHandler(evmcore.ConfigFileHandler):
     def parse_config_line(self, line):
         """Parse a single config line with validation"""
         try:
@@ -492,6 +401,8 @@ class ConfigFileHandler:
 
         if midi_type == MIDIType.NOTE:
             return command in self.key_cache.note_midis
+        elif midi_type == MIDIType.TAP:
+            return command == "TAP"
         elif midi_type == MIDIType.MACRO:
             for macro in self.key_cache.user_macro_midis:
                 #print(f"Checking command: {command}, {macro}, return {macro.get(command, [])}, type {isinstance(macro.get(command, []), list)}")
@@ -577,53 +488,12 @@ class ConfigFileHandler:
         return True
 
 # --- Display Manager ---
-class DisplayManager:
-    def __init__(self, macropad, config):
-        self.macropad = macropad
-        self.config = config
-        self.labels = []
-        self._init_display()
-
-    def _init_display(self):
-        """Initialize display layout"""
-        main_group = displayio.Group()
-        self.macropad.display.root_group = main_group
-
-        title = label.Label(
-            y=6,
-            font=terminalio.FONT,
-            color=0x0,
-            text=self.config.display_banner,
-            background_color=0xFFFFFF,
-        )
-
-        # Configure Display Grid
-        layout = GridLayout(x=0, y=8, width=128, height=54, grid_size=(3, 4), cell_padding=5)
-
-        for _ in range(12):
-            self.labels.append(label.Label(terminalio.FONT, text=""))
-
-        for index in range(12):
-            x = index % 3
-            y = index // 3
-            layout.add_content(self.labels[index], grid_position=(x, y), cell_size=(1, 1))
-
-        main_group.append(title)
-        main_group.append(layout)
-
-        # Display startup info
-        self.show_startup_info()
-
+class DisplayManager(evmcore.DisplayManager):
     def show_startup_info(self):
         """Display startup information"""
         self.labels[3].text = self.config.display_sub_banner
         self.labels[9].text = "Version: {}".format(self.config.version)
 
-    def update_text(self, index, text):
-        """Update label text safely"""
-        if 0 <= index < len(self.labels):
-            self.labels[index].text = text
-
 # --- State Manager ---
 class StateManager:
     def __init__(self, config):
@@ -690,18 +560,27 @@ class StateManager:
 
         return None
 
+# --- Device Profile ---
+# MIDI in on channel 1 and out on channel 16
+PROFILE = DeviceProfile("Genos", ControllerConfig, KeyLookupCache, ConfigFileHandler, StateManager, MIDIHandler,
+                        midi_in_channel=0, midi_out_channel=15)
+
 # --- Main Controller Class ---
 class GenosController:
+    PROFILE = PROFILE
+
     def __init__(self):
-        print("Initializing Genos Controller...")
+        profile = self.PROFILE
+        print("Initializing {} Controller...".format(profile.name))
 
         # Initialize components
-        self.config = ControllerConfig()
-        self.state = StateManager(self.config)
+        self.config = profile.config()
+        self.state = profile.state(self.config)
 
         # Initialize key cache and config
-        self.key_cache = KeyLookupCache(self.config)
-        # self.config_handler = ConfigFileHandler(self.key_cache, self.config)
+        self.key_cache = profile.key_cache(self.config)
+        self.tap_tempo = TapTempo(self.config.tap_window, self.config.tap_timeout)
+        # self.config_handler = profile.config_handler(self.key_cache, self.config)
 
         # Initialize MIDI
         self._init_midi(self.key_cache)
@@ -714,6 +593,7 @@ class GenosController:
 
         # Initialize display
         self.display = DisplayManager(self.macropad, self.config)
+        self.display.start()
 
         # if not config_loaded:
         #    self.display.update_text(9, "Config File Error!")
@@ -728,12 +608,13 @@ class GenosController:
         print("Preparing Macropad Midi")
         print(usb_midi.ports)
 
+        profile = self.PROFILE
         midi = adafruit_midi.MIDI(
-            midi_in=usb_midi.ports[0], in_channel=0,
-            midi_out=usb_midi.ports[1], out_channel=15
+            midi_in=usb_midi.ports[0], in_channel=profile.midi_in_channel,
+            midi_out=usb_midi.ports[1], out_channel=profile.midi_out_channel
         )
 
-        self.midi_handler = MIDIHandler(midi, key_cache)
+        self.midi_handler = profile.midi_handler(midi, usb_midi.ports[1], key_cache)
 
     def _init_macropad(self):
         """Initialize MacroPad hardware"""
@@ -769,6 +650,10 @@ class GenosController:
                 
             elif lookup_key == MIDIType.MACRO:
                 self.midi_handler.send_macro_notes(midi_key)
+
+            elif lookup_key == MIDIType.TAP:
+                self._process_tap()
+                return midi_key
                 
             else:
                 return midi_key
@@ -787,16 +672,27 @@ class GenosController:
             print(f"Error: Sending key {key_number} ".format(e))
             return False
             
-    def _process_tempo(self, direction):
-        """Process tempo up/down commands"""
+    def _process_tap(self):
+        """Process a tap tempo key: show the tapped tempo and send it as one absolute Tempo SysEx"""
+
+        bpm = self.tap_tempo.tap(time.monotonic_ns())
+        if not bpm:
+            self.display.update_text(3, "TAP: -")
+            return
+
+        self.display.update_value(3, "TAP: ", bpm, suffix=" BPM")
+        self.midi_handler.send_tempo_bpm(bpm)
+
+    def _process_tempo(self, delta):
+        """Process tempo up/down commands, delta is the encoder detents turned"""
         sign = "+" if self.state.encoder_sign else ""
-        if direction == 1:
+        if delta > 0:
             self.display.update_text(3, "KNOB: Tempo Up{}".format(sign))
         else:
             sign = "-" if self.state.encoder_sign else ""
             self.display.update_text(3, "KNOB: Tempo Down{}".format(sign))
 
-        self.midi_handler.send_tempo_sysex(direction)
+        self.midi_handler.send_tempo_sysex(delta)
 
     def _process_master_volume(self, direction):
         """Process volume up/down commands"""
@@ -808,18 +704,33 @@ class GenosController:
 
         self.midi_handler.send_master_volume(direction)
 
-    def _handle_encoder_change(self, direction):
-        """Handle encoder rotation"""
+    def _handle_encoder(self):
+        """Apply every encoder detent turned since the last loop pass"""
+
+        delta = self.macropad.encoder - self.state.encoder_position
+        if delta:
+            self._handle_encoder_change(delta)
+            self.state.encoder_position += delta
+
+    def _handle_encoder_change(self, delta):
+        """Handle encoder rotation: in Tempo mode the delta detents step the tempo, sent once per loop pass,
+        otherwise one encoder note for each detent"""
         
         self.state.encoder_sign = not self.state.encoder_sign
         encoder_timer = time.time()
 
+        if self.state.encoder_mode == EncoderMode.TEMPO:
+            self._process_tempo(delta)
+            return
+
+        direction = 1 if delta > 0 else -1
         if direction == 1:
             self.display.update_text(6, "ENCODER: C#2")
         else:
             self.display.update_text(6, "ENCODER: C2")
 
-        self.midi_handler.send_encoder_note(direction)
+        for _ in range(abs(delta)):
+            self.midi_handler.send_encoder_note(direction)
 
     def _handle_encoder_switch(self):
         """Handle encoder switch"""
@@ -842,6 +753,9 @@ class GenosController:
         elif timeout_type == "timeout_led":
             self._preset_pixels()
 
+        # Draw the label text queued since the last pass
+        self.display.refresh()
+
     def _update_pixels(self):
         """Update pixel colors for lit keys"""
         for pixel in range(12):
@@ -861,10 +775,10 @@ class GenosController:
                     key_start_time = time.time()                    
                 
                 # Handle encoder rotation
-                if self.state.encoder_position != self.macropad.encoder:
-                    direction = 1 if self.state.encoder_position < self.macropad.encoder else -1
-                    self._handle_encoder_change(direction)
-                    self.state.encoder_position = self.macropad.encoder
+                self._handle_encoder()
+
+                # Send the tempo reached by this pass's encoder detents
+                self.midi_handler.flush_tempo()
 
                 # Handle encoder switch
                 self.macropad.encoder_switch_debounced.update()
@@ -885,6 +799,10 @@ class GenosController:
 if __name__ == "__main__":
     try:
         controller = GenosController()
+        ready_ns = time.monotonic_ns()
+        print("Startup: code.py at {} ms, imports {} ms, init {} ms, heap free {} before imports, {} after imports, {} ready".format(
+            startup_ns // 1000000, (imports_ns - startup_ns) // 1000000, (ready_ns - imports_ns) // 1000000,
+            startup_mem, imports_mem, gc.mem_free()))
         controller.run()
         
     except Exception as e:
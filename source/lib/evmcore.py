@@ -0,0 +1,3468 @@
+# Ketron EVM Arranger Controller shared core
+#
+# Constants, classes and the controller shared by the evm, evmplus and generic controller profiles.
+# Each profile's code.py describes its device with a DeviceProfile and adds its own hardware. Copy this file to the CIRCUITPY lib folder, or compile it
+# with mpy-cross to evmcore.mpy so it is loaded as bytecode instead of being compiled at every boot.
+
+import array
+import gc
+import struct
+import sys
+import time
+import displayio
+import keypad
+import microcontroller
+import supervisor
+import terminalio
+
+from adafruit_macropad import MacroPad
+
+import usb_midi
+import adafruit_midi
+from adafruit_midi.note_off import NoteOff
+from adafruit_midi.note_on import NoteOn
+
+# --- Constants and Enums ---
+class EncoderMode:
+    ROTOR = 0
+    TEMPO = 1
+    VOLUME = 2
+    VALUE = 3
+    BANK = 4
+    SONG = 5
+    HIRES = 6
+
+class MIDIType:
+    PEDAL = 0
+    TAB = 1
+    MACRO = 2
+    CC = 3
+    BANK = 4
+    RAMP = 5
+    NRPN = 6
+
+class MIDIStatus:
+    OFF = 0x00
+    ON = 0x7F
+
+class ShiftKeyMode:
+    OFF = 0
+    PENDING = 1
+    ACTIVE_SHIFT = 2
+    ACTIVE_LOCK = 3
+
+class EFXLevel:
+    Voice1 = 0x07
+    Voice2 = 0x3D
+    RealChord = 0x08
+    LeftGM = 0x3F
+
+# Manage Control Panel Volume Sliders via midi CC
+class SliderCC:
+    PLAYER_CC = 0x66   #CC 102
+    STYLE_CC = 0x67
+    DRUM_CC = 0x68
+    BASS_CC = 0x69
+    CHORD_CC = 0x6A
+    REALCHORD_CC = 0x6B
+    LOWERS_CC = 0x6C
+    USER2_CC = 0x6D
+    USER3_CC = 0x6E
+    VOICE1_CC = 0x72     #CC 114
+    VOICE2_CC = 0x73
+    DRAWBARS_CC = 0x74
+    MICRO1_CC = 0x75
+    VOCAL_CC = 0x76
+
+# Key used to trigger test tune
+TUNE_KEY = 11
+
+# supervisor.ticks_ms() wraps around every 2**29 ms
+TICKS_MAX = (1 << 29) - 1
+
+def ticks_diff(ticks_now, ticks_then):
+    """Milliseconds between two supervisor.ticks_ms() values, allowing for wrap around"""
+    return (ticks_now - ticks_then) & TICKS_MAX
+
+# --- Ketron Command Catalogs ---
+# Pedal and Tab SysEx command values packed as "hh Name" entries (hex value, space, exact command name) separated by '|'
+PEDAL_COMMANDS = (
+    "00 Sustain|01 Soft|02 Sostenuto|03 Arr.A|04 Arr.B|05 Arr.C|06 Arr.D|07 Fill1|08 Fill2|"
+    "09 Fill3|0A Fill4|0B Break1|0C Break2|0D Break3|0E Break4|0F Intro/End1|10 Intro/End2|"
+    "11 Intro/End3|12 Start/Stop|13 Tempo Up|14 Tempo Down|15 Fill|16 Break|17 To End|"
+    "18 Bass to Lowest|19 Bass to Root|1A Live Bass|1B Acc.BassToChord|1C Manual Bass|"
+    "1D Voice Lock Bass|1E Bass Mono/Poly|1F Dial Down|20 Dial Up|21 Auto Fill|22 Fill to Arr.|"
+    "23 After Fill|24 Low. Hold Start|25 Low. Hold Stop|26 Low. Hold Break|27 Low. Stop Mute|"
+    "28 Low. Mute|29 Low. and Bass|2A Low. Voice Lock|2B Pianist|2C Pianist Auto/Stand.|"
+    "2D Pianist Sustain|2E Bassist|2F Bassist Easy/Exp.|30 Key Start|31 Key Stop|32 Enter|"
+    "33 Exit|34 Registration|35 Fade|36 Harmony|37 Octave Up|38 Octave Down|39 RestartCount In|"
+    "3A Micro1 On/Off|3B Micro1 Down|3C Micro1 Up|3D Voicetr.On/Off|3E Voicetr.Down|"
+    "3F Voicetr.Up|40 Micro2 On/Off|41 EFX1 On/Off|42 EFX2 On/Off|43 Arabic.Set1|44 Arabic.Set2|"
+    "45 Arabic.Set3|46 Arabic.Set4|47 Dry On Stop|48 Pdf Page Down|49 Pdf Page Up|"
+    "4A Pdf Scroll Down|4B Pdf Scroll Up|4C Glide Down|4D Lead Mute|4E Expr. Left/Style|"
+    "4F Arabic Reset|50 Hold|51 2nd On/Off|52 Pause|53 Talk On/Off|54 Manual Drum|55 Kick Off|"
+    "56 Snare Off|57 Rimshot Off|58 Hit-Hat Off|59 Cymbal Off|5A Tom Off|5B Latin1 Off|"
+    "5C Latin2 Off|5D Latin3/Tamb Off|5E Clap/fx Off|5F Voice Down|60 Voice Up|61 Regis Down|"
+    "62 Regis Up|63 Style Voice Down|64 Style Voice Up|65 EFX1 Preset Down|66 EFX1 Preset Up|"
+    "67 Multi|68 Page<<|69 Page>>|6A RegisVoice<<|6B RegisVoice>>|6E Text Page|6F Text Page+|"
+    "70 Style Voice 1|71 Style Voice 2|72 Style Voice 3|73 Style Voice 4|74 VIEW & MODELING|"
+    "75 Lock Bass|76 LockChord|77 Lyrics|87 VoiceToABCD|88 TAP|89 Autocrash|8A Transp Down|"
+    "8B Transp Up|8C Text Record|8D Bass & Drum|8E Pdf Clear|90 Record|91 Play|92 DoubleDown|"
+    "93 DoubleUp|94 Arr.Off|95 FILL & DRUM IN|96 Wah to Pedal|98 Overdrive to Pedal|99 Drum Mute|"
+    "9A Bass Mute|9B Chords Mute|9C Real Chords Mute|9D Voice2 to Pedal|9E Micro Edit|"
+    "9F Micro2 Edit|A0 HALF BAR|A1 Bs Sust Pedal|A2 Scale|A3 End Swap|A4 Set Down|A5 Set Up|"
+    "A6 FswChDelay|A7 IntroOnArr.|A8 EndingOnArr.|A9 Arr. Down|AA Arr. Up|AB Ending1|AC Ending2|"
+    "AD Ending3|AE Bass Lock|B0 Intro Loop|B1 Scene Down|B2 Scene Up|B3 STEM Scene A|"
+    "B4 STEM Scene B|B5 STEM Scene C|B6 STEM Scene D|B7 STEM Solo|B8 STEM Autoplay|"
+    "B9 STEM A On/Off|BA STEM B On/Off|BB STEM C On/Off|BC STEM D On/Off|BD STEM Lead On/Off|"
+    "BE Art. Toggle|BF Key Tune On/Off|C0 Txt Clear|C1 Voicetr. Edit|C2 Clear Image"
+)
+
+TAB_COMMANDS = (
+    "00 DIAL_DOWN|01 DIAL_UP|02 PLAYER_A|03 PLAYER_B|04 ENTER|06 MENU|07 LYRIC|08 LEAD|"
+    "09 VARIATION|0A DRAWBARS_VIEW|10 DRAWBARS|11 DRUMSET|12 TALK|13 VOICETRON|14 STYLE_BOX|"
+    "19 VOICE1|1A VOICE2|1B USER_VOICE|1C XFADE|1D INTRO1|1E INTRO2|1F INTRO3|20 BASSIST|"
+    "22 DRUM_MIXER|24 OCTAVE_UP|25 OCTAVE_DOWN|26 USER_STYLE|27 DSP|28 ADSR_FILTER|29 MICRO|"
+    "2C ARRA|2D ARRB|2E ARRC|2F ARRD|30 FILL|31 BREAK|32 JUKE_BOX|33 STEM|34 PIANIST|"
+    "40 BASS_TO_LOWEST|41 MANUAL_BASS|48 PORTAMENTO|49 HARMONY|4A PAUSE|4B TEMPO_SLOW|"
+    "4C TEMPO_FAST|4D START_STOP|59 TRANSP_DOWN|5A TRANSP_UP|5E AFTERTOUCH|5F EXIT|60 ROTOR_SLOW|"
+    "61 ROTOR_FAST|62 PIANO_FAM|63 ETHNIC_FAM|64 ORGAN_FAM|65 GUITAR_FAM|66 BASS_FAM|"
+    "67 STRING_FAM|68 BRASS_FAM|69 SAX_FAM|6F HOLD|70 PAD_FAM|71 SYNTH_FAM|73 FADEOUT|"
+    "74 BASS_TO_ROOT|77 GM"
+)
+
+# Ketron NRPN parameters as (name, MSB, LSB, highest value), from the Ketron EVENT SYSEX-NRPN data sheet.
+# They select a preset with Data Entry MSB (CC6) only, on the Mic/Voicetron channel
+KETRON_NRPNS = (
+    ("Micro.Preset", 0x70, 0x21, 0x13),
+    ("Micro.Compressor", 0x70, 0x40, 0x07),
+    ("Micro.Pitch", 0x70, 0x3A, 0x09),
+    ("Micro.EQ", 0x70, 0x6B, 0x07),
+    ("Micro.Echo", 0x70, 0x30, 0x08),
+    ("Voicetron.EQ", 0x60, 0x6B, 0x07)
+)
+
+class Catalog:
+    """Read only Ketron command table: the packed text plus name offsets and values sorted by name, searched by binary search"""
+
+    def __init__(self, text):
+        self.text = text
+
+        starts = []
+        start = 0
+        while start < len(text):
+            end = text.find('|', start)
+            if end < 0:
+                end = len(text)
+            if end > start + 3:
+                starts.append(start)
+            start = end + 1
+        starts.sort(key=self._name_at)
+
+        self.index = array.array('H', starts)
+        self.values = bytes([int(text[start:start + 2], 16) for start in starts])
+
+    def _name_at(self, start):
+        end = self.text.find('|', start)
+        return self.text[start + 3:end if end >= 0 else len(self.text)]
+
+    def find(self, name):
+        """Position of name in the sorted index, or -1"""
+
+        low = 0
+        high = len(self.index) - 1
+        while low <= high:
+            mid = (low + high) >> 1
+            entry = self._name_at(self.index[mid])
+            if entry == name:
+                return mid
+            if entry < name:
+                low = mid + 1
+            else:
+                high = mid - 1
+        return -1
+
+    def get(self, name, default=None):
+        position = self.find(name)
+        return default if position < 0 else self.values[position]
+
+    def __getitem__(self, name):
+        position = self.find(name)
+        if position < 0:
+            raise KeyError(name)
+        return self.values[position]
+
+    def __contains__(self, name):
+        return self.find(name) >= 0
+
+    def __len__(self):
+        return len(self.index)
+
+# --- MIDI Handler Class ---
+class MIDIHandler:
+    BATCH_SIZE = 256
+
+    # High resolution parameters are NRPN numbers 0-16383, or a 14-bit Control Change 0-31 when HIRES_CC is set.
+    # An NRPN with HIRES_MSB set only takes a 7-bit value, sent with Data Entry MSB alone
+    HIRES_CC = 0x4000
+    HIRES_MSB = 0x8000
+    HIRES_MAX = 16383
+
+    def __init__(self, midi_instance, midi_out, config, key_cache):
+        self.midi = midi_instance
+        self.midi_out = midi_out
+        self.config = config
+        self.key_cache = key_cache
+        
+        # Complete MIDI messages preallocated and written straight to the USB MIDI port, so sending
+        # creates no message objects or buffers. SysEx manufacturer IDs: 0x26 0x79 Pedal, 0x26 0x7C Tab
+        self.pedal_sysex_1 = bytearray([0xF0, 0x26, 0x79, 0x03, 0x00, 0x00, 0xF7])
+        self.pedal_sysex_2 = bytearray([0xF0, 0x26, 0x79, 0x05, 0x00, 0x00, 0x00, 0xF7])
+        self.tab_sysex = bytearray([0xF0, 0x26, 0x7C, 0x00, 0x00, 0xF7])
+        self.control_change = bytearray([0xB0, 0x00, 0x00])
+
+        # Messages queued by the batch_ methods and written to the port in one write by send_batch()
+        self.batch = bytearray(self.BATCH_SIZE)
+        self.batch_length = 0
+
+        # MacroLibrary of macros not defined in keymap.cfg and the RampEngine started by macro ramps, set by the controller
+        self.macro_library = None
+        self.ramps = None
+
+        # 14-bit values by (channel << 16 | parameter): the last value set and those not yet sent,
+        # and the NRPN number last selected with CC99/98 on each channel
+        self.hires_values = {}
+        self.hires_pending = {}
+        self.nrpn_selected = [-1] * 16
+
+        self.cur_volume = 100
+
+    def send_pedal_sysex(self, midi_value):
+        """Send SysEx for Pedal commands"""
+        
+        try:
+            # Send ON followed by OFF Message
+            if midi_value < 128:
+                self.pedal_sysex_1[4] = midi_value
+                self.pedal_sysex_1[5] = MIDIStatus.ON
+                self.midi_out.write(self.pedal_sysex_1, 7)
+
+                self.pedal_sysex_1[5] = MIDIStatus.OFF
+                self.midi_out.write(self.pedal_sysex_1, 7)
+            else:
+                self.pedal_sysex_2[4] = (midi_value >> 7) & 0x7F
+                self.pedal_sysex_2[5] = midi_value & 0x7F
+                self.pedal_sysex_2[6] = MIDIStatus.ON
+                self.midi_out.write(self.pedal_sysex_2, 8)
+
+                self.pedal_sysex_2[6] = MIDIStatus.OFF
+                self.midi_out.write(self.pedal_sysex_2, 8)
+            return True
+        except Exception as e:
+            print("Error sending pedal SysEx: {}".format(e))
+            return False
+
+    def send_tab_sysex(self, midi_value):
+        """Send SysEx for Tab commands"""
+        
+        try:
+            self.tab_sysex[3] = midi_value
+            self.tab_sysex[4] = MIDIStatus.ON
+            self.midi_out.write(self.tab_sysex, 6)
+
+            self.tab_sysex[4] = MIDIStatus.OFF
+            self.midi_out.write(self.tab_sysex, 6)
+            return True
+        except Exception as e:
+            print("Error sending tab SysEx: {}".format(e))
+            return False
+
+    def send_macro_sysex(self, midi_key):
+        """Send one or more macro list values as SysEx Pedal or Tab message(s)"""
+
+        try:
+            commands = self.key_cache.macro_cache.get(midi_key)
+            if commands is None and self.macro_library:
+                # Library macros are cached as their complete messages, sent in one write
+                buffer = self.macro_library.get(midi_key)
+                if buffer:
+                    self.midi_out.write(buffer, len(buffer))
+                return True
+
+            # Macros are compiled to (type, value) pairs by KeyLookupCache, nothing is parsed here
+            for lookup_key, midi_value in commands or ():
+                if lookup_key == MIDIType.PEDAL:
+                    self.send_pedal_sysex(midi_value)
+                elif lookup_key == MIDIType.TAB:
+                    self.send_tab_sysex(midi_value)
+                elif lookup_key == MIDIType.RAMP and self.ramps:
+                    self.ramps.start(*self.key_cache.ramps[midi_value])
+            return True
+        except Exception as e:
+            print("Error sending macros SysEx: {}".format(e))
+            return False
+
+    def send_control_change(self, control, value, midi_channel):
+        """Send a Control Change from the preallocated message"""
+
+        self.control_change[0] = 0xB0 | midi_channel
+        self.control_change[1] = control
+        self.control_change[2] = value
+        self.midi_out.write(self.control_change, 3)
+
+    def _batch_message(self, message, length):
+        """Queue one preallocated message, writing the batch first when it is full"""
+
+        if self.batch_length + length > self.BATCH_SIZE:
+            self.send_batch()
+        self.batch[self.batch_length:self.batch_length + length] = message
+        self.batch_length += length
+
+    def batch_control_change(self, control, value, midi_channel):
+        self.control_change[0] = 0xB0 | midi_channel
+        self.control_change[1] = control
+        self.control_change[2] = value
+        self._batch_message(self.control_change, 3)
+
+    def _command_message(self, lookup_key, midi_value, status):
+        """Fill in the preallocated Pedal or Tab message of a command, returns the message and its length"""
+
+        if lookup_key == MIDIType.PEDAL:
+            if midi_value < 128:
+                self.pedal_sysex_1[4] = midi_value
+                self.pedal_sysex_1[5] = status
+                return self.pedal_sysex_1, 7
+            self.pedal_sysex_2[4] = (midi_value >> 7) & 0x7F
+            self.pedal_sysex_2[5] = midi_value & 0x7F
+            self.pedal_sysex_2[6] = status
+            return self.pedal_sysex_2, 8
+
+        self.tab_sysex[3] = midi_value
+        self.tab_sysex[4] = status
+        return self.tab_sysex, 6
+
+    def batch_pedal_sysex(self, midi_value):
+        """Queue a Pedal command ON and OFF message"""
+
+        for status in (MIDIStatus.ON, MIDIStatus.OFF):
+            message, length = self._command_message(MIDIType.PEDAL, midi_value, status)
+            self._batch_message(message, length)
+
+    def batch_tab_sysex(self, midi_value):
+        """Queue a Tab command ON and OFF message"""
+
+        for status in (MIDIStatus.ON, MIDIStatus.OFF):
+            message, length = self._command_message(MIDIType.TAB, midi_value, status)
+            self._batch_message(message, length)
+
+    def batch_macro_sysex(self, midi_key):
+        """Queue the Pedal and Tab messages of a macro"""
+
+        commands = self.key_cache.macro_cache.get(midi_key)
+        if commands is None and self.macro_library:
+            buffer = self.macro_library.get(midi_key)
+            if buffer:
+                self.batch_packed(buffer)
+            return
+
+        for lookup_key, midi_value in commands or ():
+            if lookup_key == MIDIType.PEDAL:
+                self.batch_pedal_sysex(midi_value)
+            elif lookup_key == MIDIType.TAB:
+                self.batch_tab_sysex(midi_value)
+            elif lookup_key == MIDIType.RAMP and self.ramps:
+                self.ramps.start(*self.key_cache.ramps[midi_value])
+
+    def pack_control_changes(self, changes):
+        """Control Changes of (channel, control, value) in one buffer using running status: the status byte is
+        only written when the channel changes, so changes sorted by channel pack to two bytes each"""
+
+        buffer = bytearray()
+        status = -1
+        for midi_channel, control, value in changes:
+            if 0xB0 | midi_channel != status:
+                status = 0xB0 | midi_channel
+                buffer.append(status)
+            buffer.append(control)
+            buffer.append(value)
+        return bytes(buffer)
+
+    def send_packed(self, buffer):
+        """Write a buffer of packed messages to the USB MIDI port in one write"""
+
+        try:
+            self.midi_out.write(buffer, len(buffer))
+            return True
+        except Exception as e:
+            print("Error sending packed MIDI: {}".format(e))
+            return False
+
+    def pack_commands(self, commands):
+        """The ON and OFF messages of compiled (type, value) commands in one buffer, ready to be sent in one write"""
+
+        buffer = bytearray()
+        for lookup_key, midi_value in commands:
+            if lookup_key != MIDIType.PEDAL and lookup_key != MIDIType.TAB:
+                continue
+            for status in (MIDIStatus.ON, MIDIStatus.OFF):
+                message, length = self._command_message(lookup_key, midi_value, status)
+                buffer += message
+        return bytes(buffer)
+
+    def batch_packed(self, buffer):
+        """Queue a buffer of packed messages, one larger than the batch is written on its own"""
+
+        if len(buffer) > self.BATCH_SIZE:
+            self.send_batch()
+            self.midi_out.write(buffer, len(buffer))
+        else:
+            self._batch_message(buffer, len(buffer))
+
+    def send_batch(self):
+        """Write the queued messages to the USB MIDI port in one write"""
+
+        try:
+            if self.batch_length:
+                self.midi_out.write(self.batch, self.batch_length)
+            return True
+        except Exception as e:
+            print("Error sending MIDI batch: {}".format(e))
+            return False
+        finally:
+            self.batch_length = 0
+
+    def step_hires(self, parameter, midi_channel, delta, start=8192, maximum=HIRES_MAX):
+        """Move a high resolution parameter by delta, from start when not set before, up to maximum.
+        Only the last value of a parameter is kept until send_hires(), returns the new value"""
+
+        key = midi_channel << 16 | parameter
+        value = self.hires_values.get(key, start) + delta
+        value = max(0, min(maximum, value))
+        self.hires_values[key] = value
+        self.hires_pending[key] = value
+        return value
+
+    def _batch_byte(self, value):
+        self.batch[self.batch_length] = value
+        self.batch_length += 1
+
+    def send_hires(self):
+        """Write the pending high resolution values in one write using running status. An NRPN only selects its
+        number with CC99/98 when it changed on the channel, so a value takes 4 bytes: CC6 and CC38 with their data,
+        or 2 bytes with CC6 alone for an HIRES_MSB parameter"""
+
+        if not self.hires_pending:
+            return True
+
+        try:
+            status = -1
+            sent = True
+            for key in sorted(self.hires_pending):
+                value = self.hires_pending[key]
+                midi_channel = key >> 16
+                parameter = key & 0x7FFF
+
+                # At most 13 bytes per value, running status never spans two writes
+                if self.batch_length + 13 > self.BATCH_SIZE:
+                    sent = self.send_batch()
+                    if not sent:
+                        break
+                    status = -1
+                if status != 0xB0 | midi_channel:
+                    status = 0xB0 | midi_channel
+                    self._batch_byte(status)
+
+                if parameter & self.HIRES_CC:
+                    control = parameter & 0x1F
+                    self._batch_byte(control)
+                    self._batch_byte(value >> 7)
+                    self._batch_byte(control + 32)
+                    self._batch_byte(value & 0x7F)
+                    continue
+
+                if self.nrpn_selected[midi_channel] != parameter:
+                    self.nrpn_selected[midi_channel] = parameter
+                    self._batch_byte(99)
+                    self._batch_byte(parameter >> 7)
+                    self._batch_byte(98)
+                    self._batch_byte(parameter & 0x7F)
+                self._batch_byte(6)
+                if key & self.HIRES_MSB:
+                    self._batch_byte(value)
+                    continue
+                self._batch_byte(value >> 7)
+                self._batch_byte(38)
+                self._batch_byte(value & 0x7F)
+
+            self.hires_pending.clear()
+            if sent and self.send_batch():
+                return True
+        except Exception as e:
+            self.batch_length = 0
+            print("Error sending NRPN: {}".format(e))
+
+        # The device may have missed a CC99/98, so every NRPN selects its number again next time
+        self.hires_pending.clear()
+        self.nrpn_selected = [-1] * 16
+        return False
+
+    def send_master_volume(self, config, delta):
+        """Send volume control via CC11, changed by delta encoder detents"""
+        self.config = config
+        
+        try:
+            # Change volume in volume_step increments per detent
+            self.cur_volume = max(0, min(127, self.cur_volume + delta * self.config.volume_step))
+
+            self.send_control_change(11, self.cur_volume, self.config.midi_out_channel)
+            return True
+        except Exception as e:
+            print("Error sending volume: {}".format(e))
+            return False
+
+    def test_connectivity(self):
+        """Test MIDI connectivity with audible notes"""
+        
+        try:
+            # Notes for a short segment of "Ode to Joy"
+            # Using MIDI note numbers (C4=60, D4=62, E4=64, F4=65, G4=67, A4=69, B4=71, C5=72)
+            notes = [64, 64, 65, 67, 67, 65, 64, 62, 60, 60, 62, 64, 64, 62, 62] 
+            durations = [0.4] * len(notes)       
+
+            for note, duration in zip(notes, durations):
+                self.midi.send(NoteOn(note, 120))
+                time.sleep(duration)
+                self.midi.send(NoteOff(note, 0))
+                time.sleep(duration/4)
+            return True
+        except Exception as e:
+            print("MIDI test failed: {}".format(e))
+            return False
+
+# --- MIDI Input ---
+class MIDIClock:
+    """Song position in MIDI clocks (24 per beat) from inbound Clock, Start, Continue, Stop and Song Position Pointer,
+    and the tempo measured between beats"""
+
+    BEAT = 1
+    BAR = 2
+
+    def __init__(self, beats_per_bar):
+        self.beats_per_bar = beats_per_bar
+        self.running = False
+        self.clocks = -1
+        self.beat_ticks = -1
+        self.bpm = 0
+
+    def realtime(self, status, ticks):
+        """Process a real time message, returns BEAT or BAR when a clock lands on that boundary, else 0"""
+
+        if status == 0xF8:
+            if not self.running:
+                return 0
+            self.clocks += 1
+            if self.clocks % 24:
+                return 0
+
+            if self.beat_ticks >= 0:
+                interval = ticks_diff(ticks, self.beat_ticks)
+                if interval > 0:
+                    self.bpm = (60000 + interval // 2) // interval
+            self.beat_ticks = ticks
+            return self.BAR if self.clocks % (24 * self.beats_per_bar) == 0 else self.BEAT
+
+        if status == 0xFA:
+            # Start: the next clock is the first beat of the song
+            self.running = True
+            self.clocks = -1
+            self.beat_ticks = -1
+        elif status == 0xFB:
+            self.running = True
+            self.beat_ticks = -1
+        elif status == 0xFC:
+            self.running = False
+        return 0
+
+    def song_position(self, sixteenths):
+        """Song Position Pointer: the next clock is at this many 16th notes, 6 clocks each"""
+
+        self.clocks = sixteenths * 6 - 1
+        self.beat_ticks = -1
+
+class MIDIInput:
+    """Reads the USB MIDI input into a preallocated buffer and parses it without creating message objects.
+    Real time messages and the Song Position Pointer go to a MIDIClock, Control Changes to control_change(cc, value, channel)"""
+
+    def __init__(self, port, clock, control_change=None, size=64):
+        self.port = port
+        self.clock = clock
+        self.control_change = control_change
+        self.buffer = bytearray(size)
+
+        # Running status and the data bytes of the message being received
+        self.status = 0
+        self.data = bytearray(2)
+        self.data_count = 0
+        self.data_needed = 0
+
+    def read(self, ticks):
+        """Parse the bytes waiting on the port, returns the highest MIDIClock boundary reached, else 0"""
+
+        count = self.port.readinto(self.buffer) or 0
+        boundary = 0
+        for i in range(count):
+            byte = self.buffer[i]
+
+            # Real time messages may arrive between the bytes of any other message
+            if byte >= 0xF8:
+                reached = self.clock.realtime(byte, ticks)
+                if reached > boundary:
+                    boundary = reached
+                continue
+
+            if byte >= 0x80:
+                self.status = byte
+                self.data_count = 0
+                if byte < 0xC0 or 0xE0 <= byte < 0xF0 or byte == 0xF2:
+                    self.data_needed = 2
+                elif byte < 0xE0 or byte == 0xF1 or byte == 0xF3:
+                    self.data_needed = 1
+                else:
+                    # SysEx and the other system messages are skipped
+                    self.data_needed = 0
+                continue
+
+            if not self.data_needed:
+                continue
+            self.data[self.data_count] = byte
+            self.data_count += 1
+            if self.data_count < self.data_needed:
+                continue
+            self.data_count = 0
+
+            if self.status & 0xF0 == 0xB0:
+                if self.control_change:
+                    self.control_change(self.data[0], self.data[1], self.status & 0x0F)
+            elif self.status == 0xF2:
+                self.clock.song_position(self.data[0] | (self.data[1] << 7))
+
+            # Running status only applies to channel messages
+            if self.status >= 0xF0:
+                self.data_needed = 0
+
+        return boundary
+
+# --- Tap Tempo ---
+class TapTempo:
+    """Tempo from key taps timestamped with time.monotonic_ns(), averaged over the last window intervals.
+    A tap far off the average is ignored, two in a row restart the average at the new tempo"""
+
+    def __init__(self, window, timeout_ms, min_bpm=30, max_bpm=300):
+        self.intervals = array.array('L', [0] * window)
+        self.timeout_us = timeout_ms * 1000
+        self.min_interval = 60000000 // max_bpm
+        self.max_interval = 60000000 // min_bpm
+
+        self.count = 0
+        self.index = 0
+        self.last_ns = -1
+        self.rejected = 0
+        self.bpm = 0
+
+    def reset(self):
+        self.count = 0
+        self.index = 0
+        self.rejected = 0
+        self.bpm = 0
+
+    def tap(self, now_ns):
+        """Record a tap, returns the tempo in BPM from the second tap of a run of taps, else 0"""
+
+        previous_ns = self.last_ns
+        self.last_ns = now_ns
+        interval = (now_ns - previous_ns) // 1000
+
+        # The first tap, or one after a pause, starts a new run
+        if previous_ns < 0 or interval > self.timeout_us or interval > self.max_interval:
+            self.reset()
+            return 0
+        if interval < self.min_interval:
+            return self.bpm
+
+        if self.count >= 2:
+            average = self._average()
+            if abs(interval - average) * 4 > average:
+                self.rejected += 1
+                if self.rejected < 2:
+                    return self.bpm
+                self.reset()
+        self.rejected = 0
+
+        self.intervals[self.index] = interval
+        self.index = (self.index + 1) % len(self.intervals)
+        if self.count < len(self.intervals):
+            self.count += 1
+
+        average = self._average()
+        self.bpm = (60000000 + average // 2) // average
+        return self.bpm
+
+    def _average(self):
+        total = 0
+        for i in range(self.count):
+            total += self.intervals[i]
+        return total // self.count
+
+# --- Volume Ramps ---
+class RampEngine:
+    """Timed Control Change ramps run from the main loop. Each ramp moves a CC from its current value to a target
+    over a duration in milliseconds or beats. update() sends the interpolated values at most every interval_ms,
+    only when a value changed, and never blocks. Time is read from clock(), supervisor.ticks_ms on the MacroPad"""
+
+    # Fields of an active ramp
+    CC = 0
+    START = 1
+    TARGET = 2
+    TICKS = 3
+    DURATION = 4
+    VALUE = 5
+
+    def __init__(self, send, current, clock, max_ramps, interval_ms, bpm):
+        self.send = send
+        self.current = current
+        self.clock = clock
+        self.max_ramps = max_ramps
+        self.interval_ms = interval_ms
+        self.bpm = bpm
+
+        self.active = []
+        self.update_ticks = clock()
+
+    def start(self, cc, target, duration, beats=False):
+        """Start ramping a CC to target over duration milliseconds, or duration beats at the current bpm.
+        A ramp already running on the CC is replaced and continues from the value it reached"""
+
+        if beats:
+            duration = duration * 60000 // max(1, self.bpm)
+
+        start_value = -1
+        for ramp in self.active:
+            if ramp[self.CC] == cc:
+                start_value = ramp[self.VALUE]
+                self.active.remove(ramp)
+                break
+        if start_value < 0:
+            start_value = self.current(cc)
+
+        # A CC with no known value, no duration or no free ramp goes straight to the target
+        if start_value < 0 or duration <= 0 or len(self.active) >= self.max_ramps:
+            self.send(cc, target)
+            return
+
+        self.active.append([cc, start_value, target, self.clock(), duration, start_value])
+
+    def update(self):
+        """Send the next value of each running ramp, ramps that reached their target are removed"""
+
+        if not self.active:
+            return
+        ticks_now = self.clock()
+        if ticks_diff(ticks_now, self.update_ticks) < self.interval_ms:
+            return
+        self.update_ticks = ticks_now
+
+        for ramp in list(self.active):
+            elapsed = ticks_diff(ticks_now, ramp[self.TICKS])
+            if elapsed >= ramp[self.DURATION]:
+                value = ramp[self.TARGET]
+                self.active.remove(ramp)
+            else:
+                # Rounded toward the start value both ways, so a ramp down is not a step ahead of a ramp up
+                change = (ramp[self.TARGET] - ramp[self.START]) * elapsed
+                if change >= 0:
+                    value = ramp[self.START] + change // ramp[self.DURATION]
+                else:
+                    value = ramp[self.START] - (-change // ramp[self.DURATION])
+
+            if value != ramp[self.VALUE]:
+                ramp[self.VALUE] = value
+                self.send(ramp[self.CC], value)
+
+    def cancel(self):
+        """Stop all ramps where they are"""
+
+        self.active = []
+
+# --- Encoder Acceleration Profiles ---
+class EncoderAccel:
+    """Encoder acceleration profiles precomputed into step multiplier tables, indexed by the
+    time between detents in ACCEL_BUCKET_MS buckets. Slower turns use the last bucket"""
+
+    ACCEL_BUCKET_MS = 25
+    ACCEL_BUCKETS = 16
+
+    def __init__(self):
+        # Profile specs: linear:max:range_ms, exp:max:range_ms or custom:ms=mult,ms=mult,...
+        # grad is the original EncGrad rule: x4 under 100 ms, x2 under 250 ms
+        self.profile_specs = {
+            "none": "linear:1:0",
+            "grad": "custom:100=4,250=2"
+        }
+        self.profiles = {}
+
+    def add_profile(self, name, spec):
+        """Add or replace a profile after checking it builds"""
+
+        self._build_table(spec)
+        self.profile_specs[name] = spec
+
+    def _build_table(self, spec):
+        """Compile a profile spec into bytes of step multipliers, one per bucket"""
+
+        spec_parts = spec.split(':')
+        kind = spec_parts[0]
+        multipliers = []
+
+        if kind == "linear" or kind == "exp":
+            if len(spec_parts) != 3:
+                raise ValueError("Invalid {} profile: {}".format(kind, spec))
+            max_mult = int(spec_parts[1])
+            range_ms = int(spec_parts[2])
+            if max_mult < 1 or max_mult > 127 or range_ms < 0:
+                raise ValueError("Invalid {} profile: {}".format(kind, spec))
+
+            for bucket in range(self.ACCEL_BUCKETS):
+                interval = bucket * self.ACCEL_BUCKET_MS
+                if interval >= range_ms:
+                    multipliers.append(1)
+                elif kind == "linear":
+                    multipliers.append(1 + ((max_mult - 1) * (range_ms - interval) + range_ms // 2) // range_ms)
+                else:
+                    multipliers.append(max(1, round(max_mult ** ((range_ms - interval) / range_ms))))
+
+        elif kind == "custom":
+            if len(spec_parts) != 2:
+                raise ValueError("Invalid custom profile: {}".format(spec))
+            breakpoints = []
+            for point in spec_parts[1].split(','):
+                point_parts = point.split('=')
+                if len(point_parts) != 2:
+                    raise ValueError("Invalid breakpoint: {}".format(point))
+                mult = int(point_parts[1])
+                if mult < 1 or mult > 127:
+                    raise ValueError("Invalid breakpoint: {}".format(point))
+                breakpoints.append((int(point_parts[0]), mult))
+            breakpoints.sort()
+
+            for bucket in range(self.ACCEL_BUCKETS):
+                interval = bucket * self.ACCEL_BUCKET_MS
+                mult = 1
+                for limit_ms, point_mult in breakpoints:
+                    if interval < limit_ms:
+                        mult = point_mult
+                        break
+                multipliers.append(mult)
+
+        else:
+            raise ValueError("Invalid profile type: {}".format(kind))
+
+        return bytes(multipliers)
+
+    def build(self):
+        """Build the lookup tables for all profiles"""
+
+        self.profiles = {}
+        for name, spec in self.profile_specs.items():
+            self.profiles[name] = self._build_table(spec)
+            print("Accel {}: {}".format(name, " ".join([str(mult) for mult in self.profiles[name]])))
+
+    def get_table(self, name):
+        """Lookup table for a profile name, or the flat none profile if not defined"""
+
+        table = self.profiles.get(name)
+        if table is None:
+            print("Accel profile not found: {}".format(name))
+            return self.profiles["none"]
+        return table
+
+    def get_multiplier(self, table, interval_ms):
+        """Step multiplier for a detent interval in milliseconds"""
+
+        bucket = interval_ms // self.ACCEL_BUCKET_MS
+        if bucket >= self.ACCEL_BUCKETS:
+            bucket = self.ACCEL_BUCKETS - 1
+        return table[bucket]
+
+# --- Display Manager ---
+class DisplayManager:
+    def __init__(self, macropad, config):
+        self.macropad = macropad
+        self.config = config
+        self.labels = []
+
+        # Label text queued by update_text() and update_value(), drawn by refresh() in the display stage
+        # so the key and encoder paths do not format strings or redraw labels
+        self.pending = bytearray(12)
+        self.pending_text = [""] * 12
+        self.pending_value = [None] * 12
+        self.pending_target = [None] * 12
+        self.pending_suffix = [""] * 12
+
+    def start(self):
+        """Create the display layout. Run once the keys are running, text queued before is drawn by refresh()"""
+
+        # The layout libraries are only imported once the display is started
+        from adafruit_display_text import bitmap_label as label
+        from adafruit_displayio_layout.layouts.grid_layout import GridLayout
+
+        main_group = displayio.Group()
+        self.macropad.display.root_group = main_group
+
+        title = label.Label(
+            y=6,
+            font=terminalio.FONT,
+            color=0x0,
+            text=self.config.display_banner,
+            background_color=0xFFFFFF,
+        )
+
+        # Configure Display Grid
+        layout = GridLayout(x=0, y=8, width=128, height=54, grid_size=(3, 4), cell_padding=5)
+
+        for _ in range(12):
+            self.labels.append(label.Label(terminalio.FONT, text=""))
+
+        for index in range(12):
+            x = index % 3
+            y = index // 3
+            layout.add_content(self.labels[index], grid_position=(x, y), cell_size=(1, 1))
+
+        main_group.append(title)
+        main_group.append(layout)
+
+        # Display startup info
+        self.show_startup_info()
+
+    def show_startup_info(self):
+        """Display startup information"""
+        
+        self.labels[3].text = self.config.display_sub_banner
+        self.labels[6].text = "KNOB MODE: Rotor"
+        # self.labels[9].text = "Version: {}".format(self.config.version)
+        self.labels[9].text = "OS: {}".format(self.config.version)
+
+    def update_text(self, index, text):
+        """Queue label text safely"""
+        
+        if 0 <= index < len(self.pending):
+            self.pending[index] = 1
+            self.pending_text[index] = text
+            self.pending_value[index] = None
+            self.pending_target[index] = None
+            self.pending_suffix[index] = ""
+
+    def update_value(self, index, text, value, target=None, suffix=""):
+        """Queue label text followed by a value, an optional target value and a suffix, formatted by refresh()"""
+
+        if 0 <= index < len(self.pending):
+            self.pending[index] = 1
+            self.pending_text[index] = text
+            self.pending_value[index] = value
+            self.pending_target[index] = target
+            self.pending_suffix[index] = suffix
+
+    def refresh(self):
+        """Draw the queued label text, skipping labels that did not change"""
+
+        for index in range(len(self.labels)):
+            if not self.pending[index]:
+                continue
+            self.pending[index] = 0
+
+            text = self.pending_text[index]
+            if self.pending_target[index] is not None:
+                text = "{}{}>{}{}".format(text, self.pending_value[index], self.pending_target[index], self.pending_suffix[index])
+            elif self.pending_value[index] is not None:
+                text = "{}{}{}".format(text, self.pending_value[index], self.pending_suffix[index])
+
+            if self.labels[index].text != text:
+                self.labels[index].text = text
+
+# --- Main Loop Stage Errors ---
+class StageErrors:
+    """Error counters for the main loop stages. A stage failing more than budget times within
+    window_ms is backed off for backoff_ms while the other stages keep running"""
+
+    # Stage 0 scans the keys and is never backed off
+    KEYS = 0
+
+    def __init__(self, names, budget, window_ms, backoff_ms):
+        self.names = names
+        self.budget = budget
+        self.window_ms = window_ms
+        self.backoff_ms = backoff_ms
+
+        count = len(self.names)
+        self.totals = [0] * count
+        self.window_errors = [0] * count
+        self.window_ticks = [0] * count
+        self.backoff_ticks = [0] * count
+        self.backed_off = [False] * count
+        self.last_errors = [""] * count
+
+    def is_enabled(self, stage, ticks_now):
+        """False while a stage is backed off"""
+
+        if self.backed_off[stage]:
+            if ticks_diff(ticks_now, self.backoff_ticks[stage]) < self.backoff_ms:
+                return False
+            self.backed_off[stage] = False
+            self.window_errors[stage] = 0
+        return True
+
+    def record(self, stage, error, ticks_now):
+        """Count an error and back off the stage once it is over budget. The keys stage is never backed off"""
+
+        self.totals[stage] += 1
+        self.last_errors[stage] = str(error)
+
+        if ticks_diff(ticks_now, self.window_ticks[stage]) > self.window_ms:
+            self.window_ticks[stage] = ticks_now
+            self.window_errors[stage] = 0
+        self.window_errors[stage] += 1
+
+        if self.window_errors[stage] <= self.budget:
+            print("Error in {} stage: {}".format(self.names[stage], error))
+        elif stage != self.KEYS and not self.backed_off[stage]:
+            self.backed_off[stage] = True
+            self.backoff_ticks[stage] = ticks_now
+            print("{} stage backed off for {}ms after {} errors".format(self.names[stage], self.backoff_ms, self.window_errors[stage]))
+
+    def report(self):
+        """Print the error counters of all stages"""
+
+        for stage, name in enumerate(self.names):
+            state = " (backed off)" if self.backed_off[stage] else ""
+            print("{}: {} errors{} {}".format(name, self.totals[stage], state, self.last_errors[stage]))
+
+# --- Boot Profile ---
+class BootProfile:
+    """Startup trace of (stage, time.monotonic_ns(), gc.mem_free()) marks taken at the end of each
+    startup stage. The stage times of the last boots are kept in a ring in NVM and summarized on the serial console"""
+
+    MAGIC = 0xB7
+    # NVM header: magic, next slot, marks per boot, boots stored. Per mark: ms as uint16, heap free as uint32
+    HEADER_SIZE = 4
+    MARK_FORMAT = "<HI"
+    MARK_SIZE = 6
+
+    def __init__(self, marks, boots, nvm_offset):
+        self.marks = marks
+        self.boots = boots
+        self.nvm_offset = nvm_offset
+        # Stage times and heap free of the stored boots, oldest first, this boot last
+        self.history = []
+
+    def mark(self, name):
+        self.marks.append((name, time.monotonic_ns(), gc.mem_free()))
+
+    def stage_times(self):
+        """Milliseconds spent in each stage, the first stage counted from power on"""
+
+        times = []
+        previous = 0
+        for _, ns, _ in self.marks:
+            times.append(min((ns - previous) // 1000000, 0xFFFF))
+            previous = ns
+        return times
+
+    def save(self):
+        """Add this boot to the NVM ring with a single write. Without NVM only this boot is reported"""
+
+        times = self.stage_times()
+        mems = [mem for _, _, mem in self.marks]
+        count = len(self.marks)
+
+        nvm = getattr(microcontroller, "nvm", None)
+        size = self.HEADER_SIZE + self.boots * count * self.MARK_SIZE
+        if nvm is None or self.nvm_offset + size > len(nvm):
+            self.history = [(times, mems)]
+            return False
+
+        region = bytearray(nvm[self.nvm_offset:self.nvm_offset + size])
+        if region[0] != self.MAGIC or region[2] != count or region[1] >= self.boots:
+            # First boot with this layout of marks
+            region = bytearray(size)
+            region[0] = self.MAGIC
+            region[2] = count
+
+        slot = region[1]
+        record = self.HEADER_SIZE + slot * count * self.MARK_SIZE
+        for i in range(count):
+            struct.pack_into(self.MARK_FORMAT, region, record + i * self.MARK_SIZE, times[i], mems[i])
+        region[1] = (slot + 1) % self.boots
+        region[3] = min(region[3] + 1, self.boots)
+        nvm[self.nvm_offset:self.nvm_offset + size] = region
+
+        self.history = self.read(region)
+        return True
+
+    def read(self, region):
+        """Stage times and heap free of the boots stored in an NVM ring region, oldest first. Empty if the
+        region does not hold a ring. Also used on a host to decode a copy of the NVM"""
+
+        boots = self.boots
+        if len(region) < self.HEADER_SIZE or region[0] != self.MAGIC or region[1] >= boots or region[3] > boots:
+            return []
+        count = region[2]
+        if len(region) < self.HEADER_SIZE + boots * count * self.MARK_SIZE:
+            return []
+
+        # The next slot follows the last boot written
+        history = []
+        for n in range(region[3], 0, -1):
+            record = self.HEADER_SIZE + ((region[1] - n) % boots) * count * self.MARK_SIZE
+            stored = [struct.unpack_from(self.MARK_FORMAT, region, record + i * self.MARK_SIZE) for i in range(count)]
+            history.append(([ms for ms, _ in stored], [mem for _, mem in stored]))
+        return history
+
+    def report(self):
+        """Print this boot's stage times and heap free with the average and maximum over the stored boots"""
+
+        if not self.history:
+            self.history = [(self.stage_times(), [mem for _, _, mem in self.marks])]
+
+        boots = len(self.history)
+        print("Boot profile, {} boot{} (ms, heap free at stage end):".format(boots, "s" if boots > 1 else ""))
+        print("{:<12} {:>6} {:>6} {:>6} {:>8}".format("Stage", "Now", "Avg", "Max", "Heap"))
+        totals = [0] * boots
+        for i, (name, _, _) in enumerate(self.marks):
+            stage = [times[i] for times, _ in self.history]
+            for boot in range(boots):
+                totals[boot] += stage[boot]
+            print("{:<12} {:>6} {:>6} {:>6} {:>8}".format(name, stage[-1], sum(stage) // boots, max(stage), self.history[-1][1][i]))
+        print("{:<12} {:>6} {:>6} {:>6}".format("Total", totals[-1], sum(totals) // boots, max(totals)))
+
+# --- Persistent State ---
+class StateStore:
+    """Fixed layout controller state record kept in NVM: encoder mode, shift lock, keymap bank and the
+    quad encoder volumes and toggles of both layers. nvm is microcontroller.nvm or any bytearray stand-in"""
+
+    MAGIC = 0x5E
+    # Header: magic, encoder count, encoder mode, shift lock, bank index, checksum. Then one byte per
+    # layer and encoder: the volume (0-127) with the toggle in bit 7
+    HEADER_SIZE = 6
+    CHECKSUM = 5
+    TOGGLE = 0x80
+
+    def __init__(self, nvm, offset, encoders):
+        self.nvm = nvm
+        self.offset = offset
+        self.encoders = encoders
+        self.size = self.HEADER_SIZE + 2 * encoders
+
+        # The record being packed, and the record last read from or written to NVM
+        self.record = bytearray(self.size)
+        self.saved = bytearray(self.size)
+        self.writes = 0
+
+    def _checksum(self, record):
+        total = 0
+        for i in range(self.size):
+            if i != self.CHECKSUM:
+                total += record[i]
+        return total & 0xFF
+
+    def available(self):
+        return self.nvm is not None and self.offset + self.size <= len(self.nvm)
+
+    def load(self):
+        """Read the record from NVM in a single read. True if it is valid for this encoder count"""
+
+        if not self.available():
+            return False
+
+        self.saved[:] = self.nvm[self.offset:self.offset + self.size]
+        self.record[:] = self.saved
+        record = self.record
+        return (record[0] == self.MAGIC and record[1] == self.encoders and
+                record[self.CHECKSUM] == self._checksum(record))
+
+    def encoder_mode(self):
+        return self.record[2]
+
+    def shift_lock(self):
+        return self.record[3] != 0
+
+    def bank_index(self):
+        return self.record[4]
+
+    def restore_volumes(self, volumes, toggles):
+        """Copy the loaded volumes and toggles into the per layer lists"""
+
+        index = self.HEADER_SIZE
+        for layer in range(2):
+            for n in range(self.encoders):
+                volumes[layer][n] = self.record[index] & 0x7F
+                toggles[layer][n] = (self.record[index] & self.TOGGLE) != 0
+                index += 1
+
+    def pack(self, encoder_mode, shift_lock, bank_index, volumes=None, toggles=None):
+        """Fill the record from the controller state"""
+
+        record = self.record
+        record[0] = self.MAGIC
+        record[1] = self.encoders
+        record[2] = encoder_mode
+        record[3] = 1 if shift_lock else 0
+        record[4] = bank_index
+
+        index = self.HEADER_SIZE
+        for layer in range(2):
+            for n in range(self.encoders):
+                record[index] = (volumes[layer][n] & 0x7F) | (self.TOGGLE if toggles[layer][n] else 0)
+                index += 1
+        record[self.CHECKSUM] = self._checksum(record)
+
+    def save(self):
+        """Write the packed record only when it differs from NVM. True if it was written"""
+
+        if not self.available() or self.record == self.saved:
+            return False
+
+        self.nvm[self.offset:self.offset + self.size] = self.record
+        self.saved[:] = self.record
+        self.writes += 1
+        return True
+
+# --- Setlist ---
+class Setlist:
+    """Songs kept in a text file, one per line as name:bank:sliders:macros, e.g.
+    Autumn Leaves:Ballads:LOWERS_CC=96,VOICE1_CC=80:PLUGGED. The file offset of every stride'th song is
+    indexed once on load, at most index_max offsets, so RAM does not grow with the setlist. A song is
+    read from the file and decoded only when it is selected"""
+
+    def __init__(self, filename, index_max):
+        self.filename = filename
+        self.index_max = index_max
+        self.count = 0
+        self.stride = 1
+        self.offsets = array.array('I')
+        self.position = -1
+
+    def _is_song(self, line):
+        line = line.strip()
+        return len(line) > 0 and not line.startswith(b'#')
+
+    def load(self):
+        """Index the song offsets in one pass over the file. False if there is no setlist"""
+
+        try:
+            setlist_file = open(self.filename, 'rb')
+        except OSError:
+            return False
+
+        self.count = 0
+        self.stride = 1
+        self.offsets = array.array('I')
+        self.position = -1
+
+        with setlist_file:
+            offset = 0
+            while True:
+                line = setlist_file.readline()
+                if not line:
+                    break
+                if self._is_song(line):
+                    if self.count % self.stride == 0:
+                        if len(self.offsets) == self.index_max:
+                            # Index full: keep every other offset and double the stride
+                            self.offsets = array.array('I', self.offsets[::2])
+                            self.stride *= 2
+                        if self.count % self.stride == 0:
+                            self.offsets.append(offset)
+                    self.count += 1
+                offset += len(line)
+
+        return self.count > 0
+
+    def select(self, position):
+        """Seek to the indexed offset at or before a song, read it and decode it. None if it cannot be read"""
+
+        if not self.count:
+            return None
+        position %= self.count
+
+        skip = position % self.stride
+        try:
+            with open(self.filename, 'rb') as setlist_file:
+                setlist_file.seek(self.offsets[position // self.stride])
+                while True:
+                    line = setlist_file.readline()
+                    if not line:
+                        return None
+                    if self._is_song(line):
+                        if not skip:
+                            break
+                        skip -= 1
+        except OSError as e:
+            print("Error reading setlist: {}".format(e))
+            return None
+
+        self.position = position
+        return self._decode(line.decode().strip())
+
+    def step(self, delta):
+        """Select the song delta songs after the current one, the first or last song if none is selected yet"""
+
+        if self.position < 0:
+            return self.select(0 if delta > 0 else -1)
+        return self.select(self.position + delta)
+
+    def _decode(self, line):
+        """Song line to (name, bank, ((cc, value), ...), (macro, ...))"""
+
+        parts = line.split(':')
+        parts += [""] * (4 - len(parts))
+        name, bank, slider_text, macro_text = [part.strip() for part in parts[:4]]
+
+        sliders = []
+        for item in slider_text.split(','):
+            if not item.strip():
+                continue
+            try:
+                cc_name, value = item.split('=')
+                cc = getattr(SliderCC, cc_name.strip())
+                sliders.append((cc, max(0, min(127, int(value)))))
+            except (ValueError, AttributeError):
+                print("Error in setlist song {}: {}".format(name, item))
+
+        macros = tuple(macro.strip() for macro in macro_text.split(',') if macro.strip())
+        return (name, bank, tuple(sliders), macros)
+
+# --- Macro Library ---
+class MacroLibrary:
+    """Macros kept in a library file in the keymap.cfg format, macNN=name:[0:Pedal,1:Tab,...]. Only the file offset
+    of each macro name is held in RAM. A macro is read and compiled into its complete messages on first use by the
+    compile function, then kept in a least recently used cache of cache_size macros"""
+
+    def __init__(self, filename, cache_size, compile):
+        self.filename = filename
+        self.cache_size = cache_size
+        self.compile = compile
+        self.offsets = {}
+
+        # Compiled messages by macro name, and the cached names from least to most recently used
+        self.cache = {}
+        self.recent = []
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load(self):
+        """Index the macro names in one pass over the file. False if there is no library"""
+
+        try:
+            library_file = open(self.filename, 'rb')
+        except OSError:
+            return False
+
+        self.offsets = {}
+        self.cache = {}
+        self.recent = []
+
+        with library_file:
+            offset = 0
+            while True:
+                line = library_file.readline()
+                if not line:
+                    break
+                name = self._macro_name(line)
+                if name:
+                    self.offsets[name] = offset
+                offset += len(line)
+
+        return len(self.offsets) > 0
+
+    def _macro_name(self, line):
+        line = line.strip()
+        if not line.startswith(b'mac') or b'=' not in line or b':[' not in line:
+            return None
+        return line.split(b'=', 1)[1].split(b':[', 1)[0].decode()
+
+    def __contains__(self, name):
+        return name in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get(self, name):
+        """Compiled messages of a macro, read from the file on a cache miss. None if the macro is unknown or invalid"""
+
+        buffer = self.cache.get(name)
+        if buffer is not None:
+            self.hits += 1
+            if self.recent[-1] != name:
+                self.recent.remove(name)
+                self.recent.append(name)
+            return buffer
+
+        offset = self.offsets.get(name)
+        if offset is None:
+            print("Macro not found: {}".format(name))
+            return None
+        self.misses += 1
+
+        try:
+            with open(self.filename, 'rb') as library_file:
+                library_file.seek(offset)
+                line = library_file.readline().decode()
+        except OSError as e:
+            print("Error reading macro library: {}".format(e))
+            return None
+
+        buffer = self.compile(line)
+        if buffer is None:
+            return None
+
+        if len(self.recent) >= self.cache_size:
+            del self.cache[self.recent.pop(0)]
+            self.evictions += 1
+        self.cache[name] = buffer
+        self.recent.append(name)
+        return buffer
+
+    def report(self):
+        """Print the cache use and hit rate on the serial console"""
+
+        lookups = self.hits + self.misses
+        rate = 100 * self.hits // lookups if lookups else 0
+        print("Macro library: {} macros, {}/{} cached, {} bytes".format(
+            len(self.offsets), len(self.cache), self.cache_size, sum(len(buffer) for buffer in self.cache.values())))
+        print("Hits: {} ({}%) misses: {} ({}%) evictions: {}".format(
+            self.hits, rate, self.misses, 100 - rate if lookups else 0, self.evictions))
+
+# --- Controller Constants ---
+class LoopStage:
+    KEYS = 0
+    ENCODER = 1
+    QUAD = 2
+    DISPLAY = 3
+    PIXELS = 4
+    MEMORY = 5
+    SERIAL = 6
+    STARTUP = 7
+    STATE = 8
+    RAMPS = 9
+    MIDI = 10
+
+    NAMES = ("Keys", "Encoder", "Quad", "Display", "Pixels", "Memory", "Serial", "Startup", "State", "Ramps", "MIDI In")
+
+class Colors:
+    WHITE = 0x606060
+    BLUE = 0x000020
+    GREEN = 0x002000
+    RED = 0x200000
+    ORANGE = 0x701E02
+    PURPLE = 0x800080
+    YELLOW = 0x808000
+    TEAL = 0x004040
+    OFFWHITE = 0x22202F
+
+# Color names accepted in keymap.cfg, each the lower case name of a Colors value
+COLOR_NAMES = ("red", "green", "blue", "purple", "yellow", "orange", "white", "teal", "offwhite")
+
+# --- Device Profile ---
+class DeviceProfile:
+    """What makes one controller out of this core: the classes it is built from and its MIDI port set up.
+    Each controller's code.py sets its profile as the PROFILE of its EVMController class"""
+
+    def __init__(self, name, config, key_cache, config_handler, state, midi_handler, midi_in_channel=0, midi_out_channel=None):
+        self.name = name
+        self.config = config
+        self.key_cache = key_cache
+        self.config_handler = config_handler
+        self.state = state
+        self.midi_handler = midi_handler
+
+        # Channels of the adafruit_midi instance, a midi_out_channel of None uses the MIDChan out channel
+        self.midi_in_channel = midi_in_channel
+        self.midi_out_channel = midi_out_channel
+
+# --- Configuration Class ---
+class EVMConfig:
+    def __init__(self):
+        self.display_banner =     "     Ketron EVM      "
+        self.display_sub_banner = "Arranger Controller "
+        self.version = "1.2"
+        #self.display_banner =     "    AJAMSONIC HS13   "
+        #self.display_sub_banner = "Pad Controller   "
+        #self.version = "5.2"
+
+        # USB port on the left side of the MacroPad
+        self.usb_left = True
+
+        # Key LED colors, a device may use its own shades
+        self.colors = Colors
+
+        # MIDI Output Channel
+        self.midi_out_channel = 15
+                
+        # Key used to reflect timed Eccoder mode changes on LED
+        # Enable or disable Layer Shift Mode for users who prefer single layer only 
+        self.key_variation = 0
+        self.shift_enable = True
+
+        # Timers for tempo, volume, and key brightness
+        self.key_bright_timer = 0.20
+        self.shift_hold_timer = 0.25
+        
+        self.tempo_timer = 60
+        self.volume_timer = 60
+        self.value_timer = 60
+        self.bank_timer = 60
+        self.song_timer = 60
+        self.hires_timer = 60
+        self.version_timer = 15
+        self.tune_hold_timer = 2
+
+        # Master volume change per encoder detent
+        self.volume_step = 8
+
+        # Tempo mode detents are collected until the encoder rests for tempo_turn milliseconds, then sent in one burst
+        self.tempo_turn = 80
+
+        # Main loop stage error budget: errors allowed within the window before a stage is backed off, in milliseconds
+        self.stage_error_budget = 5
+        self.stage_error_window = 1000
+        self.stage_backoff = 2000
+
+        # Garbage is collected only after no key or encoder activity for this many milliseconds
+        self.gc_idle = 500
+
+        # Boot profile: boots kept in the NVM ring and its NVM offset
+        self.boot_profile_boots = 8
+        self.boot_profile_nvm = 0
+
+        # Controller state kept in NVM, saved once there was no key or encoder activity for state_quiet milliseconds
+        self.state_save = True
+        self.state_quiet = 5000
+        self.state_nvm = 1024
+
+        # Encoder acceleration profile names for the main encoder modes
+        self.accel_tempo = "none"
+        self.accel_volume = "none"
+
+        # Keymap banks defined in keymap.cfg, including the Default bank
+        self.max_banks = 16
+
+        # Setlist song file and the most song offsets indexed in RAM
+        self.setlist_file = "/setlist.cfg"
+        self.setlist_index_max = 256
+
+        # Macro library file and the most library macros kept compiled in RAM
+        self.macro_file = "/macros.cfg"
+        self.macro_cache_size = 16
+
+        # Volume ramps: ramps running at once, milliseconds between ramp updates and the tempo for ramps in beats
+        self.max_ramps = 4
+        self.ramp_interval = 20
+        self.ramp_bpm = 120
+
+        # Key actions held until the next beat or bar of the inbound MIDI clock: 0 off, MIDIClock.BEAT or MIDIClock.BAR
+        self.quantize = 0
+        self.beats_per_bar = 4
+
+        # Tap tempo: tap intervals averaged and the pause in milliseconds that starts a new run of taps
+        self.tap_window = 4
+        self.tap_timeout = 2000
+
+        # High resolution (NRPN or 14-bit CC) parameter of the encoder HiRes mode, and its change per detent of 0-16383
+        self.encoder_hires = ""
+        self.hires_step = 64
+
+        # Initialize MacroPad key mappings
+        self.key_map = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
+        if not self.usb_left:
+            self.key_map = [11 - i for i in range(12)]
+
+    def get_key(self, key):
+        """Safe key mapping with bounds checking"""
+        
+        if key < 0 or key > 11:
+            print("Invalid key map request: {}".format(key))
+            return 0
+        return self.key_map[key]
+
+# --- Key Lookup Cache for Performance ---
+class KeyLookupCache:
+    def __init__(self, config):
+        self.config = config
+
+        # Active bank lookup tables and LED frames, indexed by key number
+        self.cache = ()
+        self.cache_shift = ()
+        self.led_frame = ()
+        self.led_frame_shift = ()
+
+        # Initialize MacroPad key & color mappings to default MIDI message values
+        # USB drive keymap.cfg file will override if present
+        self.macropad_key_map = [
+            "1:VARIATION", "0:Arr.A", "0:Intro/End1", "0:Fill",
+            "0:Arr.B", "0:Intro/End2","0:Break", "0:Arr.C",
+            "0:Intro/End3", "0:Start/Stop", "0:Arr.D", "0:To End"
+        ]
+        self.macropad_color_map = [
+            Colors.BLUE, Colors.BLUE, Colors.GREEN, Colors.GREEN,
+            Colors.BLUE, Colors.GREEN, Colors.ORANGE, Colors.BLUE,
+            Colors.GREEN, Colors.RED, Colors.BLUE, Colors.RED
+        ]
+
+        self.macropad_key_map_shift = [
+            "1:VARIATION", "0:Low. Mute", "1:TRANSP_DOWN", "0:HALF BAR",
+            "0:FILL & DRUM IN", "1:TRANSP_UP", "0:Arr.Off", "2:UNPLUGGED",
+            "1:OCTAVE_DOWN", "0:Start/Stop", "2:PLUGGED", "1:OCTAVE_UP"
+        ]
+        self.macropad_color_map_shift = [
+            Colors.RED, Colors.BLUE, Colors.YELLOW, Colors.PURPLE,
+            Colors.GREEN, Colors.YELLOW, Colors.RED, Colors.ORANGE,
+            Colors.TEAL, Colors.RED, Colors.ORANGE, Colors.TEAL
+        ]
+
+        self.user_macro_midis = {
+            "UNPLUGGED":["0:FILL & DRUM IN"],
+            "PLUGGED":["0:Drum Mute"],
+            "FArr.A":["1:FILL","0:Arr.A"],
+            "FArr.B":["1:FILL","0:Arr.B"],
+            "FArr.C":["1:FILL","0:Arr.C"],
+            "FArr.D":["1:FILL","0:Arr.D"],
+            "SStop":["0:Start/Stop"],
+            "SStop":["0:Start/Stop"],
+            "SStop":["0:Start/Stop"],
+            "SStop":["0:Start/Stop"]
+        }
+
+        # Encoder acceleration profiles and the tables for the main encoder Tempo and Volume modes
+        self.accel = EncoderAccel()
+        self.accel_tempo = b""
+        self.accel_volume = b""
+
+        # User macros compiled into (type, value) pairs of Pedal and Tab commands by _build_cache()
+        self.macro_cache = {}
+
+        # Volume ramps by name: (CC, target, duration, in beats) for RampEngine.start()
+        self.ramp_names = []
+        self.ramps = []
+
+        # High resolution parameters by name: (parameter, start value, highest value) for MIDIHandler.step_hires()
+        self.hires_names = []
+        self.hires = []
+
+        # Keymap banks: raw key and color maps per bank, compiled into tables by _build_cache()
+        # Bank 0 is the Default bank and holds the maps above
+        self.bank_names = ["Default"]
+        self.bank_maps = [(self.macropad_key_map, self.macropad_color_map,
+                           self.macropad_key_map_shift, self.macropad_color_map_shift)]
+        self.banks = []
+        self.bank_index = 0
+
+        # Ketron Pedal and Tab command catalogs, only needed while the config is compiled. See release_catalogs()
+        self.pedal_midis = None
+        self.tab_midis = None
+        self.open_catalogs()
+
+        # Commands sent by the encoder modes, looked up once so the catalogs can be released
+        self.tempo_up = self.pedal_midis["Tempo Up"]
+        self.tempo_down = self.pedal_midis["Tempo Down"]
+        self.rotor_fast = self.tab_midis["ROTOR_FAST"]
+        self.rotor_slow = self.tab_midis["ROTOR_SLOW"]
+        self.dial_up = self.tab_midis["DIAL_UP"]
+        self.dial_down = self.tab_midis["DIAL_DOWN"]
+        self.tap = self.pedal_midis["TAP"]
+
+        self._build_cache()
+
+    def open_catalogs(self):
+        """Unpack the Pedal and Tab command catalogs for compiling the config"""
+
+        if self.pedal_midis is None:
+            self.pedal_midis = Catalog(PEDAL_COMMANDS)
+            self.tab_midis = Catalog(TAB_COMMANDS)
+
+    def release_catalogs(self, collect=True):
+        """Drop the command catalogs once the config is compiled, keys and macros only hold the values"""
+
+        self.pedal_midis = None
+        self.tab_midis = None
+        if collect:
+            gc.collect()
+
+    def reset_banks(self):
+        """Drop all banks except Default and make Default the bank being configured"""
+
+        del self.bank_names[1:]
+        del self.bank_maps[1:]
+        self.bank_index = 0
+        self.macropad_key_map, self.macropad_color_map, self.macropad_key_map_shift, self.macropad_color_map_shift = self.bank_maps[0]
+
+    def add_bank(self, name):
+        """Start a new bank preset to the Default bank maps. Keys loaded next are applied to this bank"""
+
+        if len(self.bank_names) >= self.config.max_banks:
+            raise ValueError("Too many banks, max {}".format(self.config.max_banks))
+
+        default_maps = self.bank_maps[0]
+        self.macropad_key_map = list(default_maps[0])
+        self.macropad_color_map = list(default_maps[1])
+        self.macropad_key_map_shift = list(default_maps[2])
+        self.macropad_color_map_shift = list(default_maps[3])
+
+        self.bank_names.append(name)
+        self.bank_maps.append((self.macropad_key_map, self.macropad_color_map,
+                               self.macropad_key_map_shift, self.macropad_color_map_shift))
+
+    def _build_layer(self, key_map):
+        """Compile one layer of key strings into a tuple of (type, command, value) indexed by key"""
+
+        layer = []
+        for i in range(12):
+            key_id = self.config.get_key(i)
+            mapped_key = key_map[key_id]
+
+            if mapped_key and len(mapped_key) > 2 and mapped_key[1] == ':':
+                try:
+                    lookup_key = int(mapped_key[0])
+                    midi_key = mapped_key[2:]
+
+                    if lookup_key == MIDIType.PEDAL:
+                        midi_value = self.pedal_midis.get(midi_key, 0)
+                    elif lookup_key == MIDIType.RAMP:
+                        midi_value = self.find_ramp(midi_key)
+                    else:
+                        midi_value = self.tab_midis.get(midi_key, 0)
+
+                    layer.append((lookup_key, midi_key, midi_value))
+                except (ValueError, IndexError):
+                    print("Error caching key {}: {}".format(i, mapped_key))
+                    layer.append((0, "", 0))
+            else:
+                layer.append((0, "", 0))
+
+        return tuple(layer)
+
+    def _build_macros(self):
+        """Compile the user macro lists so sending a macro does no parsing"""
+
+        self.macro_cache = {}
+        for name, items in self.user_macro_midis.items():
+            self.macro_cache[name] = self.compile_macro(items)
+
+    def compile_macro(self, items):
+        """Compile a macro list of "type:name" strings into (type, value) pairs of Pedal and Tab commands"""
+
+        commands = []
+        for item in items:
+            macro_parts = item.split(':')
+            if len(macro_parts) < 2:
+                continue
+            try:
+                lookup_key = int(macro_parts[0].strip())
+            except ValueError:
+                continue
+            value = macro_parts[1].strip()
+
+            if lookup_key == MIDIType.PEDAL:
+                midi_value = self.pedal_midis.get(value, 0)
+            elif lookup_key == MIDIType.TAB:
+                midi_value = self.tab_midis.get(value, 0)
+            elif lookup_key == MIDIType.RAMP:
+                # Ramps are referenced by index, which starts at 0
+                ramp_index = self.find_ramp(value)
+                if ramp_index >= 0:
+                    commands.append((lookup_key, ramp_index))
+                continue
+            else:
+                continue
+            if midi_value:
+                commands.append((lookup_key, midi_value))
+        return tuple(commands)
+
+    def _build_cache(self):
+        """Build lookup tables and LED frames for all banks at startup"""
+
+        self._build_macros()
+
+        self.banks = []
+        for index, name in enumerate(self.bank_names):
+            key_map, color_map, key_map_shift, color_map_shift = self.bank_maps[index]
+
+            gc.collect()
+            mem_start = gc.mem_free()
+
+            bank = (
+                self._build_layer(key_map),
+                self._build_layer(key_map_shift),
+                tuple(color_map),
+                tuple(color_map_shift)
+            )
+            self.banks.append(bank)
+
+            gc.collect()
+            print("Bank {}: {} - {} bytes".format(index, name, mem_start - gc.mem_free()))
+
+        self.select_bank(self.bank_index)
+
+        # Build encoder acceleration tables
+        self.accel.build()
+        self.accel_tempo = self.accel.get_table(self.config.accel_tempo)
+        self.accel_volume = self.accel.get_table(self.config.accel_volume)
+
+    def select_bank(self, index):
+        """Switch the active lookup tables and LED frames to a bank, wrapping around at either end"""
+
+        self.bank_index = index % len(self.banks)
+        self.cache, self.cache_shift, self.led_frame, self.led_frame_shift = self.banks[self.bank_index]
+        return self.bank_names[self.bank_index]
+
+    def add_ramp(self, name, cc, target, duration, beats):
+        """Define a named volume ramp, replacing one of the same name"""
+
+        ramp = (cc, target, duration, beats)
+        index = self.find_ramp(name)
+        if index < 0:
+            self.ramp_names.append(name)
+            self.ramps.append(ramp)
+        else:
+            self.ramps[index] = ramp
+
+    def find_ramp(self, name):
+        """Return the index of a named ramp, or -1 if not defined"""
+
+        for index, ramp_name in enumerate(self.ramp_names):
+            if ramp_name == name:
+                return index
+        return -1
+
+    def add_hires(self, name, parameter, start, maximum=MIDIHandler.HIRES_MAX):
+        """Define a named high resolution parameter, replacing one of the same name"""
+
+        for index, hires_name in enumerate(self.hires_names):
+            if hires_name == name:
+                self.hires[index] = (parameter, start, maximum)
+                return
+        self.hires_names.append(name)
+        self.hires.append((parameter, start, maximum))
+
+    def find_hires(self, name):
+        """Return the index of a named high resolution parameter, or -1 if not defined.
+        A Ketron NRPN parameter not defined in keymap.cfg is added from KETRON_NRPNS on first use"""
+
+        for index, hires_name in enumerate(self.hires_names):
+            if hires_name == name:
+                return index
+
+        for nrpn_name, msb, lsb, maximum in KETRON_NRPNS:
+            if nrpn_name == name:
+                self.add_hires(name, MIDIHandler.HIRES_MSB | msb << 7 | lsb, 0, maximum)
+                return len(self.hires) - 1
+        return -1
+
+    def find_bank(self, name):
+        """Return the index of a named bank, or -1 if not defined"""
+
+        for index, bank_name in enumerate(self.bank_names):
+            if bank_name == name:
+                return index
+        return -1
+
+    def get_key_midi(self, key_id, shift_mode):
+        """Get cached MIDI data for key"""
+        
+        if (shift_mode == ShiftKeyMode.ACTIVE_SHIFT) or (shift_mode == ShiftKeyMode.ACTIVE_LOCK):
+            return self.cache_shift[key_id]
+        else:
+            return self.cache[key_id]
+
+    def validate_color_string(self, color_string):
+        """Validate and return color code"""
+        
+        color_name = color_string.lower()
+        if color_name in COLOR_NAMES:
+            return getattr(self.config.colors, color_name.upper())
+        return self.config.colors.WHITE
+
+# --- Configuration File Handler ---
+class ConfigFileHandler:
+    def __init__(self, key_cache, config):
+        self.key_cache = key_cache
+        self.config = config
+        self.config_error = False
+
+    def safe_file_read(self, filename):
+        """Safely read file with error handling"""
+        
+        try:
+            with open(filename, "r") as f:
+                return f.readlines()
+        except (OSError, IOError) as e:
+            print("Error reading {}: {}".format(filename, e))
+            return []
+
+    def parse_key_config_line(self, line):
+        """Parse a single key config line with validation"""
+        
+        #key00=1:VARIATION:blue
+        try:
+            line = line.strip()
+            if line.startswith('#') or not line:
+                return None
+
+            if '=' not in line or line.count(':') < 2:
+                raise ValueError("Invalid format")
+
+            line_parts = line.split('=', 1)
+            if len(line_parts) != 2 or not line_parts[0].startswith('key'):
+                raise ValueError("Invalid key format")
+
+            key_parts = line_parts[1].split(':')
+            if len(key_parts) != 3:
+                raise ValueError("Invalid value format")
+
+            return {
+                'key': line_parts[0],
+                'type': int(key_parts[0]),
+                'command': key_parts[1],
+                'color': key_parts[2]
+            }
+        except (ValueError, IndexError) as e:
+            print("Error parsing key line '{}': {}".format(line, e))
+            return None
+
+    def parse_macro_config_line(self, line):
+        """Parse a single macro config line with validation"""
+        
+        #mac00=PLUGGED:[1:FILL,0:Sostenuto]
+        try:
+            line = line.strip()
+            if line.startswith('#') or not line:
+                return None
+
+            if '=' not in line:
+                raise ValueError("Invalid format")
+
+            line_parts = line.split('=', 1)
+            if len(line_parts) != 2 or not line_parts[0].startswith('mac'):
+                raise ValueError("Invalid macro format")
+
+            # Extract the macro key
+            macro_parts = line_parts[1].split(':[')
+            if len(macro_parts) != 2:
+                raise ValueError("Invalid macro format")
+
+            # Extract the macro list
+            # Split by ',' and strip trailing ']' after last macro in list
+            macro_list = []
+            list_parts = macro_parts[1].split(',') 
+            for part in list_parts:
+                str_part = str(part).replace("]","")                
+                macro_list.append(str_part)
+
+            return {
+                'macro': str(line_parts[0]),
+                'macro_key': str(macro_parts[0]),
+                'macro_list': macro_list,
+            }
+        except (ValueError, IndexError) as e:
+            print("Error parsing macro line '{}': {}".format(line, e))
+            return None
+
+    def parse_bank_config_line(self, line):
+        """Parse a single bank config line with validation"""
+        
+        #bnk01=Ballads
+        try:
+            line = line.strip()
+            if line.startswith('#') or not line:
+                return None
+
+            line_parts = line.split('=', 1)
+            if len(line_parts) != 2 or not line_parts[0].startswith('bnk'):
+                raise ValueError("Invalid bank format")
+
+            bank_name = line_parts[1].strip()
+            if not bank_name:
+                raise ValueError("Missing bank name")
+
+            return {
+                'bank': line_parts[0],
+                'name': bank_name
+            }
+        except (ValueError, IndexError) as e:
+            print("Error parsing bank line '{}': {}".format(line, e))
+            return None
+
+    def parse_ramp_config_line(self, line):
+        """Parse a single volume ramp config line with validation"""
+        
+        #rmp00=FadeIn.Drums:DRUM_CC:100:8b
+        try:
+            line = line.strip()
+            if line.startswith('#') or not line:
+                return None
+
+            line_parts = line.split('=', 1)
+            if len(line_parts) != 2 or not line_parts[0].startswith('rmp'):
+                raise ValueError("Invalid ramp format")
+
+            ramp_parts = [part.strip() for part in line_parts[1].split(':')]
+            if len(ramp_parts) != 4 or not ramp_parts[0]:
+                raise ValueError("Invalid ramp format")
+
+            # A Slider CC name, or VOLUME for the master volume CC11
+            if ramp_parts[1] == "VOLUME":
+                cc = 11
+            elif hasattr(SliderCC, ramp_parts[1]):
+                cc = getattr(SliderCC, ramp_parts[1])
+            else:
+                raise ValueError("Invalid ramp CC: {}".format(ramp_parts[1]))
+
+            target = int(ramp_parts[2])
+            if target < 0 or target > 127:
+                raise ValueError("Invalid ramp target: {}".format(target))
+
+            # Duration in milliseconds, or in beats with a trailing b
+            beats = ramp_parts[3].endswith('b')
+            duration = int(ramp_parts[3][:-1] if beats else ramp_parts[3])
+
+            self.key_cache.add_ramp(ramp_parts[0], cc, target, duration, beats)
+
+            return {
+                'name': ramp_parts[0],
+                'cc': cc,
+                'target': target,
+                'duration': duration,
+                'beats': beats
+            }
+        except (ValueError, IndexError) as e:
+            print("Error parsing ramp line '{}': {}".format(line, e))
+            return None
+
+    def parse_hires_config_line(self, line):
+        """Parse a single high resolution parameter config line with validation"""
+
+        #nrp00=Reverb.Fine:NRPN:1:10:8192 or nrp01=Mod.Fine:CC14:1
+        try:
+            line = line.strip()
+            if line.startswith('#') or not line:
+                return None
+
+            line_parts = line.split('=', 1)
+            if len(line_parts) != 2 or not line_parts[0].startswith('nrp'):
+                raise ValueError("Invalid NRPN format")
+
+            hires_parts = [part.strip() for part in line_parts[1].split(':')]
+            if not hires_parts[0]:
+                raise ValueError("Invalid NRPN format")
+
+            # NRPN:MSB:LSB as sent with CC99 and CC98, or CC14:control sent on control and control + 32
+            if hires_parts[1] == "NRPN":
+                msb = int(hires_parts[2])
+                lsb = int(hires_parts[3])
+                if msb < 0 or msb > 127 or lsb < 0 or lsb > 127:
+                    raise ValueError("Invalid NRPN number: {}:{}".format(msb, lsb))
+                parameter = msb << 7 | lsb
+                start_part = 4
+            elif hires_parts[1] == "CC14":
+                control = int(hires_parts[2])
+                if control < 0 or control > 31:
+                    raise ValueError("Invalid 14-bit CC: {}".format(control))
+                parameter = MIDIHandler.HIRES_CC | control
+                start_part = 3
+            else:
+                raise ValueError("Invalid NRPN type: {}".format(hires_parts[1]))
+
+            # Value sent first time the parameter is changed, the middle of 0-16383 by default
+            start = 8192
+            if len(hires_parts) > start_part and hires_parts[start_part]:
+                start = int(hires_parts[start_part])
+                if start < 0 or start > MIDIHandler.HIRES_MAX:
+                    raise ValueError("Invalid NRPN start value: {}".format(start))
+
+            self.key_cache.add_hires(hires_parts[0], parameter, start)
+
+            return {
+                'name': hires_parts[0],
+                'parameter': parameter,
+                'start': start
+            }
+        except (ValueError, IndexError) as e:
+            print("Error parsing NRPN line '{}': {}".format(line, e))
+            return None
+
+    def parse_accel_config_line(self, line):
+        """Parse a single encoder acceleration profile config line with validation"""
+        
+        #acc00=fast:exp:8:300
+        try:
+            line = line.strip()
+            if line.startswith('#') or not line:
+                return None
+
+            line_parts = line.split('=', 1)
+            if len(line_parts) != 2 or not line_parts[0].startswith('acc'):
+                raise ValueError("Invalid profile format")
+
+            accel_parts = line_parts[1].split(':', 1)
+            if len(accel_parts) != 2 or not accel_parts[0]:
+                raise ValueError("Invalid profile format")
+
+            # Raises ValueError if the profile does not build
+            self.key_cache.accel.add_profile(accel_parts[0], accel_parts[1])
+
+            return {
+                'name': accel_parts[0],
+                'spec': accel_parts[1]
+            }
+        except (ValueError, IndexError) as e:
+            print("Error parsing profile line '{}': {}".format(line, e))
+            return None
+
+    def parse_var_config_line(self, line):
+        """Parse a single variable config line with validation"""
+        
+        #var00=EncQuad:True
+        try:
+            line = line.strip()
+            if line.startswith('#') or not line:
+                return None
+
+            if '=' not in line:
+                raise ValueError("Invalid format")
+
+            line_parts = line.split('=', 1)
+            if len(line_parts) != 2 or not line_parts[0].startswith('var'):
+                raise ValueError("Invalid variable format")
+
+            # Extract the variable key
+            macro_parts = line_parts[1].split(':')
+            if len(macro_parts) != 2:
+                raise ValueError("Invalid variable format")
+                
+            #print(f"var line: {line_parts[1]}")
+
+            if macro_parts[0] == 'EncQuad':
+                if macro_parts[1].strip() == "True":
+                    self.config.is_quadencoder = True
+                else: 
+                    self.config.is_quadencoder = False
+                print(f"Var Quad Encoder Enable: {self.config.is_quadencoder}")
+
+            elif macro_parts[0] == 'EncStep':
+                step = int(macro_parts[1])
+                if step == 2:
+                    self.config.encoder_step = 2
+                elif step == 4:
+                    self.config.encoder_step = 4
+                else: 
+                    self.config.encoder_step = 8
+                print(f"Var Encoder Step: {self.config.encoder_step}")
+
+            elif macro_parts[0] == 'EncFwd':
+                if macro_parts[1].strip() == "True":
+                    self.config.encoder_fwd = True
+                else: 
+                    self.config.encoder_fwd = False
+                print(f"Var Encoder FWD/BKWD: {self.config.encoder_fwd}")
+            
+            elif macro_parts[0] == 'EncGrad':
+                if macro_parts[1].strip() == "True":
+                    self.config.encoder_grad = True
+                else: 
+                    self.config.encoder_grad = False
+                print(f"Var Encoder Graduation: {self.config.encoder_grad}")
+            
+            elif macro_parts[0] == 'EncVol':
+                vol = int(macro_parts[1])
+                if vol > 0 and vol < 128:
+                    self.config.encoder_vol = vol
+                else:
+                    self.config.encoder_vol = 96
+                print(f"Var Encoder Volume: {self.config.encoder_vol}")
+
+            elif macro_parts[0] == 'AccTempo':
+                self.config.accel_tempo = macro_parts[1].strip()
+                print(f"Var Tempo Acceleration: {self.config.accel_tempo}")
+
+            elif macro_parts[0] == 'AccVol':
+                self.config.accel_volume = macro_parts[1].strip()
+                print(f"Var Volume Acceleration: {self.config.accel_volume}")
+
+            elif macro_parts[0] == 'StateSave':
+                if macro_parts[1].strip() == "True":
+                    self.config.state_save = True
+                else:
+                    self.config.state_save = False
+                print(f"Var State Save: {self.config.state_save}")
+
+            elif macro_parts[0] == 'EncHiRes':
+                self.config.encoder_hires = macro_parts[1].strip()
+                print(f"Var Encoder HiRes: {self.config.encoder_hires}")
+
+            elif macro_parts[0] == 'HiStep':
+                step = int(macro_parts[1])
+                if step >= 1 and step <= 4096:
+                    self.config.hires_step = step
+                else:
+                    self.config.hires_step = 64
+                print(f"Var HiRes Step: {self.config.hires_step}")
+
+            elif macro_parts[0] == 'MacCache':
+                size = int(macro_parts[1])
+                if size >= 1 and size <= 64:
+                    self.config.macro_cache_size = size
+                print(f"Var Macro Cache: {self.config.macro_cache_size}")
+
+            elif macro_parts[0] == 'Quantize':
+                quantize = macro_parts[1].strip()
+                if quantize == "Beat":
+                    self.config.quantize = MIDIClock.BEAT
+                elif quantize == "Bar":
+                    self.config.quantize = MIDIClock.BAR
+                else:
+                    self.config.quantize = 0
+                print(f"Var Quantize: {quantize}")
+
+            elif macro_parts[0] == 'BarBeats':
+                beats = int(macro_parts[1])
+                if beats >= 1 and beats <= 16:
+                    self.config.beats_per_bar = beats
+                print(f"Var Beats per Bar: {self.config.beats_per_bar}")
+
+            elif macro_parts[0] == 'RampBPM':
+                bpm = int(macro_parts[1])
+                if bpm >= 20 and bpm <= 300:
+                    self.config.ramp_bpm = bpm
+                print(f"Var Ramp BPM: {self.config.ramp_bpm}")
+
+            elif macro_parts[0] == 'KeyVar':
+                varkey = int(macro_parts[1])
+                if varkey >= 0 and varkey < 12:
+                    self.config.key_variation = varkey
+                print(f"Var Key Variation: {self.config.key_variation}")
+
+            elif macro_parts[0] == 'ModShift':
+                if macro_parts[1].strip() == "True":
+                    self.config.shift_enable = True
+                else: 
+                    self.config.shift_enable = False
+                print(f"Var Shift Enable: {self.config.shift_enable}")
+
+            elif macro_parts[0] == 'TimVar':
+                timvar = int(macro_parts[1])
+                if timvar >= 250 and timvar < 10000:
+                    self.config.shift_hold_timer = timvar/1000
+                else:
+                    self.config.shift_hold_timer = 0.25
+                print(f"Var Variation Timer: {self.config.shift_hold_timer}")
+            
+            elif macro_parts[0] == 'TimTempo':
+                timtempo = int(macro_parts[1])
+                if timtempo >= 10000 and timtempo < 60000:
+                    self.config.tempo_timer = timtempo/1000
+                else:
+                    self.config.tempo_timer = 6
+                print(f"Var Tempo Timer: {self.config.tempo_timer}")
+            
+            elif macro_parts[0] == 'TimTurn':
+                timturn = int(macro_parts[1])
+                if timturn >= 0 and timturn <= 1000:
+                    self.config.tempo_turn = timturn
+                else:
+                    self.config.tempo_turn = 80
+                print(f"Var Tempo Turn Timer: {self.config.tempo_turn}")
+
+            elif macro_parts[0] == 'MIDChan':
+                midchan = int(macro_parts[1])
+                if midchan >= 1 and midchan <= 16:
+                    self.config.midi_out_channel = midchan - 1
+                else:
+                    self.config.midi_out_channel = 15
+                print(f"Var MIDI Chan Out: {self.config.midi_out_channel}")
+
+            else:
+                self.parse_device_var(macro_parts[0], macro_parts[1])
+            
+            return True
+        except (ValueError, IndexError) as e:
+            print("Error parsing variable line '{}': {}".format(line, e))
+            return None
+
+    def parse_device_var(self, name, value):
+        """Set a variable only the device has, True if the name is one of them"""
+
+        return False
+
+    def parse_device_line(self, line):
+        """Parse a config line kind only the device has, True if the line was one of them.
+        Errors are raised as ValueError so load_config records them"""
+
+        return False
+
+    def validate_midi_string(self, midi_type, command):
+        """Validate MIDI command against known commands"""
+        
+        if midi_type == MIDIType.PEDAL:
+            return command in self.key_cache.pedal_midis
+        elif midi_type == MIDIType.TAB:
+            return command in self.key_cache.tab_midis
+            
+        # To do: Initially macros hard coded, now loaded after keys. Validate after macros loaded
+        #elif midi_type == MIDIType.MACRO:
+        #    for macro in self.key_cache.user_macro_midis:
+        #        #print(f"Checking command: {command}, {macro}, return {macro.get(command, [])}, type {isinstance(macro.get(command, []), list)}")
+        #        if command in macro: return True
+                    
+        return True
+
+    def load_config(self):
+        """Load and validate configuration file"""
+        
+        self.key_index = 0
+        self.shift = False
+        self.config_errors = []
+        
+        # print(f"macros list: {self.key_cache.user_macro_midis}")
+        self.key_cache.user_macro_midis.clear()
+        self.key_cache.ramp_names.clear()
+        self.key_cache.ramps.clear()
+        self.key_cache.hires_names.clear()
+        self.key_cache.hires.clear()
+        self.key_cache.reset_banks()
+        
+        try:
+            lines = self.safe_file_read("/keymap.cfg")
+            if not lines:
+                self.config_error = True
+                print("Using default Config")
+                return False
+        except Exception as e:
+            print("Config file missing")
+            return False
+
+        # Load Layer: Base
+        for line_num, line in enumerate(lines, 1):
+            
+            try:
+                if line.startswith("bnk"):
+                    parsed = self.parse_bank_config_line(line)
+                    if parsed is None:
+                        continue
+
+                    # Keys that follow are loaded into the new bank, starting with its Base layer
+                    self.key_cache.add_bank(parsed['name'])
+                    self.key_index = 0
+                    self.shift = False
+
+                elif line.startswith("acc"):
+                    parsed = self.parse_accel_config_line(line)
+                    if parsed is None:
+                        continue
+
+                elif line.startswith("rmp"):
+                    parsed = self.parse_ramp_config_line(line)
+                    if parsed is None:
+                        continue
+
+                elif line.startswith("nrp"):
+                    parsed = self.parse_hires_config_line(line)
+                    if parsed is None:
+                        continue
+
+                elif self.parse_device_line(line):
+                    continue
+
+                elif "key" in line:
+                    parsed = self.parse_key_config_line(line)
+                    if parsed is None:
+                        # print(f"Skipping line: {line}")
+                        continue
+
+                    # Validate MIDI command
+                    if not self.validate_midi_string(parsed['type'], parsed['command']):
+                        raise ValueError("Invalid MIDI command: {}".format(parsed['command']))
+
+                    mapped_key_index = self.config.get_key(self.key_index)
+
+                    # Apply configuration
+                    if self.shift == False :
+
+                        # print(f"Base - Number: {line_num}, Line: {line}, Mapped Key Index: {mapped_key_index}")
+
+                        # Set MIDI string and color for base layer 
+                        midi_string = "{}:{}".format(parsed['type'], parsed['command'])
+                        self.key_cache.macropad_key_map[mapped_key_index] = midi_string
+
+                        # Set color
+                        color_code = self.key_cache.validate_color_string(parsed['color'])
+                        self.key_cache.macropad_color_map[mapped_key_index] = color_code
+
+                    elif self.shift == True:
+
+                        # print(f"Shift - Number: {line_num}, Line: {line}, Mapped Key Index: {mapped_key_index}")
+
+                        # Set MIDI string and color in shift layer
+                        midi_string = "{}:{}".format(parsed['type'], parsed['command'])
+                        self.key_cache.macropad_key_map_shift[mapped_key_index] = midi_string
+
+                        # Set color
+                        color_code = self.key_cache.validate_color_string(parsed['color'])
+                        self.key_cache.macropad_color_map_shift[mapped_key_index] = color_code
+
+                    # Read all 24 keys in the Base and Shift Layers. resetting the key index to start with shift layer
+                    self.key_index += 1
+                    if (self.key_index > 11) and (self.shift == False):
+                        self.key_index = 0
+                        self.shift = True
+
+                elif "mac" in line:                    
+                    parsed = self.parse_macro_config_line(line)
+                    if parsed is None:
+                        continue
+
+                    # Add a new macro entry in dictionary
+                    self.key_cache.user_macro_midis[parsed['macro_key']] = parsed['macro_list']
+                   
+                elif "var" in line:                    
+                    parsed = self.parse_var_config_line(line)
+                    if parsed is None:
+                        continue
+
+            except Exception as e:
+                print(f"Exception in line {line_num}: {line}")
+                self.config_errors.append("Line {}: {}".format(line_num, e))
+
+        if self.config_errors:
+            print("Configuration file parsing errors:")
+            for error in self.config_errors[:5]:  # Limit error display
+                print("  {}".format(error))
+            self.config_error = True
+            return False
+
+        # Rebuild cache with new configuration
+        self.key_cache._build_cache()
+        
+        print("Config file processed. Banks: {}".format(len(self.key_cache.banks)))
+        return True
+
+# --- State Manager ---
+class StateManager:
+    def __init__(self, config):
+        self.config = config
+        
+        self.encoder_mode = EncoderMode.ROTOR
+        self.encoder_position = 0
+        self.encoder_sign = False
+        self.rotor_flag = 0  # -1=slow, 0=off, 1=fast
+        
+        # Controller Shift Mode based on Variation Key
+        self.shift_mode = ShiftKeyMode.OFF
+
+        # Timing trackers
+        self.tempo_start_time = 0
+        self.volume_start_time = 0
+        self.value_start_time = 0
+        self.bank_start_time = 0
+        self.song_start_time = 0
+        self.hires_start_time = 0
+        self.version_start_time = 0
+        self.led_start_time = 0
+
+        # Preset version display to end after 15s
+        self.version_start_time = time.time()
+
+        # Slider CC values of the EVM mixer on the MIDI out channel by CC number, 0xFF unknown
+        self.slider_values = bytearray(b'\xff' * 128)
+
+        # Last encoder detent time in supervisor.ticks_ms(), used for acceleration
+        self.encoder_ticks = supervisor.ticks_ms()
+
+        # LED state
+        self.lit_keys = [False] * 12
+
+        # Last key or encoder activity, garbage is collected once idle after it
+        self.activity_ticks = supervisor.ticks_ms()
+        self.gc_pending = True
+
+        # The state is saved to NVM once idle after a change
+        self.save_pending = False
+
+    def mark_activity(self):
+        """Remember key or encoder activity, a garbage collection and a state save are due once idle"""
+
+        self.activity_ticks = supervisor.ticks_ms()
+        self.gc_pending = True
+        self.save_pending = True
+
+    def get_layer(self):
+        """Key and quad encoder layer for the current shift mode: 0 Base, 1 Shift"""
+
+        if (self.shift_mode == ShiftKeyMode.ACTIVE_SHIFT) or (self.shift_mode == ShiftKeyMode.ACTIVE_LOCK):
+            return 1
+        return 0
+
+    def update_encoder_mode(self, new_mode):
+        """Update encoder mode with timed reset"""
+        
+        self.encoder_mode = new_mode
+        current_time = time.time()
+
+        if new_mode == EncoderMode.TEMPO:
+            self.tempo_start_time = current_time
+        elif new_mode == EncoderMode.VOLUME:
+            self.volume_start_time = current_time
+        elif new_mode == EncoderMode.VALUE:
+            self.value_start_time = current_time
+        elif new_mode == EncoderMode.BANK:
+            self.bank_start_time = current_time
+        elif new_mode == EncoderMode.SONG:
+            self.song_start_time = current_time
+        elif new_mode == EncoderMode.HIRES:
+            self.hires_start_time = current_time
+
+    def check_timeouts(self):
+        """Check and handle encoder mode timeouts"""
+        current_time = time.time()
+
+        # Revert tempo to rotor after timeout
+        if (self.encoder_mode == EncoderMode.TEMPO and
+            self.tempo_start_time != 0 and
+            current_time - self.tempo_start_time > self.config.tempo_timer):
+            self.encoder_mode = EncoderMode.ROTOR
+            return "timeout_tempo"
+
+        # Revert volume to rotor after timeout
+        if (self.encoder_mode == EncoderMode.VOLUME and
+            self.volume_start_time != 0 and
+            current_time - self.volume_start_time > self.config.volume_timer):
+            self.encoder_mode = EncoderMode.ROTOR
+            return "timeout_volume"
+
+        # Revert value to rotor after timeout
+        if (self.encoder_mode == EncoderMode.VALUE and
+            self.value_start_time != 0 and
+            current_time - self.value_start_time > self.config.value_timer):
+            self.encoder_mode = EncoderMode.ROTOR
+            return "timeout_value"
+
+        # Revert bank select to rotor after timeout
+        if (self.encoder_mode == EncoderMode.BANK and
+            self.bank_start_time != 0 and
+            current_time - self.bank_start_time > self.config.bank_timer):
+            self.encoder_mode = EncoderMode.ROTOR
+            return "timeout_bank"
+
+        # Revert song select to rotor after timeout
+        if (self.encoder_mode == EncoderMode.SONG and
+            self.song_start_time != 0 and
+            current_time - self.song_start_time > self.config.song_timer):
+            self.encoder_mode = EncoderMode.ROTOR
+            return "timeout_song"
+
+        # Revert high resolution parameter to rotor after timeout
+        if (self.encoder_mode == EncoderMode.HIRES and
+            self.hires_start_time != 0 and
+            current_time - self.hires_start_time > self.config.hires_timer):
+            self.encoder_mode = EncoderMode.ROTOR
+            return "timeout_hires"
+
+        # Clear version value after timeout
+        if (self.version_start_time != 0 and
+            current_time - self.version_start_time > self.config.version_timer):
+            self.version_start_time = 0
+            return "timeout_version"
+
+        # Check LED timeout
+        if (self.led_start_time != 0 and
+            current_time - self.led_start_time > self.config.key_bright_timer):
+            self.led_start_time = 0
+            return "timeout_led"
+
+        return None
+
+# --- Main Controller Class ---
+class EVMController:
+    """The controller main loop and key, encoder and MIDI handling shared by the EVM controllers.
+    PROFILE is the DeviceProfile of the controller, set by the subclass in each code.py"""
+
+    PROFILE = None
+
+    def __init__(self, boot_marks):
+        profile = self.PROFILE
+        print("Initializing {} Controller...".format(profile.name))
+
+        # Initialize components
+        self.config = profile.config()
+        self.boot_profile = BootProfile(boot_marks, self.config.boot_profile_boots, self.config.boot_profile_nvm)
+        self.state = profile.state(self.config)
+        # Free memory after the last 16 idle collections, and the lowest seen
+        self.mem_history = [0] * 16
+        self.mem_index = 0
+        self.mem_low = gc.mem_free()
+
+        self.stage_errors = StageErrors(LoopStage.NAMES, self.config.stage_error_budget, self.config.stage_error_window, self.config.stage_backoff)
+
+        # Initialize key cache and config
+        gc.collect()
+        mem_boot = gc.mem_free()
+        self.key_cache = profile.key_cache(self.config)
+        self.config_handler = profile.config_handler(self.key_cache, self.config)
+        self.boot_profile.mark("Key cache")
+
+        # Initialize MIDI
+        self._init_midi(self.config, self.key_cache)
+        self.boot_profile.mark("MIDI")
+
+        # Initialize MacroPad
+        self._init_macropad()
+        self.boot_profile.mark("MacroPad")
+        
+        # Load configuration
+        config_loaded = self.config_handler.load_config()
+
+        # The Pedal and Tab catalogs are only needed to compile the config
+        gc.collect()
+        mem_config = gc.mem_free()
+        self.key_cache.release_catalogs()
+        print("Heap free: {} at boot, {} after config, {} after releasing catalogs".format(mem_boot, mem_config, gc.mem_free()))
+        self.boot_profile.mark("Config")
+
+        # The EncHiRes parameter and its display prefix, looked up once rather than at every detent
+        self.hires_index = self.key_cache.find_hires(self.config.encoder_hires) if self.config.encoder_hires else -1
+        self.hires_label = "{}: ".format(self.config.encoder_hires)
+
+        # Initialize display, its layout is created once the keys are running
+        self.display = DisplayManager(self.macropad, self.config)
+
+        if not config_loaded:
+            self.display.update_text(9, "Config File Error!")
+
+        # Device hardware beyond the MacroPad, set up before its state is restored
+        self._init_device()
+
+        # Restore the state saved in NVM at the last power cycle
+        volumes, toggles = self._state_volumes()
+        self.state_store = StateStore(getattr(microcontroller, "nvm", None), self.config.state_nvm, len(volumes[0]) if volumes else 0)
+        self._restore_state()
+
+        # Initialize pixels
+        self._preset_pixels()
+        self.boot_profile.mark("Pixels")
+
+        # Start up steps deferred until the keys are running, run one per main loop pass
+        self.setlist = Setlist(self.config.setlist_file, self.config.setlist_index_max)
+        self.macro_library = MacroLibrary(self.config.macro_file, self.config.macro_cache_size, self._compile_library_macro)
+        self.midi_handler.macro_library = self.macro_library
+
+        # Ramps start from the slider values last sent or reported by the EVM
+        self.ramps = RampEngine(self._send_ramp_value, self._ramp_value, supervisor.ticks_ms,
+                                self.config.max_ramps, self.config.ramp_interval, self.config.ramp_bpm)
+        self.midi_handler.ramps = self.ramps
+
+        # Inbound MIDI clock for quantized keys, and the ready to send messages of the keys waiting for the next boundary
+        self.clock = MIDIClock(self.config.beats_per_bar)
+        self.midi_input = MIDIInput(usb_midi.ports[0], self.clock, self._midi_listener())
+        self.quantized = [None] * 12
+        self.quantize_pending = 0
+
+        # Tap tempo, and the EVM tempo set by the current run of taps or the tempo detents (0 none)
+        self.tap_tempo = TapTempo(self.config.tap_window, self.config.tap_timeout)
+        self.tap_target = 0
+
+        # Tempo mode detents not yet sent and when the last one arrived
+        self.tempo_steps = 0
+        self.tempo_ticks = 0
+        self.startup_steps = self._startup_steps()
+
+        print("Pad Controller Ready")
+
+    def _init_midi(self, config, key_cache):
+        """Initialize MIDI connections"""
+
+        self.config = config
+        
+        print("Preparing Macropad Midi")
+
+        profile = self.PROFILE
+        out_channel = self.config.midi_out_channel if profile.midi_out_channel is None else profile.midi_out_channel
+        midi = adafruit_midi.MIDI(
+            midi_in=usb_midi.ports[0], in_channel=profile.midi_in_channel,
+            midi_out=usb_midi.ports[1], out_channel=out_channel
+        )
+
+        self.midi_handler = profile.midi_handler(midi, usb_midi.ports[1], config, key_cache)
+
+    def _init_macropad(self):
+        """Initialize MacroPad hardware"""
+        
+        print("Preparing MacroPad Display")
+        self.macropad = MacroPad(rotation=0)
+        self.state.encoder_position = self.macropad.encoder
+
+        # Key events are read into one preallocated event
+        self.key_event = keypad.Event()
+
+    def _init_device(self):
+        """Set up the device hardware beyond the MacroPad. The EVM controller has none"""
+
+        pass
+
+    def _startup_steps(self):
+        """Start up steps deferred until the keys are running, as (boot profile stage, step)"""
+
+        return [("Display", self.display.start), ("Setlist", self._load_setlist), ("Macros", self._load_macro_library)]
+
+    def _midi_listener(self):
+        """Callback for the Control Changes received from the EVM, None when they are not needed"""
+
+        return None
+
+    def _state_volumes(self):
+        """Per layer quad encoder volumes and toggles kept with the state in NVM, (None, None) without quad encoders"""
+
+        return None, None
+
+    def _preset_pixels(self):
+        """Set pixel colors based on configuration"""
+        
+        colors = self.config.colors
+        for pixel in range(12):
+            if self.config_handler.config_error:
+                self.macropad.pixels[pixel] = colors.RED
+            elif pixel == self.config.get_key(self.config.key_variation):  # Variation key
+                if self.state.shift_mode == ShiftKeyMode.ACTIVE_LOCK:
+                    self.macropad.pixels[pixel] = colors.OFFWHITE                    
+                elif self.state.encoder_mode == EncoderMode.TEMPO:
+                    self.macropad.pixels[pixel] = colors.YELLOW
+                elif self.state.encoder_mode == EncoderMode.VOLUME:
+                    self.macropad.pixels[pixel] = colors.PURPLE
+                elif self.state.encoder_mode == EncoderMode.VALUE:
+                    self.macropad.pixels[pixel] = colors.WHITE
+                elif self.state.encoder_mode == EncoderMode.BANK:
+                    self.macropad.pixels[pixel] = colors.TEAL
+                elif self.state.encoder_mode == EncoderMode.SONG:
+                    self.macropad.pixels[pixel] = colors.ORANGE
+                elif self.state.encoder_mode == EncoderMode.HIRES:
+                    self.macropad.pixels[pixel] = colors.GREEN
+                else:
+                    self.macropad.pixels[pixel] = self.key_cache.led_frame[pixel]
+            else:
+                if (self.state.shift_mode == ShiftKeyMode.ACTIVE_SHIFT) or (self.state.shift_mode == ShiftKeyMode.ACTIVE_LOCK):
+                    self.macropad.pixels[pixel] = self.key_cache.led_frame_shift[pixel]
+                else:
+                    self.macropad.pixels[pixel] = self.key_cache.led_frame[pixel]
+
+            self.state.lit_keys[pixel] = False
+
+    def _handle_key_press(self, key_number):
+        """Handle key press events"""
+        
+        try:
+            key_id = self.config.get_key(key_number)
+            lookup_key, midi_key, midi_value = self.key_cache.get_key_midi(key_id, self.state.shift_mode)
+
+            # print(f"get_key: {lookup_key}, {midi_key}, {midi_value}")
+
+            # Quantized keys wait for the next beat or bar, a second press cancels
+            if self._quantize_key(key_number, lookup_key, midi_key, midi_value):
+                return midi_key
+
+            # Send MIDI command or lookup and send user macro MIDI commands
+            if lookup_key == MIDIType.PEDAL:
+                self.midi_handler.send_pedal_sysex(midi_value)
+                
+            elif lookup_key == MIDIType.TAB:
+                self.midi_handler.send_tab_sysex(midi_value)
+                
+            elif lookup_key == MIDIType.MACRO:
+                self.midi_handler.send_macro_sysex(midi_key)
+
+            elif lookup_key == MIDIType.BANK:
+                # Bank keys only switch lookup tables and LEDs, no MIDI is sent
+                self._select_key_bank(midi_key)
+                return midi_key
+
+            elif lookup_key == MIDIType.RAMP:
+                if midi_value < 0:
+                    print("Ramp not found: {}".format(midi_key))
+                    return midi_key
+                self.ramps.start(*self.key_cache.ramps[midi_value])
+                
+            else:
+                return midi_key
+
+            # Update display
+            self.display.update_value(3, "BUTTON: ", midi_key)
+
+            # Handle special cases: Default encoder to tempo, 
+            # and clearing config read and red LED errors
+            if midi_key == "Start/Stop":
+                self.state.update_encoder_mode(EncoderMode.TEMPO)
+                self.display.update_text(6, "KNOB MODE: *Tempo")
+                
+                self.config_handler.config_error = False
+
+            # Update LEDs
+            self._preset_pixels()
+            self.state.lit_keys[self.config.get_key(key_number)] = True
+            self.state.led_start_time = time.time()
+
+            return midi_key
+            
+        except Exception as e:
+            print(f"Error: Sending key {key_number} ".format(e))
+            return False
+            
+    def _handle_encoder_change(self, config, delta):
+        """Handle encoder rotation of delta detents since the last loop, negative when turned left"""
+        self.config = config
+        
+        self.state.encoder_sign = not self.state.encoder_sign
+        current_time = time.time()
+        direction = 1 if delta > 0 else -1
+
+        # Average time per detent for the acceleration tables
+        ticks_now = supervisor.ticks_ms()
+        interval_ms = ticks_diff(ticks_now, self.state.encoder_ticks) // abs(delta)
+        self.state.encoder_ticks = ticks_now
+
+        if self.state.encoder_mode == EncoderMode.ROTOR:
+            self._process_rotor(direction)
+        elif self.state.encoder_mode == EncoderMode.TEMPO:
+            self._process_tempo(delta * self.key_cache.accel.get_multiplier(self.key_cache.accel_tempo, interval_ms))
+            self.state.tempo_start_time = current_time
+        elif self.state.encoder_mode == EncoderMode.VOLUME:
+            self._process_master_volume(self.config, delta * self.key_cache.accel.get_multiplier(self.key_cache.accel_volume, interval_ms))
+            self.state.volume_start_time = current_time
+        elif self.state.encoder_mode == EncoderMode.VALUE:
+            self._process_value(delta)
+            self.state.value_start_time = current_time
+        elif self.state.encoder_mode == EncoderMode.BANK:
+            self._process_bank(delta)
+            self.state.bank_start_time = current_time
+        elif self.state.encoder_mode == EncoderMode.SONG:
+            self._process_song(delta)
+            self.state.song_start_time = current_time
+        elif self.state.encoder_mode == EncoderMode.HIRES:
+            self._process_hires(delta * self.key_cache.accel.get_multiplier(self.key_cache.accel_volume, interval_ms))
+            self.state.hires_start_time = current_time
+
+    def _process_rotor(self, direction):
+        """Process rotor fast/slow commands"""
+        
+        if direction == 1 and self.state.rotor_flag != 1:
+            midi_value = self.key_cache.rotor_fast
+            self.display.update_text(3, "KNOB: Rotor Fast")
+            self.state.rotor_flag = 1
+            self.midi_handler.send_tab_sysex(midi_value)
+        elif direction == -1 and self.state.rotor_flag != -1:
+            midi_value = self.key_cache.rotor_slow
+            self.display.update_text(3, "KNOB: Rotor Slow")
+            self.state.rotor_flag = -1
+            self.midi_handler.send_tab_sysex(midi_value)
+
+    def _process_tempo(self, delta):
+        """Process tempo up/down commands, collected until the encoder rests and then sent as one burst"""
+
+        self.tempo_steps += delta
+        self.tempo_ticks = supervisor.ticks_ms()
+
+        # Show the expected tempo right away when the EVM tempo is known
+        current = self._known_tempo()
+        if current:
+            self.display.update_value(3, "TEMPO: ", current + self.tempo_steps, suffix=" BPM")
+        elif self.tempo_steps > 0:
+            self.display.update_value(3, "KNOB: Tempo Up +", self.tempo_steps)
+        else:
+            self.display.update_value(3, "KNOB: Tempo Down ", self.tempo_steps)
+
+        if not self.config.tempo_turn:
+            self._send_tempo()
+
+    def _send_tempo(self):
+        """Send the collected tempo detents, the known EVM tempo moves with them"""
+
+        steps = self.tempo_steps
+        self.tempo_steps = 0
+
+        current = self._known_tempo()
+        if current:
+            self.tap_target = current + steps
+        self._batch_tempo(steps)
+
+    def _known_tempo(self):
+        """The EVM tempo, 0 when unknown. Measured from its MIDI clock while it runs, as the EVM tempo may
+        have been changed on the EVM itself since the last taps or detents, else the tempo they set"""
+
+        if self.clock.running and self.clock.bpm:
+            return self.clock.bpm
+        return self.tap_target or self.clock.bpm
+
+    def _batch_tempo(self, steps):
+        """The EVM only steps tempo: send all Tempo Up/Down steps in one batched write"""
+
+        midi_value = self.key_cache.tempo_up if steps > 0 else self.key_cache.tempo_down
+        for _ in range(abs(steps)):
+            self.midi_handler.batch_pedal_sysex(midi_value)
+        self.midi_handler.send_batch()
+
+    def _process_tap(self):
+        """Process a tap tempo key: show the tapped tempo and move the EVM to it"""
+
+        bpm = self.tap_tempo.tap(time.monotonic_ns())
+
+        # A tap overrides any tempo detents not yet sent
+        self.tempo_steps = 0
+        if not bpm:
+            self.tap_target = 0
+            self.display.update_text(3, "TAP: -")
+            if not self.clock.bpm:
+                self.midi_handler.send_pedal_sysex(self.key_cache.tap)
+            return
+
+        self.display.update_value(3, "TAP: ", bpm, suffix=" BPM")
+        self.ramps.bpm = bpm
+
+        # Without a MIDI clock the EVM tempo is unknown, so the EVM taps along on its own TAP
+        current = self._known_tempo()
+        if not current:
+            self.midi_handler.send_pedal_sysex(self.key_cache.tap)
+            return
+
+        self._batch_tempo(bpm - current)
+        self.tap_target = bpm
+
+    def _process_master_volume(self, config, delta):
+        """Process volume up/down commands"""
+        self.config = config
+        
+        if delta > 0:
+            self.display.update_text(3, "KNOB: Volume Up+" if self.state.encoder_sign else "KNOB: Volume Up")
+        else:
+            self.display.update_text(3, "KNOB: Volume Down+" if self.state.encoder_sign else "KNOB: Volume Down")
+
+        self.midi_handler.send_master_volume(self.config, delta)
+
+    def _process_value(self, delta):
+        """Process value (DIAL) up/down commands, one Dial Up/Down per detent"""
+        
+        if delta > 0:
+            midi_value = self.key_cache.dial_up
+            self.display.update_text(3, "KNOB: Dial Up+" if self.state.encoder_sign else "KNOB: Dial Up")
+        else:
+            midi_value = self.key_cache.dial_down
+            self.display.update_text(3, "KNOB: Dial Down-" if self.state.encoder_sign else "KNOB: Dial Down")
+
+        for _ in range(abs(delta)):
+            self.midi_handler.send_tab_sysex(midi_value)
+
+    def _process_bank(self, delta):
+        """Process keymap bank next/previous"""
+
+        self._select_bank(self.key_cache.bank_index + delta)
+
+    def _process_hires(self, delta):
+        """Process the EncHiRes parameter, changed by HiStep per detent, or by one for a Ketron preset NRPN,
+        and sent once per loop"""
+
+        if self.hires_index < 0:
+            return
+
+        parameter, start, maximum = self.key_cache.hires[self.hires_index]
+        step = 1 if parameter & MIDIHandler.HIRES_MSB else self.config.hires_step
+        value = self.midi_handler.step_hires(parameter, self.config.midi_out_channel, delta * step, start, maximum)
+        self.display.update_value(3, self.hires_label, value)
+
+    def _process_song(self, delta):
+        """Process setlist song next/previous, one song per encoder change"""
+
+        self._select_song(1 if delta > 0 else -1)
+
+    def _select_key_bank(self, midi_key):
+        """Process bank key: BANK_UP, BANK_DOWN, SONG_NEXT, SONG_PREV or a bank name"""
+
+        if midi_key == "TAP_TEMPO":
+            self._process_tap()
+        elif midi_key == "SONG_NEXT":
+            self._select_song(1)
+        elif midi_key == "SONG_PREV":
+            self._select_song(-1)
+        elif midi_key == "BANK_UP":
+            self._select_bank(self.key_cache.bank_index + 1)
+        elif midi_key == "BANK_DOWN":
+            self._select_bank(self.key_cache.bank_index - 1)
+        else:
+            bank_index = self.key_cache.find_bank(midi_key)
+            if bank_index < 0:
+                print("Bank not found: {}".format(midi_key))
+                return
+            self._select_bank(bank_index)
+
+    def _load_setlist(self):
+        """Index the setlist song file, if there is one"""
+
+        if self.setlist.load():
+            print("Setlist: {} songs, {} offsets indexed".format(self.setlist.count, len(self.setlist.offsets)))
+
+    def _load_macro_library(self):
+        """Index the macro library file, if there is one"""
+
+        if self.macro_library.load():
+            print("Macro library: {} macros".format(len(self.macro_library)))
+
+    def _compile_library_macro(self, line):
+        """Compile a library macro line into its messages. The command catalogs are unpacked only for the compile"""
+
+        parsed = self.config_handler.parse_macro_config_line(line)
+        if parsed is None:
+            return None
+
+        catalogs_open = self.key_cache.pedal_midis is not None
+        self.key_cache.open_catalogs()
+        try:
+            commands = self.key_cache.compile_macro(parsed['macro_list'])
+        finally:
+            if not catalogs_open:
+                # Collected with the next idle garbage collection, not while a key is being served
+                self.key_cache.release_catalogs(collect=False)
+
+        return self.midi_handler.pack_commands(commands)
+
+    def _select_song(self, delta):
+        """Step through the setlist and send the song set up: its bank, slider CCs and macros in one MIDI write"""
+
+        if not self.setlist.count:
+            self.display.update_text(3, "SONG: No Setlist")
+            return
+
+        song = self.setlist.step(delta)
+        if song is None:
+            self.display.update_text(3, "SONG: Read Error")
+            return
+        name, bank, sliders, macros = song
+
+        if bank:
+            bank_index = self.key_cache.find_bank(bank)
+            if bank_index < 0:
+                print("Bank not found: {}".format(bank))
+            else:
+                self.key_cache.select_bank(bank_index)
+                self._preset_pixels()
+
+        channel = self.config.midi_out_channel
+        for cc, value in sliders:
+            self.midi_handler.batch_control_change(cc, value, channel)
+            self._follow_slider(cc, value)
+
+        for macro in macros:
+            self.midi_handler.batch_macro_sysex(macro)
+        self.midi_handler.send_batch()
+
+        self.display.update_text(3, "SONG {}: {}".format(self.setlist.position + 1, name))
+
+    def _follow_slider(self, cc, value):
+        """The EVM slider of a CC was set by the controller"""
+
+        self.state.slider_values[cc] = value
+
+    def _ramp_value(self, cc):
+        """Current value of a ramped CC, -1 if unknown"""
+
+        if cc == 11:
+            return self.midi_handler.cur_volume
+        value = self.state.slider_values[cc]
+        return -1 if value == 0xFF else value
+
+    def _send_ramp_value(self, cc, value):
+        """Send one step of a volume ramp"""
+
+        self.midi_handler.send_control_change(cc, value, self.config.midi_out_channel)
+        if cc == 11:
+            self.midi_handler.cur_volume = value
+        else:
+            self._follow_slider(cc, value)
+
+    def _select_bank(self, bank_index):
+        """Activate a prebuilt bank and refresh the LEDs"""
+
+        bank_name = self.key_cache.select_bank(bank_index)
+        self.display.update_value(3, "BANK: ", bank_name)
+        self._preset_pixels()
+
+    def _handle_encoder_switch(self):
+        """Handle encoder switch press. Modes 0:Rotor, 1:Tempo, 2:Volume, 3:Dial (disabled), 4:Bank, 5:Song, 6:HiRes"""
+        
+        self.state.encoder_mode = self.state.encoder_mode + 1
+        if self.state.encoder_mode == EncoderMode.VALUE:
+            self.state.encoder_mode = EncoderMode.BANK
+        # Bank select is only offered when keymap.cfg defines more than the Default bank
+        if self.state.encoder_mode == EncoderMode.BANK and len(self.key_cache.banks) < 2:
+            self.state.encoder_mode = EncoderMode.SONG
+        # Song select is only offered when a setlist is loaded
+        if self.state.encoder_mode == EncoderMode.SONG and not self.setlist.count:
+            self.state.encoder_mode = EncoderMode.HIRES
+        # High resolution parameter is only offered when EncHiRes names an nrp line
+        if self.state.encoder_mode == EncoderMode.HIRES and self.key_cache.find_hires(self.config.encoder_hires) < 0:
+            self.state.encoder_mode = EncoderMode.ROTOR
+        elif self.state.encoder_mode > EncoderMode.HIRES:
+            self.state.encoder_mode = EncoderMode.ROTOR
+
+        self._show_encoder_mode()
+        self._preset_pixels()
+
+    def _show_encoder_mode(self):
+        """Show the encoder mode and start its timeout"""
+
+        current_time = time.time()
+
+        if self.state.encoder_mode == EncoderMode.ROTOR:
+            self.display.update_text(3, "KNOB: -")
+            self.display.update_text(6, "KNOB MODE: Rotor")
+        elif self.state.encoder_mode == EncoderMode.TEMPO:
+            self.display.update_text(3, "KNOB: -")
+            self.display.update_text(6, "KNOB MODE: *Tempo")
+            self.state.tempo_start_time = current_time
+        elif self.state.encoder_mode == EncoderMode.VOLUME:
+            self.display.update_text(3, "KNOB: -")
+            self.display.update_text(6, "KNOB MODE: *Volume")
+            self.state.volume_start_time = current_time
+        elif self.state.encoder_mode == EncoderMode.VALUE:
+            self.display.update_text(3, "KNOB: -")
+            self.display.update_text(6, "KNOB MODE: *Dial")
+            self.state.value_start_time = current_time
+        elif self.state.encoder_mode == EncoderMode.BANK:
+            self.display.update_text(3, "BANK: {}".format(self.key_cache.bank_names[self.key_cache.bank_index]))
+            self.display.update_text(6, "KNOB MODE: *Bank")
+            self.state.bank_start_time = current_time
+        elif self.state.encoder_mode == EncoderMode.SONG:
+            self.display.update_text(3, "SONG: -" if self.setlist.position < 0 else "SONG: {}".format(self.setlist.position + 1))
+            self.display.update_text(6, "KNOB MODE: *Song")
+            self.state.song_start_time = current_time
+        elif self.state.encoder_mode == EncoderMode.HIRES:
+            self.display.update_text(3, "{}: -".format(self.config.encoder_hires))
+            self.display.update_text(6, "KNOB MODE: *HiRes")
+            self.state.hires_start_time = current_time
+
+    def _update_display(self):
+        """Update display based on timeouts"""
+        
+        timeout_type = self.state.check_timeouts()
+
+        if timeout_type == "timeout_tempo" or timeout_type == "timeout_volume" or timeout_type == "timeout_bank" or timeout_type == "timeout_song" or timeout_type == "timeout_hires":
+            self.state.save_pending = True
+            self.display.update_text(3, "KNOB: -")
+            self.display.update_text(6, "KNOB MODE: Rotor")
+            self._preset_pixels()
+        elif timeout_type == "timeout_version":
+            self.display.update_text(9, "")
+        elif timeout_type == "timeout_led":
+            self._preset_pixels()
+
+        self.display.refresh()
+
+    def _update_pixels(self):
+        """Update pixel colors for lit keys and keys waiting for the next beat or bar"""
+        
+        for pixel in range(12):
+            if self.state.lit_keys[pixel]:
+                self.macropad.pixels[self.config.get_key(pixel)] = Colors.WHITE
+            if self.quantize_pending and self.quantized[pixel] is not None:
+                self.macropad.pixels[pixel] = Colors.YELLOW
+
+    def _quantize_key(self, key_number, lookup_key, midi_key, midi_value):
+        """Hold a Pedal, Tab or Macro key until the next beat or bar while the MIDI clock runs. True if held or cancelled"""
+
+        if not self.config.quantize or not self.clock.running:
+            return False
+        if lookup_key != MIDIType.PEDAL and lookup_key != MIDIType.TAB and lookup_key != MIDIType.MACRO:
+            return False
+
+        pixel = self.config.get_key(key_number)
+        if self.quantized[pixel] is not None:
+            self.quantized[pixel] = None
+            self.quantize_pending -= 1
+            self.display.update_value(3, "CANCEL: ", midi_key)
+            self._preset_pixels()
+            return True
+
+        # Encode the messages now, so only one write is left for the boundary
+        if lookup_key == MIDIType.MACRO:
+            commands = self.key_cache.macro_cache.get(midi_key)
+            if commands is None:
+                buffer = self.macro_library.get(midi_key)
+            elif any(command[0] == MIDIType.RAMP for command in commands):
+                # Macros starting ramps are not quantized
+                return False
+            else:
+                buffer = self.midi_handler.pack_commands(commands)
+        else:
+            buffer = self.midi_handler.pack_commands(((lookup_key, midi_value),))
+        if not buffer:
+            return False
+
+        self.quantized[pixel] = buffer
+        self.quantize_pending += 1
+        self.display.update_value(3, "NEXT BAR: " if self.config.quantize == MIDIClock.BAR else "NEXT BEAT: ", midi_key)
+        return True
+
+    def _release_quantized(self):
+        """Send the held keys in one write and restore their LEDs"""
+
+        for pixel in range(12):
+            if self.quantized[pixel] is not None:
+                self.midi_handler.batch_packed(self.quantized[pixel])
+                self.quantized[pixel] = None
+        self.quantize_pending = 0
+        self.midi_handler.send_batch()
+        self._preset_pixels()
+
+    def _run_midi(self):
+        """Main loop stage: inbound MIDI, held keys are sent as soon as the clock reaches the next beat or bar"""
+
+        boundary = self.midi_input.read(supervisor.ticks_ms())
+        if boundary and self.clock.bpm:
+            # Ramps in beats follow the EVM tempo
+            self.ramps.bpm = self.clock.bpm
+
+        # Held keys are also sent when the EVM stops
+        if self.quantize_pending and (boundary >= self.config.quantize or not self.clock.running):
+            self._release_quantized()
+
+    def _run_encoder(self):
+        """Main loop stage: encoder rotation and switch"""
+
+        # Handle encoder rotation: all detents since the last loop in one change
+        encoder_delta = self.macropad.encoder - self.state.encoder_position
+        if encoder_delta:
+            self.state.mark_activity()
+            self._handle_encoder_change(self.config, encoder_delta)
+            self.state.encoder_position += encoder_delta
+
+        # Send the collected tempo detents once the encoder rests
+        if self.tempo_steps and ticks_diff(supervisor.ticks_ms(), self.tempo_ticks) >= self.config.tempo_turn:
+            self._send_tempo()
+
+        # Only the last value of each high resolution parameter changed in this loop is sent
+        self.midi_handler.send_hires()
+
+        # Handle encoder switch
+        self.macropad.encoder_switch_debounced.update()
+        if self.macropad.encoder_switch_debounced.pressed:
+            self.state.mark_activity()
+            self._handle_encoder_switch()
+
+    def _run_memory(self):
+        """Main loop stage: collect garbage once idle, so collections do not land on a key press, and track free memory"""
+
+        if not self.state.gc_pending or ticks_diff(supervisor.ticks_ms(), self.state.activity_ticks) < self.config.gc_idle:
+            return
+
+        gc.collect()
+        self.state.gc_pending = False
+
+        mem_free = gc.mem_free()
+        self.mem_history[self.mem_index] = mem_free
+        self.mem_index = (self.mem_index + 1) % len(self.mem_history)
+        if mem_free < self.mem_low:
+            self.mem_low = mem_free
+
+    def report_memory(self):
+        """Print free memory after the recent idle collections, oldest first, and the lowest seen"""
+
+        count = len(self.mem_history)
+        history = [self.mem_history[(self.mem_index + i) % count] for i in range(count)]
+        print("Memory free: {} low: {} history: {}".format(gc.mem_free(), self.mem_low, [mem for mem in history if mem]))
+
+    def _run_startup(self):
+        """Main loop stage: the next deferred start up step, then the boot profile once all steps ran"""
+
+        if not self.startup_steps:
+            return
+
+        name, step = self.startup_steps.pop(0)
+        try:
+            step()
+        finally:
+            self.boot_profile.mark(name)
+            if not self.startup_steps:
+                # Keep this boot in the NVM ring and print the stage times
+                self.boot_profile.save()
+                self.boot_profile.report()
+
+    def _restore_state(self):
+        """Restore the encoder mode, shift lock and keymap bank saved in NVM"""
+
+        store = self.state_store
+        if not self.config.state_save or not store.load():
+            return
+
+        if store.bank_index() < len(self.key_cache.banks):
+            self.key_cache.select_bank(store.bank_index())
+        if store.shift_lock():
+            self.state.shift_mode = ShiftKeyMode.ACTIVE_LOCK
+
+        mode = store.encoder_mode()
+        if mode > EncoderMode.BANK or (mode == EncoderMode.BANK and len(self.key_cache.banks) < 2):
+            mode = EncoderMode.ROTOR
+        self.state.encoder_mode = mode
+        self._show_encoder_mode()
+
+        volumes, toggles = self._state_volumes()
+        if volumes:
+            store.restore_volumes(volumes, toggles)
+
+        print("State restored from NVM")
+
+    def _run_state(self):
+        """Main loop stage: save the state to NVM once idle, written only when it changed"""
+
+        if not self.state.save_pending or ticks_diff(supervisor.ticks_ms(), self.state.activity_ticks) < self.config.state_quiet:
+            return
+        self.state.save_pending = False
+
+        if self.config.state_save:
+            volumes, toggles = self._state_volumes()
+            self.state_store.pack(self.state.encoder_mode, self.state.shift_mode == ShiftKeyMode.ACTIVE_LOCK, self.key_cache.bank_index,
+                                  volumes, toggles)
+            self.state_store.save()
+
+    def _run_serial(self):
+        """Main loop stage: serial console commands, 'e' prints the stage error counters, 'm' the free memory, 'b' the boot profile
+        and 'c' the macro library cache"""
+
+        while supervisor.runtime.serial_bytes_available:
+            command = sys.stdin.read(1)
+            if command == "e":
+                self.stage_errors.report()
+            elif command == "m":
+                self.report_memory()
+            elif command == "b":
+                self.boot_profile.report()
+            elif command == "c":
+                self.macro_library.report()
+
+    def _shift_changed(self):
+        """Refresh the LEDs after the shift layer was switched on or off"""
+
+        self._preset_pixels()
+
+    def _run_keys(self):
+        """Main loop stage: key events to MIDI. True when a key event was handled"""
+
+        # Handle key events
+        key_event = self.key_event if self.macropad.keys.events.get_into(self.key_event) else None
+        if key_event:
+            self.state.mark_activity()
+
+        # Pressed: Check for potential Shift Key operation. If Variation key pressed and held in, then
+        # shift key is pending and no MIDI "VARIATION" send until key release
+        if key_event and key_event.pressed:                    
+            self.last_key_pressed = key_event.key_number
+
+            if key_event.key_number == self.config.key_variation and self.config.shift_enable == True:
+                if self.state.shift_mode == ShiftKeyMode.ACTIVE_LOCK:
+                    # print("Shift mode: Off")
+                    self.state.shift_mode = ShiftKeyMode.OFF                        
+                    self.display.update_text(9, "")
+                    self._shift_changed()
+                else:
+                    self.state.shift_mode = ShiftKeyMode.PENDING
+                    # print("Shift mode: Pending")                        
+                    self.state.lit_keys[key_event.key_number] = True
+                    self.state.led_start_time = time.time()
+                    self.shift_start_time = time.time()
+            else:
+                # Other non VAR/Shift keys
+                if self.state.shift_mode == ShiftKeyMode.PENDING:
+                    self.state.shift_mode = ShiftKeyMode.ACTIVE_SHIFT                        
+                    self.display.update_text(9, "Layer: Shift")
+                    # print("Shift mode: Active Shift")
+                self._handle_key_press(key_event.key_number)        # Send any key MIDI message
+            self.key_start_time = time.time()                    
+            return True
+
+        # Released: If Variation key released and still in pending mode, send MIDI "VARIATION"
+        # Reset shift mode when in pending or active for Variation key release
+        if key_event and key_event.released:
+            if key_event.key_number == self.config.key_variation:
+                if (self.state.shift_mode == ShiftKeyMode.PENDING) and ((time.time() - self.shift_start_time) > self.config.shift_hold_timer):
+                    self.state.shift_mode = ShiftKeyMode.ACTIVE_LOCK
+                    self.display.update_text(9, "Layer: Shift Lock")
+                    self._shift_changed()
+                    # print("Shift mode: Active Lock")
+
+                elif (self.state.shift_mode == ShiftKeyMode.PENDING) or (self.state.shift_mode == ShiftKeyMode.ACTIVE_SHIFT):
+                    # Send VAR MIDI message, but only if no other key pressed during shift mode
+                    if self.last_key_pressed == self.config.key_variation:
+                        self._handle_key_press(key_event.key_number)                                    
+                    self.state.shift_mode = ShiftKeyMode.OFF                        
+                    self.display.update_text(9, "")
+                    self._shift_changed()
+                    # print("Shift mode: Off")
+
+            elif key_event.key_number == TUNE_KEY: 
+                if (time.time() - self.key_start_time) > self.config.tune_hold_timer:
+                    print("Starting test tune")
+                    self.display.update_text(9, "CHN #5: Test Tune")
+                    self.display.refresh()
+                    self.midi_handler.test_connectivity()
+                    self.display.update_text(9, "")        
+            return True
+
+        return False
+
+    def _loop_stages(self):
+        """Main loop stages after the keys, as (LoopStage, stage) in the order they run"""
+
+        return (
+            (LoopStage.MIDI, self._run_midi),
+            (LoopStage.STARTUP, self._run_startup),
+            (LoopStage.ENCODER, self._run_encoder),
+            (LoopStage.RAMPS, self.ramps.update),
+            (LoopStage.DISPLAY, self._update_display),
+            (LoopStage.PIXELS, self._update_pixels),
+            (LoopStage.MEMORY, self._run_memory),
+            (LoopStage.SERIAL, self._run_serial),
+            (LoopStage.STATE, self._run_state)
+        )
+
+    def run(self):
+        """Main controller loop"""
+        
+        self.key_start_time = 0
+        self.shift_start_time  = 0
+        self.last_key_pressed = self.config.key_variation
+
+        # Stages after the keys, each with its own error handling so a failure only backs off that stage
+        stages = self._loop_stages()
+        stage_errors = self.stage_errors
+
+        # From here key presses are sent, the time to the first MIDI message after power on
+        self.boot_profile.mark("Keys ready")
+
+        while True:
+            ticks_now = supervisor.ticks_ms()
+
+            # Keys first and never backed off or delayed by failures in the other stages
+            try:
+                if self._run_keys():
+                    continue
+            except Exception as e:
+                stage_errors.record(LoopStage.KEYS, e, ticks_now)
+
+            for stage, run_stage in stages:
+                if stage_errors.is_enabled(stage, ticks_now):
+                    try:
+                        run_stage()
+                    except Exception as e:
+                        stage_errors.record(stage, e, ticks_now)
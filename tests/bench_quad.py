@@ -0,0 +1,131 @@
+"""Quad encoder loop stage benchmark with 1, 2 and 4 chained boards on the host with the tests/stubs stand-ins.
+
+Runs the evmplus _run_quad() loop stage while every encoder is turned one detent per pass, and reports the
+median time per pass, the I2C transactions of each pass (the encoder position reads and the bulk switch
+GPIO read) and how many passes apart each board is read. The stand-in boards answer at once, so the time
+is the Python work of a pass only. On the board each transaction adds its I2C bus time, which is why the
+number of transactions per pass is the figure to compare.
+
+    python tests/bench_quad.py [passes]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import SOURCE_DIR, Drive, load_profile  # noqa: E402
+import board  # noqa: E402
+import evmcore  # noqa: E402
+from adafruit_seesaw import rotaryio  # noqa: E402
+from adafruit_seesaw.seesaw import Seesaw  # noqa: E402
+
+BOARD_COUNTS = (1, 2, 4)
+
+
+class Counter:
+    """Count the stand-in I2C reads, by board address"""
+
+    def __init__(self):
+        self.reads = {}
+        self.read_bulk = Seesaw.digital_read_bulk
+        self.position = rotaryio.IncrementalEncoder.position
+
+    def install(self):
+        counter = self
+
+        def digital_read_bulk(seesaw, mask):
+            counter.count(seesaw.addr)
+            return counter.read_bulk(seesaw, mask)
+
+        def position(encoder):
+            counter.count(encoder.seesaw.addr)
+            return counter.position.fget(encoder)
+
+        Seesaw.digital_read_bulk = digital_read_bulk
+        rotaryio.IncrementalEncoder.position = property(position)
+
+    def uninstall(self):
+        Seesaw.digital_read_bulk = self.read_bulk
+        rotaryio.IncrementalEncoder.position = self.position
+
+    def count(self, address):
+        self.reads[address] = self.reads.get(address, 0) + 1
+
+
+def start(boards, drive):
+    """Start the evmplus controller with boards chained from 0x49"""
+
+    board._I2C.addresses = [0x49 + i for i in range(boards)]
+    Seesaw.boards.clear()
+
+    module = load_profile("evmplus")
+    module.open = drive.open
+    controller = module.EVMController(module.boot_marks)
+    while controller.startup_steps:
+        controller._run_startup()
+    return controller
+
+
+def bench(boards, passes):
+    with tempfile.TemporaryDirectory() as root:
+        drive = Drive(root)
+        shutil.copy(os.path.join(SOURCE_DIR, "evmplus", "keymap.cfg"), drive.path("/keymap.cfg"))
+        evmcore.open = drive.open
+
+        # Quiet the controller's prints
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        counter = Counter()
+        addresses = board._I2C.addresses
+        try:
+            controller = start(boards, drive)
+            quad_boards = list(Seesaw.boards.values())
+
+            times = []
+            reads_by_pass = []
+            last_read = {}
+            read_gaps = []
+            counter.install()
+            for n in range(passes):
+                for quad_board in quad_boards:
+                    quad_board.positions = [position + 1 for position in quad_board.positions]
+
+                counter.reads.clear()
+                start_time = time.perf_counter()
+                controller._run_quad()
+                times.append(time.perf_counter() - start_time)
+
+                reads_by_pass.append(sum(counter.reads.values()))
+                for address in counter.reads:
+                    if address in last_read:
+                        read_gaps.append(n - last_read[address])
+                    last_read[address] = n
+        finally:
+            counter.uninstall()
+            board._I2C.addresses = addresses
+            Seesaw.boards.clear()
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    times.sort()
+    return (len(quad_boards), times[len(times) // 2], max(reads_by_pass),
+            min(read_gaps), max(read_gaps))
+
+
+def main():
+    passes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print("Quad loop stage on the host, median of {} passes".format(passes))
+    print("{:<7} {:>10} {:>15} {:>17}".format("Boards", "Pass us", "I2C reads/pass", "Passes per board"))
+    for boards in BOARD_COUNTS:
+        attached, pass_s, reads, gap_min, gap_max = bench(boards, passes)
+        gaps = str(gap_min) if gap_min == gap_max else "{}-{}".format(gap_min, gap_max)
+        print("{:<7} {:>10.1f} {:>15} {:>17}".format(attached, pass_s * 1000000, reads, gaps))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Setlist benchmark with a 5,000 song setlist.cfg on the host, for several index sizes.
+
+Times indexing the file once on load and selecting songs through the stride index, and reports the RAM
+held by the index. Selecting a song reads at most stride - 1 songs past the indexed offset, so the worst
+select time grows with the stride while the index stays within index_max offsets. The host file reads
+are far faster than the board's flash, so compare the strides more than the select times.
+
+    python tests/bench_setlist.py [songs]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import Drive  # noqa: E402
+import evmcore  # noqa: E402
+from test_setlist import write_setlist  # noqa: E402
+
+INDEX_SIZES = (64, 256, 1024)
+
+
+def bench(drive, songs, index_max):
+    setlist = evmcore.Setlist("/setlist.cfg", index_max)
+
+    loads = []
+    for _ in range(5):
+        start_time = time.perf_counter()
+        setlist.load()
+        loads.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    setlist.load()
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    selects = []
+    for position in range(0, songs, 7):
+        start_time = time.perf_counter()
+        song = setlist.select(position)
+        selects.append(time.perf_counter() - start_time)
+        assert song[0] == "Song {}".format(position)
+
+    loads.sort()
+    selects.sort()
+    return (setlist.count, setlist.stride, len(setlist.offsets), index_bytes, loads[len(loads) // 2],
+            selects[len(selects) // 2], selects[-1])
+
+
+def main():
+    songs = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    with tempfile.TemporaryDirectory() as root:
+        drive = Drive(root)
+        evmcore.open = drive.open
+        write_setlist(drive, songs)
+        size = os.path.getsize(drive.path("/setlist.cfg"))
+
+        print("Setlist of {} songs, {} bytes, on the host".format(songs, size))
+        print("{:>9} {:>6} {:>8} {:>12} {:>9} {:>14} {:>13}".format(
+            "IndexMax", "Stride", "Offsets", "Index bytes", "Load ms", "Select med ms", "Select max ms"))
+        for index_max in INDEX_SIZES:
+            count, stride, offsets, index_bytes, load_s, select_s, select_max_s = bench(drive, songs, index_max)
+            print("{:>9} {:>6} {:>8} {:>12} {:>9.2f} {:>14.3f} {:>13.3f}".format(
+                index_max, stride, offsets, index_bytes, load_s * 1000, select_s * 1000, select_max_s * 1000))
+
+
+if __name__ == "__main__":
+    main()
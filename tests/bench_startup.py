@@ -0,0 +1,103 @@
+"""Startup benchmark of each controller profile on the host with the tests/stubs stand-ins.
+
+Times compiling and running code.py, as the board does at every boot, building the controller with its
+keymap.cfg and running the deferred start up steps, and the Python heap allocated by them. The shared
+core is imported once, on the board it is loaded from lib/evmcore.mpy bytecode. The host numbers only
+compare profiles and changes, the boot profile printed by the controller on the board has the real
+stage times.
+
+    python tests/bench_startup.py [runs]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import SOURCE_DIR, Drive  # noqa: E402
+import evmcore  # noqa: E402
+
+PROFILES = ("evm", "evmplus", "generic")
+
+
+def load(profile, drive):
+    """Compile and run a profile's code.py as a module, without its main execution"""
+
+    path = os.path.join(SOURCE_DIR, profile, "code.py")
+    with open(path) as f:
+        code = compile(f.read(), path, "exec")
+
+    module = types.ModuleType("code_" + profile)
+    module.__file__ = path
+    module.open = drive.open
+    exec(code, module.__dict__)
+    return module
+
+
+def start(profile, drive):
+    """Load a profile and build its controller, returns the seconds for the import and for the init"""
+
+    start_time = time.perf_counter()
+    module = load(profile, drive)
+    import_time = time.perf_counter()
+
+    if profile == "generic":
+        module.GenosController()
+    else:
+        controller = module.EVMController(module.boot_marks)
+        while controller.startup_steps:
+            controller._run_startup()
+
+    return import_time - start_time, time.perf_counter() - import_time
+
+
+def bench(profile, runs):
+    with tempfile.TemporaryDirectory() as root:
+        drive = Drive(root)
+        keymap = os.path.join(SOURCE_DIR, profile, "keymap.cfg")
+        if os.path.exists(keymap):
+            shutil.copy(keymap, drive.path("/keymap.cfg"))
+        evmcore.open = drive.open
+
+        # Quiet the controller's prints, the first run also warms up the host caches
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        try:
+            start(profile, drive)
+            imports = []
+            inits = []
+            for _ in range(runs):
+                import_s, init_s = start(profile, drive)
+                imports.append(import_s)
+                inits.append(init_s)
+
+            tracemalloc.start()
+            start(profile, drive)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    imports.sort()
+    inits.sort()
+    return imports[len(imports) // 2], inits[len(inits) // 2], current, peak
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    print("Startup on the host, median of {} runs".format(runs))
+    print("{:<9} {:>10} {:>10} {:>12} {:>12}".format("Profile", "Import ms", "Init ms", "Heap bytes", "Peak bytes"))
+    for profile in PROFILES:
+        import_s, init_s, current, peak = bench(profile, runs)
+        print("{:<9} {:>10.2f} {:>10.2f} {:>12} {:>12}".format(profile, import_s * 1000, init_s * 1000, current, peak))
+
+
+if __name__ == "__main__":
+    main()
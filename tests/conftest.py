@@ -0,0 +1,97 @@
+"""Host tests for the MacroPad controllers.
+
+The CircuitPython modules (board, usb_midi, supervisor, seesaw...) are replaced by the stand-ins
+in tests/stubs, and the profile code.py files are loaded from source/ with the files they read
+from the CIRCUITPY drive served from a temporary directory.
+"""
+
+import builtins
+import gc
+import importlib.util
+import os
+import shutil
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(os.path.dirname(TESTS_DIR), "source")
+
+sys.path[:0] = [os.path.join(TESTS_DIR, "stubs"), os.path.join(SOURCE_DIR, "lib")]
+
+# CircuitPython's gc reports heap use, CPython's does not
+if not hasattr(gc, "mem_free"):
+    gc.mem_free = lambda: 200000
+if not hasattr(gc, "mem_alloc"):
+    gc.mem_alloc = lambda: 0
+
+import evmcore  # noqa: E402
+import microcontroller  # noqa: E402
+import supervisor  # noqa: E402
+import usb_midi  # noqa: E402
+from adafruit_seesaw.seesaw import Seesaw  # noqa: E402
+
+
+def load_profile(profile):
+    """Import source/<profile>/code.py as a fresh module"""
+
+    path = os.path.join(SOURCE_DIR, profile, "code.py")
+    spec = importlib.util.spec_from_file_location("code_" + profile, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Drive:
+    """The CIRCUITPY drive: absolute paths opened by the controller are served from a directory"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, filename):
+        return os.path.join(self.root, filename.lstrip("/"))
+
+    def write(self, filename, text):
+        with open(self.path(filename), "w") as f:
+            f.write(text)
+
+    def open(self, filename, *args, **kwargs):
+        if isinstance(filename, str) and filename.startswith("/"):
+            filename = self.path(filename)
+        return builtins.open(filename, *args, **kwargs)
+
+
+@pytest.fixture
+def drive(tmp_path, monkeypatch):
+    """Empty CIRCUITPY drive, with the stand-in ports, clock and NVM reset"""
+
+    drive = Drive(str(tmp_path))
+    monkeypatch.setattr(evmcore, "open", drive.open, raising=False)
+    for port in usb_midi.ports:
+        port.written.clear()
+        port.incoming.clear()
+    supervisor._now[0] = 0
+    microcontroller.nvm[:] = bytes(len(microcontroller.nvm))
+    Seesaw.boards.clear()
+    return drive
+
+
+@pytest.fixture
+def start_controller(drive, monkeypatch):
+    """Return a function that loads a profile with its keymap.cfg on the drive and runs its startup"""
+
+    def start(profile, keymap=None):
+        if keymap is None:
+            shutil.copy(os.path.join(SOURCE_DIR, profile, "keymap.cfg"), drive.path("/keymap.cfg"))
+        else:
+            drive.write("/keymap.cfg", keymap)
+
+        module = load_profile(profile)
+        monkeypatch.setattr(module, "open", drive.open, raising=False)
+        controller = module.EVMController(module.boot_marks)
+        while controller.startup_steps:
+            controller._run_startup()
+        usb_midi.ports[1].written.clear()
+        return module, controller
+
+    return start
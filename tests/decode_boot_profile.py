@@ -0,0 +1,108 @@
+"""Decode the boot profile ring from a copy of the MacroPad NVM on the host.
+
+The controller keeps the stage times and heap free of its last boots in NVM, see BootProfile. Copy the
+NVM from the REPL on the serial console (Ctrl-C, then Enter) into a text file:
+
+    >>> import microcontroller
+    >>> print(bytes(microcontroller.nvm[0:1024]).hex())
+
+and decode it with the stage names of the controller profile that wrote it:
+
+    python tests/decode_boot_profile.py nvm.txt [evm|evmplus] [offset] [boots]
+
+The dump may also be a binary file. offset and boots default to the BootNVM location and boot count of
+the shared config.
+"""
+
+import os
+import shutil
+import string
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import SOURCE_DIR, Drive  # noqa: E402
+from bench_startup import load  # noqa: E402
+import evmcore  # noqa: E402
+
+
+def stage_names(profile):
+    """Names of the boot profile marks of a controller profile, in the order the board takes them"""
+
+    with tempfile.TemporaryDirectory() as root:
+        drive = Drive(root)
+        shutil.copy(os.path.join(SOURCE_DIR, profile, "keymap.cfg"), drive.path("/keymap.cfg"))
+        evmcore.open = drive.open
+
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        try:
+            module = load(profile, drive)
+            controller = module.EVMController(module.boot_marks)
+            # Taken by run() before the deferred startup steps
+            controller.boot_profile.mark("Keys ready")
+            while controller.startup_steps:
+                controller._run_startup()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    return [name for name, _, _ in controller.boot_profile.marks]
+
+
+def read_dump(filename):
+    """NVM bytes from a hex dump, or from a binary file"""
+
+    with open(filename, "rb") as f:
+        data = f.read()
+    text = data.decode("ascii", "replace")
+    if text.strip() and all(char in string.hexdigits or char.isspace() for char in text):
+        return bytes.fromhex("".join(text.split()))
+    return data
+
+
+def decode(region, names, boots):
+    """Table lines of the stage times of each stored boot, oldest first, with the average, maximum and the
+    heap free of the last boot"""
+
+    history = evmcore.BootProfile([], boots, 0).read(region)
+    if not history:
+        return ["No boot profile in the NVM copy"]
+
+    count = len(history[0][0])
+    if len(names) != count:
+        names = ["Stage {}".format(i + 1) for i in range(count)]
+
+    lines = ["Boot profile, {} boots oldest first (ms, heap free at stage end of the last boot):".format(len(history))]
+    lines.append("{:<12}".format("Stage") + "".join("{:>7}".format("#{}".format(n + 1)) for n in range(len(history))) +
+                 " {:>6} {:>6} {:>8}".format("Avg", "Max", "Heap"))
+    totals = [0] * len(history)
+    for i in range(count):
+        stage = [times[i] for times, _ in history]
+        for boot in range(len(history)):
+            totals[boot] += stage[boot]
+        lines.append("{:<12}".format(names[i]) + "".join("{:>7}".format(ms) for ms in stage) +
+                     " {:>6} {:>6} {:>8}".format(sum(stage) // len(stage), max(stage), history[-1][1][i]))
+    lines.append("{:<12}".format("Total") + "".join("{:>7}".format(ms) for ms in totals) +
+                 " {:>6} {:>6}".format(sum(totals) // len(totals), max(totals)))
+    return lines
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    config = evmcore.EVMConfig()
+    profile = sys.argv[2] if len(sys.argv) > 2 else "evmplus"
+    offset = int(sys.argv[3]) if len(sys.argv) > 3 else config.boot_profile_nvm
+    boots = int(sys.argv[4]) if len(sys.argv) > 4 else config.boot_profile_boots
+
+    region = read_dump(sys.argv[1])[offset:]
+    for line in decode(region, stage_names(profile), boots):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+class Label:
+    def __init__(self, font=None, text="", **kwargs):
+        self.text = text
@@ -0,0 +1,6 @@
+class GridLayout:
+    def __init__(self, **kwargs):
+        self.items = []
+
+    def add_content(self, content, **kwargs):
+        self.items.append(content)
@@ -0,0 +1,53 @@
+"""Stand-in for adafruit_macropad. Tests queue KeyEvent objects on keys.events.q and set encoder directly"""
+
+from collections import deque
+
+
+class KeyEvent:
+    def __init__(self, key_number, pressed):
+        self.key_number = key_number
+        self.pressed = pressed
+        self.released = not pressed
+
+
+class _Events:
+    def __init__(self):
+        self.q = deque()
+
+    def get(self):
+        return self.q.popleft() if self.q else None
+
+    def get_into(self, event):
+        if not self.q:
+            return False
+        queued = self.q.popleft()
+        event.key_number = queued.key_number
+        event.pressed = queued.pressed
+        event.released = queued.released
+        return True
+
+
+class _Keys:
+    def __init__(self):
+        self.events = _Events()
+
+
+class _Debouncer:
+    def __init__(self):
+        self.pressed = False
+
+    def update(self):
+        pass
+
+
+class _Display:
+    root_group = None
+
+
+class MacroPad:
+    def __init__(self, rotation=0):
+        self.pixels = [0] * 12
+        self.encoder = 0
+        self.keys = _Keys()
+        self.encoder_switch_debounced = _Debouncer()
+        self.display = _Display()
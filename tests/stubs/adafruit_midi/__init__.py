@@ -0,0 +1,19 @@
+"""Stand-in for adafruit_midi: send() records (message, channel) pairs in sent"""
+
+
+class MIDI:
+    def __init__(self, midi_in=None, in_channel=0, midi_out=None, out_channel=0):
+        self.sent = []
+        self.in_channel = in_channel
+        self.out_channel = out_channel
+        self.inbound = []
+
+    def send(self, msg, channel=None):
+        self.sent.append((msg, channel))
+
+    def receive(self):
+        return self.inbound.pop(0) if self.inbound else None
+
+
+class MIDIMessage:
+    pass
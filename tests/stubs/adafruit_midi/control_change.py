@@ -0,0 +1,11 @@
+from adafruit_midi import MIDIMessage
+
+
+class ControlChange(MIDIMessage):
+    def __init__(self, control, value, *, channel=None):
+        self.control = control
+        self.value = value
+        self.channel = channel
+
+    def __repr__(self):
+        return "ControlChange({}, {})".format(self.control, self.value)
@@ -0,0 +1,8 @@
+from adafruit_midi import MIDIMessage
+
+
+class NoteOff(MIDIMessage):
+    def __init__(self, note, velocity=0, *, channel=None):
+        self.note = note
+        self.velocity = velocity
+        self.channel = channel
@@ -0,0 +1,7 @@
+from adafruit_midi import MIDIMessage
+
+
+class SystemExclusive(MIDIMessage):
+    def __init__(self, manufacturer_id, data):
+        self.manufacturer_id = bytes(manufacturer_id)
+        self.data = bytes(data)
@@ -0,0 +1,11 @@
+class DigitalIO:
+    def __init__(self, seesaw, pin):
+        self.seesaw = seesaw
+        self.pin = pin
+
+    def switch_to_input(self, pull=None):
+        pass
+
+    @property
+    def value(self):
+        return bool(self.seesaw.pins & (1 << self.pin))
@@ -0,0 +1,4 @@
+class NeoPixel(list):
+    def __init__(self, seesaw, pin, n):
+        super().__init__([0] * n)
+        self.brightness = 1.0
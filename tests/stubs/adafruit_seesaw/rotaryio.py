@@ -0,0 +1,8 @@
+class IncrementalEncoder:
+    def __init__(self, seesaw, n=0):
+        self.seesaw = seesaw
+        self.n = n
+
+    @property
+    def position(self):
+        return self.seesaw.positions[self.n]
@@ -0,0 +1,9 @@
+class Pull:
+    UP = 1
+    DOWN = 2
+
+
+class DigitalInOut:
+    def __init__(self, pin):
+        self.value = True
+        self.pull = None
@@ -0,0 +1,2 @@
+class Group(list):
+    pass
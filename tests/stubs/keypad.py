@@ -0,0 +1,8 @@
+class Event:
+    def __init__(self, key_number=0, pressed=True):
+        self.key_number = key_number
+        self.pressed = pressed
+        self.released = not pressed
+
+    def __bool__(self):
+        return True
@@ -0,0 +1 @@
+nvm = bytearray(4096)
@@ -0,0 +1,2 @@
+def colorwheel(n):
+    return n
@@ -0,0 +1,29 @@
+"""Stand-in for the CircuitPython supervisor module with a virtual millisecond clock.
+ticks_ms() wraps at 2**29 like on the board, tests move it with advance() or set _now directly"""
+
+TICKS_PERIOD = 1 << 29
+TICKS_MASK = TICKS_PERIOD - 1
+_now = [0]
+
+
+def ticks_ms():
+    return _now[0] & TICKS_MASK
+
+
+def advance(ms):
+    _now[0] += ms
+
+
+class _StatusBar:
+    display = True
+
+
+status_bar = _StatusBar()
+
+
+class _Runtime:
+    display = None
+    serial_bytes_available = 0
+
+
+runtime = _Runtime()
@@ -0,0 +1 @@
+FONT = None
@@ -0,0 +1,24 @@
+"""Stand-in for usb_midi: ports[1] records every write, ports[0] reads from its incoming bytearray"""
+
+
+class _Port:
+    def __init__(self):
+        self.written = []
+        self.incoming = bytearray()
+
+    def write(self, buf, n=None):
+        if n is None:
+            n = len(buf)
+        self.written.append(bytes(buf[:n]))
+
+    def read(self, n):
+        return b""
+
+    def readinto(self, buf, n=None):
+        n = min(len(buf), len(self.incoming)) if n is None else min(n, len(self.incoming))
+        buf[:n] = self.incoming[:n]
+        del self.incoming[:n]
+        return n
+
+
+ports = [_Port(), _Port()]
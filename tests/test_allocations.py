@@ -0,0 +1,145 @@
+"""The key, encoder and quad encoder paths allocate nothing per event, measured with tracemalloc.
+
+CPython allocates a few temporaries that the board does not: a range object and its iterator for each
+for ... in range() loop, an iterator for a for loop over a tuple, and an argument tuple for min() and
+max(). MicroPython runs these without touching the heap. Each path is allowed only the temporaries of
+the loops and calls it makes, measured from reference functions, and must leave nothing behind after
+many events.
+"""
+
+import time
+import tracemalloc
+
+import pytest
+import supervisor
+import usb_midi
+from adafruit_macropad import KeyEvent
+from adafruit_seesaw.seesaw import Seesaw
+
+from evmcore import EncoderMode
+
+PASSES = 100
+
+
+def _range_loop():
+    for _ in range(4):
+        pass
+
+
+def _tuple_loop(values=(1, 2)):
+    for _ in values:
+        pass
+
+
+def _min_max(value=64):
+    return max(0, min(127, value))
+
+
+def allocated(path):
+    """Run path once to warm up, then PASSES times under tracemalloc. Returns the bytes left allocated
+    and the peak above the starting point"""
+
+    path()
+    passes = iter(range(PASSES))
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        for _ in passes:
+            path()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return current - start, peak - start
+
+
+def assert_allocation_free(path, budget):
+    retained, peak = allocated(path)
+    assert retained == 0
+    assert peak <= budget
+
+
+# CPython temporaries of one range() loop, one tuple loop and one min()/max() call
+LOOP = allocated(_range_loop)[1]
+ITER = allocated(_tuple_loop)[1]
+ARGS = allocated(_min_max)[1]
+
+
+@pytest.fixture
+def controller(start_controller, monkeypatch):
+    # Small tick counts and a whole second clock, as on the board, so CPython does not box them
+    supervisor._now[0] = 100
+    monkeypatch.setattr(time, "time", lambda: 0)
+    module, controller = start_controller("evmplus")
+
+    # The stand-in port records a bytes copy of each write, the board writes the preallocated buffer
+    monkeypatch.setattr(usb_midi.ports[1], "write", lambda buf, n=None: None)
+    return controller
+
+
+def key_path(controller, key_number):
+    """Press and release a key, with the events queued ahead so the stand-in queue does not allocate"""
+
+    queue = controller.macropad.keys.events.q
+    queue.extend([KeyEvent(key_number, True), KeyEvent(key_number, False)] * (PASSES + 1))
+
+    def path():
+        controller._run_keys()
+        controller._run_keys()
+
+    return path
+
+
+def test_key_path(controller):
+    # Key 1 is Arr.A, a pedal SysEx, the LEDs are set again in one range() loop
+    assert_allocation_free(key_path(controller, 1), LOOP)
+
+
+def test_variation_key_path(controller):
+    # A Variation key tap also presets the quad positions, a range() loop over each board's encoders
+    # inside the loop over the boards
+    assert_allocation_free(key_path(controller, controller.config.key_variation), 2 * LOOP)
+
+
+@pytest.mark.parametrize("mode, budget", [
+    (EncoderMode.ROTOR, 0),
+    (EncoderMode.TEMPO, 0),
+    (EncoderMode.VOLUME, ARGS),
+    (EncoderMode.VALUE, LOOP),
+    (EncoderMode.BANK, LOOP),
+    (EncoderMode.SONG, 0),
+    (EncoderMode.HIRES, 0),
+])
+def test_encoder_path(controller, mode, budget):
+    controller.state.encoder_mode = mode
+
+    def path():
+        controller.macropad.encoder += 1
+        controller._run_encoder()
+        controller.macropad.encoder -= 1
+        controller._run_encoder()
+
+    assert_allocation_free(path, budget)
+
+
+def test_quad_path(controller):
+    board = Seesaw.boards[0x49]
+
+    def path():
+        board.positions[0] += 1
+        controller._run_quad()
+        board.positions[0] -= 1
+        controller._run_quad()
+
+    # The loop over the board's encoders, and over the CCs of a turned encoder inside it
+    assert_allocation_free(path, LOOP + ITER)
+
+
+def test_measures_an_allocation(controller):
+    # A formatted label on the key path would be caught
+    path = key_path(controller, 1)
+
+    def formatting_path():
+        path()
+        controller.display.update_text(3, "BUTTON: {}".format(controller.last_key_pressed))
+
+    assert allocated(formatting_path)[1] > LOOP
@@ -0,0 +1,96 @@
+"""BootProfile stage times kept in an NVM ring, and decoded from a copy of the NVM on the host"""
+
+import microcontroller
+import pytest
+
+from decode_boot_profile import decode, read_dump
+from evmcore import BootProfile
+
+OFFSET = 16
+BOOTS = 8
+NAMES = ("Boot", "Core", "Keys ready")
+
+
+def boot(number, boots=BOOTS):
+    """Save a boot whose stages take number, 2 * number and 3 * number ms, with number as the heap free"""
+
+    marks = []
+    ns = 0
+    for stage, name in enumerate(NAMES):
+        ns += (stage + 1) * number * 1000000
+        marks.append((name, ns, number))
+    profile = BootProfile(marks, boots, OFFSET)
+    profile.save()
+    return profile
+
+
+@pytest.fixture
+def nvm(monkeypatch):
+    nvm = bytearray(512)
+    monkeypatch.setattr(microcontroller, "nvm", nvm)
+    return nvm
+
+
+def test_ring_wraps_and_reads_oldest_first(nvm):
+    for number in range(1, 12):
+        profile = boot(number)
+
+    # The last 8 of 11 boots, this boot last
+    region = nvm[OFFSET:]
+    assert profile.history == profile.read(region)
+    assert [mems[0] for _, mems in profile.history] == list(range(4, 12))
+    assert profile.history[-1] == ([11, 22, 33], [11, 11, 11])
+    assert region[1] == 11 % BOOTS
+    assert region[3] == BOOTS
+
+
+def test_first_boots_before_ring_is_full(nvm):
+    boot(5)
+    profile = boot(6)
+
+    assert profile.history == [([5, 10, 15], [5, 5, 5]), ([6, 12, 18], [6, 6, 6])]
+
+
+def test_other_regions_not_read(nvm):
+    profile = BootProfile([], BOOTS, 0)
+
+    assert profile.read(bytes(64)) == []
+    assert profile.read(b"") == []
+
+    boot(1)
+    region = bytearray(nvm[OFFSET:])
+    # Truncated, or a next slot or boot count past the ring
+    assert profile.read(region[:20]) == []
+    region[1] = BOOTS
+    assert profile.read(region) == []
+    region[1] = 1
+    region[3] = BOOTS + 1
+    assert profile.read(region) == []
+
+
+def test_new_layout_of_marks_restarts_ring(nvm):
+    boot(1)
+    boot(2)
+
+    profile = BootProfile([("Boot", 1000000, 0)], BOOTS, OFFSET)
+    profile.save()
+    assert profile.history == [([1], [0])]
+
+
+def test_decode_hex_dump(nvm, tmp_path):
+    for number in range(1, 4):
+        boot(number)
+
+    # As printed by print(bytes(microcontroller.nvm[0:1024]).hex()) on the REPL
+    dump = tmp_path / "nvm.txt"
+    dump.write_text(bytes(nvm).hex() + "\n")
+    region = read_dump(str(dump))[OFFSET:]
+
+    lines = decode(region, list(NAMES), BOOTS)
+    assert lines[2].split() == ["Boot", "1", "2", "3", "2", "3", "3"]
+    assert lines[4].split() == ["Keys", "ready", "3", "6", "9", "6", "9", "3"]
+    assert lines[5].split() == ["Total", "6", "12", "18", "12", "18"]
+
+    # Stage names from another profile are replaced by numbers
+    assert decode(region, ["Boot"], BOOTS)[3].split()[:2] == ["Stage", "2"]
+    assert decode(bytes(64), list(NAMES), BOOTS) == ["No boot profile in the NVM copy"]
@@ -0,0 +1,61 @@
+"""EncoderAccel step multipliers for each profile at detent intervals across its buckets"""
+
+import pytest
+
+from evmcore import EncoderAccel
+
+# Milliseconds between detents, a fast spin to a slow turn, and past the last 25 ms bucket
+INTERVALS = (0, 24, 25, 60, 99, 100, 150, 249, 250, 299, 300, 374, 375, 1000, 60000)
+
+# Profile spec: multiplier expected at each of INTERVALS
+PROFILES = {
+    "none": ("linear:1:0", (1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1)),
+    "grad": ("custom:100=4,250=2", (4, 4, 4, 4, 4, 2, 2, 2, 1, 1, 1, 1, 1, 1, 1)),
+    # The acc00 and acc01 examples of keymap.cfg
+    "fast": ("exp:8:300", (8, 8, 7, 6, 5, 4, 3, 2, 1, 1, 1, 1, 1, 1, 1)),
+    "gentle": ("linear:3:250", (3, 3, 3, 3, 2, 2, 2, 1, 1, 1, 1, 1, 1, 1, 1)),
+    "steep": ("linear:16:400", (16, 16, 15, 14, 13, 12, 10, 8, 7, 6, 5, 3, 2, 2, 2)),
+}
+
+
+@pytest.fixture(scope="module")
+def accel():
+    accel = EncoderAccel()
+    for name, (spec, expected) in PROFILES.items():
+        if name not in accel.profile_specs:
+            accel.add_profile(name, spec)
+    accel.build()
+    return accel
+
+
+@pytest.mark.parametrize("name", PROFILES)
+def test_profile_multipliers(accel, name):
+    table = accel.get_table(name)
+
+    assert len(table) == EncoderAccel.ACCEL_BUCKETS
+    assert tuple(accel.get_multiplier(table, ms) for ms in INTERVALS) == PROFILES[name][1]
+
+
+@pytest.mark.parametrize("name", PROFILES)
+def test_multipliers_never_rise_as_turns_slow(accel, name):
+    table = accel.get_table(name)
+
+    assert all(table[i] >= table[i + 1] >= 1 for i in range(len(table) - 1))
+
+
+def test_unknown_profile_is_flat(accel):
+    assert accel.get_table("missing") == accel.get_table("none")
+
+
+@pytest.mark.parametrize("spec", ["linear:0:200", "exp:8", "custom:100", "custom:100=128", "ramp:4:100"])
+def test_bad_spec_rejected(spec):
+    with pytest.raises(ValueError):
+        EncoderAccel().add_profile("bad", spec)
+
+
+def test_keymap_profiles_loaded(start_controller):
+    module, controller = start_controller("evm")
+    accel = controller.key_cache.accel
+
+    for name in ("fast", "gentle"):
+        assert accel.get_table(name) == EncoderAccel()._build_table(PROFILES[name][0])
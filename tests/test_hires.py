@@ -0,0 +1,115 @@
+"""High resolution parameters: 14-bit NRPN and CC values, and the built in Ketron preset NRPNs"""
+
+import usb_midi
+
+
+def test_ketron_nrpn_sends_data_entry_msb_only(start_controller):
+    module, controller = start_controller("evm", "var00=EncHiRes:Micro.Echo\n")
+    channel = controller.config.midi_out_channel
+    written = usb_midi.ports[1].written
+
+    # No nrp line: Micro.Echo is NRPN 70h 30h with presets 0-8, one per detent
+    assert controller.hires_index >= 0
+    controller._process_hires(2)
+    controller.midi_handler.send_hires()
+    assert written == [bytes((0xB0 | channel, 99, 0x70, 98, 0x30, 6, 2))]
+
+    # Clamped at the last preset, the NRPN is still selected so only CC6 is sent
+    written.clear()
+    controller._process_hires(20)
+    controller.midi_handler.send_hires()
+    assert written == [bytes((0xB0 | channel, 6, 8))]
+
+
+def test_hires_display_is_queued_with_prefix(start_controller):
+    module, controller = start_controller("evm", "var00=EncHiRes:Micro.Pitch\n")
+    display = controller.display
+
+    controller._process_hires(3)
+    assert (display.pending_text[3], display.pending_value[3]) == ("Micro.Pitch: ", 3)
+
+    controller._update_display()
+    assert display.labels[3].text == "Micro.Pitch: 3"
+
+
+def test_nrp_line_sends_14_bit_value(start_controller):
+    module, controller = start_controller("evm", "nrp00=Fine.Tune:NRPN:1:10:8192\nvar00=EncHiRes:Fine.Tune\nvar01=HiStep:64\n")
+    channel = controller.config.midi_out_channel
+
+    controller._process_hires(1)
+    controller.midi_handler.send_hires()
+
+    value = 8192 + 64
+    assert usb_midi.ports[1].written == [bytes((0xB0 | channel, 99, 1, 98, 10, 6, value >> 7, 38, value & 0x7F))]
+
+
+def test_unknown_hires_name_is_ignored(start_controller):
+    module, controller = start_controller("evm", "var00=EncHiRes:Nothing\n")
+
+    assert controller.hires_index < 0
+    controller._process_hires(1)
+    controller.midi_handler.send_hires()
+    assert usb_midi.ports[1].written == []
+
+
+def test_quad_encoder_on_ketron_nrpn(start_controller):
+    module, controller = start_controller("evmplus", "enc00=6:Micro.Preset:MicPre:16\n")
+    display = controller.display
+
+    hires = controller.key_cache.quad_hires[0][0]
+    assert hires == (module.MIDIHandler.HIRES_MSB | 0x70 << 7 | 0x21, 0, 0x13)
+
+    controller._process_quad_hires(0, 0, hires, 10)
+    controller.midi_handler.send_hires()
+    assert usb_midi.ports[1].written == [bytes((0xBF, 99, 0x70, 98, 0x21, 6, 10))]
+    assert (display.pending_text[9], display.pending_value[9]) == ("KNB1: MicPre ", 10)
+
+
+class FailingPort:
+    """USB MIDI port whose writes fail until fail is cleared"""
+
+    def __init__(self):
+        self.fail = True
+        self.written = []
+
+    def write(self, buf, n):
+        if self.fail:
+            raise OSError("USB write failed")
+        self.written.append(bytes(buf[:n]))
+
+
+def test_failed_write_selects_nrpn_again(start_controller):
+    module, controller = start_controller("evm", "nrp00=Fine.Tune:NRPN:1:10:8192\nvar00=EncHiRes:Fine.Tune\nvar01=HiStep:64\n")
+    channel = controller.config.midi_out_channel
+    handler = controller.midi_handler
+    handler.midi_out = port = FailingPort()
+
+    controller._process_hires(1)
+    assert not handler.send_hires()
+
+    # The CC99/98 selection was lost with the write, so the next value selects the NRPN again
+    port.fail = False
+    controller._process_hires(1)
+    assert handler.send_hires()
+    value = 8192 + 128
+    assert port.written == [bytes((0xB0 | channel, 99, 1, 98, 10, 6, value >> 7, 38, value & 0x7F))]
+
+
+def test_failed_flush_inside_a_send_selects_nrpns_again(start_controller):
+    module, controller = start_controller("evm")
+    handler = controller.midi_handler
+    handler.midi_out = port = FailingPort()
+
+    # Enough NRPNs on one channel to fill a batch before the last ones
+    count = handler.BATCH_SIZE // 10 + 2
+    for parameter in range(count):
+        handler.step_hires(parameter, 0, 1)
+    assert not handler.send_hires()
+    assert handler.nrpn_selected == [-1] * 16
+    assert not handler.hires_pending
+    assert handler.batch_length == 0
+
+    port.fail = False
+    handler.step_hires(0, 0, 1)
+    assert handler.send_hires()
+    assert port.written == [bytes((0xB0, 99, 0, 98, 0, 6, 8194 >> 7, 38, 8194 & 0x7F))]
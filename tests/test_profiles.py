@@ -0,0 +1,69 @@
+"""Each controller profile builds its controller from the shared core in evmcore"""
+
+import evmcore
+import usb_midi
+
+from conftest import load_profile
+
+
+def test_evm_profile(start_controller):
+    module, controller = start_controller("evm")
+    stages = [stage for stage, run in controller._loop_stages()]
+
+    assert isinstance(controller, evmcore.EVMController)
+    assert controller.PROFILE.name == "EVM"
+    assert controller.midi_handler.midi.out_channel == 4
+    assert evmcore.LoopStage.QUAD not in stages
+    assert controller.state_store.encoders == 0
+
+
+def test_evmplus_profile(start_controller):
+    module, controller = start_controller("evmplus")
+    stages = [stage for stage, run in controller._loop_stages()]
+
+    assert controller.PROFILE.name == "EVM Plus"
+    assert controller.midi_handler.midi.in_channel == "ALL"
+    assert controller.midi_handler.midi.out_channel == controller.config.midi_out_channel
+    assert stages.index(evmcore.LoopStage.QUAD) == stages.index(evmcore.LoopStage.ENCODER) + 1
+    assert controller.state_store.encoders == controller.config.quad_max_encoders
+    assert controller.midi_input.control_change == controller._learn_slider
+    assert controller.config.colors.OFFWHITE == module.Colors.OFFWHITE != evmcore.Colors.OFFWHITE
+
+
+def test_evmplus_keymap_quad_lines(start_controller):
+    module, controller = start_controller("evmplus", "\n".join([
+        "var00=EncPickup:True",
+        "var01=AccQuad:fast",
+        "sld00=DRUM_CC:64",
+        "enc00=3:BASS_CC:Bass:2:90",
+        "swi00=3:CHORD_CC",
+    ]))
+    key_cache = controller.key_cache
+
+    assert controller.config.encoder_pickup
+    assert controller.config.accel_quad == "fast"
+    assert key_cache.slider_snapshot == {evmcore.SliderCC.DRUM_CC: 64}
+    assert key_cache.quad_encoder_map[0][0] == "3:BASS_CC:Bass:2:90"
+    assert key_cache.quad_cache[0][0][:3] == ((evmcore.SliderCC.BASS_CC,), (evmcore.SliderCC.CHORD_CC,), 1)
+    assert not controller.config_handler.config_error
+
+
+def test_evmplus_bad_quad_line_is_config_error(start_controller):
+    module, controller = start_controller("evmplus", "enc00=3:BASS_CC:Bass:17\n")
+
+    assert controller.config_handler.config_error
+
+
+def test_generic_profile(drive):
+    module = load_profile("generic")
+    controller = module.GenosController()
+
+    assert controller.PROFILE.name == "Genos"
+    assert controller.midi_handler.midi.out_channel == 15
+    assert module.TapTempo is evmcore.TapTempo
+
+    # Key 2 is C0 in the Base layer, its label is drawn by the display stage
+    controller._handle_key_press(2)
+    controller._update_display()
+    assert controller.display.labels[3].text == "NOTE: C0"
+    assert usb_midi.ports[1].written == []
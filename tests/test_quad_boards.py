@@ -0,0 +1,48 @@
+"""Chained quad encoder boards are read one per loop pass in turn"""
+
+import board
+import pytest
+import supervisor
+import usb_midi
+from adafruit_seesaw.seesaw import Seesaw
+
+
+@pytest.fixture
+def chained(start_controller, monkeypatch):
+    """Start the evmplus controller with a number of boards chained from 0x49"""
+
+    def start(boards):
+        monkeypatch.setattr(board._I2C, "addresses", [0x49 + i for i in range(boards)])
+        module, controller = start_controller("evmplus")
+        return controller
+
+    return start
+
+
+@pytest.mark.parametrize("boards", [1, 2, 4])
+def test_one_board_read_per_pass(chained, monkeypatch, boards):
+    controller = chained(boards)
+    reads = []
+    read_bulk = Seesaw.digital_read_bulk
+    monkeypatch.setattr(Seesaw, "digital_read_bulk", lambda seesaw, mask: reads.append(seesaw.addr) or read_bulk(seesaw, mask))
+
+    assert len(controller.quad_boards) == boards
+    for _ in range(boards * 3):
+        controller._run_quad()
+
+    assert reads == [0x49 + i for i in range(boards)] * 3
+
+
+def test_chained_encoders_numbered_by_board(chained):
+    controller = chained(2)
+    written = usb_midi.ports[1].written
+
+    # Encoder 4 (KNB5) is unassigned by default, encoder 0 on the first board sends LOWERS_CC
+    for addr in (0x4A, 0x49):
+        Seesaw.boards[addr].positions[0] += 1
+    for _ in range(2):
+        supervisor.advance(200)
+        controller._run_quad()
+
+    assert controller.quad_last_positions[4] == 1
+    assert [message[1] for message in written] == [0x6C]
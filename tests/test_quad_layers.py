@@ -0,0 +1,75 @@
+"""Quad encoders in every shift mode: the Base layer CC when the shift is off or pending, the Shift layer CC
+when it is active or locked"""
+
+import pytest
+import supervisor
+import usb_midi
+from adafruit_seesaw.seesaw import Seesaw
+
+from evmcore import ShiftKeyMode
+
+# enc00 is LOWERS_CC in the Base layer and enc10 is DRUM_CC in the Shift layer, both on MIDI channel 16
+LOWERS_CC = 0x6C
+DRUM_CC = 0x68
+
+
+@pytest.fixture
+def controller(start_controller):
+    supervisor._now[0] = 1000
+    module, controller = start_controller("evmplus")
+    return controller
+
+
+def turn(controller, detents):
+    """Turn encoder 0 by some detents and return the (CC, value) pairs sent"""
+
+    board = Seesaw.boards[0x49]
+    written = usb_midi.ports[1].written
+    written.clear()
+    supervisor.advance(200)
+    board.positions[0] += detents
+    controller._handle_quadencoder(controller.config)
+    return [(message[1], message[2]) for message in written if message[0] == 0xBF]
+
+
+@pytest.mark.parametrize("shift_mode, cc, layer", [
+    (ShiftKeyMode.OFF, LOWERS_CC, 0),
+    (ShiftKeyMode.ACTIVE_SHIFT, DRUM_CC, 1),
+    (ShiftKeyMode.ACTIVE_LOCK, DRUM_CC, 1),
+])
+def test_turn_sends_layer_cc(controller, shift_mode, cc, layer):
+    controller.state.shift_mode = shift_mode
+    volume = controller.state.quad_volumes[layer][0]
+
+    sent = turn(controller, 1)
+
+    assert sent == [(cc, controller.state.quad_volumes[layer][0])]
+    assert controller.state.quad_volumes[layer][0] > volume
+    assert controller.state.shift_mode == shift_mode
+
+
+def test_turn_while_variation_held_moves_to_shift_layer(controller):
+    # Variation key down: the shift is pending until a key or knob is used with it
+    controller.state.shift_mode = ShiftKeyMode.PENDING
+
+    sent = turn(controller, 1)
+
+    assert sent == [(DRUM_CC, controller.state.quad_volumes[1][0])]
+    assert controller.state.shift_mode == ShiftKeyMode.ACTIVE_SHIFT
+    # The Variation key release now ends the shift instead of sending VARIATION
+    assert controller.last_key_pressed == -1
+
+
+def test_layers_keep_their_own_volumes(controller):
+    base = controller.state.quad_volumes[0][0]
+
+    controller.state.shift_mode = ShiftKeyMode.ACTIVE_LOCK
+    turn(controller, 3)
+    shift = controller.state.quad_volumes[1][0]
+
+    controller.state.shift_mode = ShiftKeyMode.OFF
+    sent = turn(controller, -1)
+
+    assert controller.state.quad_volumes[1][0] == shift
+    assert sent == [(LOWERS_CC, controller.state.quad_volumes[0][0])]
+    assert controller.state.quad_volumes[0][0] < base
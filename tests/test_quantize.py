@@ -0,0 +1,123 @@
+"""Quantized keys against a jittery EVM MIDI clock: a held key is sent in the loop pass that reads the next beat
+or bar clock, never earlier and never later"""
+
+import os
+import random
+
+import pytest
+import supervisor
+import usb_midi
+
+from conftest import SOURCE_DIR
+
+BEATS_PER_BAR = 4
+CLOCKS = {"Beat": 24, "Bar": 24 * BEATS_PER_BAR}
+
+# Pedal keys: Arr.A, Intro/End1, Arr.B, Intro/End2
+KEYS = (1, 2, 4, 5)
+
+
+@pytest.fixture
+def controller(start_controller):
+    def start(quantize):
+        with open(os.path.join(SOURCE_DIR, "evm", "keymap.cfg")) as f:
+            keymap = f.read()
+        module, controller = start_controller("evm", keymap + "var90=Quantize:{}\n".format(quantize))
+        return controller
+
+    return start
+
+
+def clock_bytes(rng, start_ms, bpm, clocks, jitter_ms):
+    """Start then clocks at bpm, each arriving up to jitter_ms late, in order. Returns (arrival ms, byte)"""
+
+    events = [(start_ms, 0xFA)]
+    last = start_ms
+    for clock in range(1, clocks + 1):
+        arrival = start_ms + clock * 60000 // (bpm * 24) + rng.randint(0, jitter_ms)
+        last = max(last, arrival)
+        events.append((last, 0xF8))
+    return events
+
+
+def simulate(controller, rng, bpm, clocks, jitter_ms, presses):
+    """Run loop passes every 1-8 ms: queued clock bytes, then key presses due, then the MIDI stage.
+    Returns the passes as (clocks before, clocks after, keys pressed, bytes written)"""
+
+    events = clock_bytes(rng, 10, bpm, clocks, jitter_ms)
+    port = usb_midi.ports[0]
+    written = usb_midi.ports[1].written
+    passes = []
+
+    while events or port.incoming:
+        supervisor.advance(rng.randint(1, 8))
+        now = supervisor._now[0]
+        while events and events[0][0] <= now:
+            port.incoming.append(events.pop(0)[1])
+
+        # The keys stage runs before the MIDI stage in a loop pass
+        pressed = [key for at_ms, key in presses if at_ms <= now]
+        presses[:] = [(at_ms, key) for at_ms, key in presses if at_ms > now]
+        for key in pressed:
+            controller._handle_key_press(key)
+
+        before = controller.clock.clocks
+        controller._run_midi()
+        passes.append((before, controller.clock.clocks, pressed, list(written)))
+        written.clear()
+
+    return passes
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("quantize", ["Beat", "Bar"])
+def test_held_keys_sent_on_boundary(controller, quantize, seed):
+    controller = controller(quantize)
+    rng = random.Random(seed)
+    unit = CLOCKS[quantize]
+
+    # Presses spread over 4 bars at 128 BPM, the first once the clock is running
+    presses = sorted((rng.randint(30, 7000), KEYS[n % len(KEYS)]) for n in range(12))
+    passes = simulate(controller, rng, 128, 24 * 4 * 5, 5, presses)
+
+    held = set()
+    for before, after, pressed, written in passes:
+        crossed = after >= 0 and after // unit > max(before, -1) // unit
+
+        # A second press of a held key cancels it
+        for key in pressed:
+            held ^= {key}
+
+        if held and crossed:
+            # All keys held since the last boundary go out together in one write, a pedal is its press and release SysEx
+            assert len(written) == 1
+            assert written[0].count(0xF0) == 2 * len(held)
+            held.clear()
+        else:
+            # Nothing is sent between boundaries
+            assert written == []
+
+    assert all(key is None for key in controller.quantized)
+
+
+def test_second_press_cancels(controller):
+    controller = controller("Bar")
+    rng = random.Random(1)
+
+    passes = simulate(controller, rng, 120, 24 * 4 * 2, 5, [(100, 1), (600, 1)])
+
+    assert all(written == [] for before, after, pressed, written in passes)
+
+
+def test_stop_releases_held_keys(controller):
+    controller = controller("Bar")
+    rng = random.Random(2)
+
+    simulate(controller, rng, 120, 30, 5, [(100, 4)])
+    assert controller.quantized[4] is not None
+
+    usb_midi.ports[0].incoming.append(0xFC)
+    controller._run_midi()
+
+    assert len(usb_midi.ports[1].written) == 1
+    assert controller.quantize_pending == 0
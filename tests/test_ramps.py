@@ -0,0 +1,159 @@
+"""RampEngine values and send times on a virtual millisecond clock"""
+
+import os
+
+import pytest
+import supervisor
+import usb_midi
+
+from conftest import SOURCE_DIR
+from evmcore import RampEngine
+from supervisor import TICKS_PERIOD
+
+INTERVAL_MS = 20
+
+
+class Bench:
+    """A RampEngine with a virtual clock, recording each (ms, cc, value) sent"""
+
+    def __init__(self, values=None, max_ramps=4, bpm=120, start=0):
+        self.now = start
+        self.values = values if values is not None else {}
+        self.sent = []
+        self.ramps = RampEngine(self.send, self.current, self.clock, max_ramps, INTERVAL_MS, bpm)
+
+    def clock(self):
+        return self.now % TICKS_PERIOD
+
+    def current(self, cc):
+        return self.values.get(cc, -1)
+
+    def send(self, cc, value):
+        self.sent.append((self.now, cc, value))
+
+    def run(self, until, step=1):
+        """Call update() every step ms up to the until time"""
+
+        while self.now < until:
+            self.now += step
+            self.ramps.update()
+
+
+def test_ramp_values_and_times():
+    bench = Bench({108: 0})
+    bench.ramps.start(108, 100, 1000)
+    bench.run(1100)
+
+    # One value every 20 ms, the value reached at that time, the target exactly at the duration
+    assert bench.sent == [(ms, 108, 100 * ms // 1000) for ms in range(INTERVAL_MS, 1001, INTERVAL_MS)]
+    assert not bench.ramps.active
+
+
+def test_only_changed_values_sent():
+    bench = Bench({11: 100})
+    bench.ramps.start(11, 95, 1000)
+    bench.run(1100)
+
+    # 5 steps over a second: a value is sent when it changes, not every interval
+    assert bench.sent == [(200, 11, 99), (400, 11, 98), (600, 11, 97), (800, 11, 96), (1000, 11, 95)]
+
+
+def test_ramps_up_and_down_take_the_same_steps():
+    up = Bench({108: 0})
+    up.ramps.start(108, 5, 1000)
+    up.run(1100)
+    down = Bench({108: 5})
+    down.ramps.start(108, 0, 1000)
+    down.run(1100)
+
+    assert [ms for ms, cc, value in up.sent] == [ms for ms, cc, value in down.sent] == [200, 400, 600, 800, 1000]
+
+
+def test_duration_in_beats():
+    bench = Bench({104: 20}, bpm=100)
+    bench.ramps.start(104, 100, 4, beats=True)
+    bench.run(3000)
+
+    # 4 beats at 100 BPM end at 2400 ms
+    assert bench.sent[-1] == (2400, 104, 100)
+    assert bench.sent[-2][0] == 2380
+
+
+def test_restart_continues_from_value_reached():
+    bench = Bench({108: 0})
+    bench.ramps.start(108, 100, 1000)
+    bench.run(500)
+    assert bench.sent[-1] == (500, 108, 50)
+
+    # Back down to 0 over 500 ms from where the first ramp got to
+    bench.sent.clear()
+    bench.ramps.start(108, 0, 500)
+    bench.run(1100)
+    assert bench.sent[0] == (520, 108, 48)
+    assert bench.sent[-1] == (1000, 108, 0)
+    assert len(bench.ramps.active) == 0
+
+
+def test_unknown_value_zero_duration_or_no_free_ramp_jumps():
+    bench = Bench({11: 0, 104: 0, 105: 0, 106: 0}, max_ramps=2)
+
+    # No known value, or no duration, the target is sent at once
+    bench.ramps.start(108, 90, 1000)
+    bench.ramps.start(104, 90, 0)
+    assert bench.sent == [(0, 108, 90), (0, 104, 90)]
+
+    bench.ramps.start(105, 90, 1000)
+    bench.ramps.start(106, 90, 1000)
+    assert len(bench.ramps.active) == 2
+
+    # Both ramps in use, the third CC goes straight to its target
+    bench.ramps.start(11, 90, 1000)
+    assert bench.sent[2:] == [(0, 11, 90)]
+    assert len(bench.ramps.active) == 2
+
+
+def test_parallel_ramps():
+    bench = Bench({104: 0, 105: 127})
+    bench.ramps.start(104, 127, 200)
+    bench.run(100)
+    bench.ramps.start(105, 0, 200)
+    bench.run(400)
+
+    drums = [(ms, value) for ms, cc, value in bench.sent if cc == 104]
+    bass = [(ms, value) for ms, cc, value in bench.sent if cc == 105]
+    assert drums[-1] == (200, 127)
+    assert bass[0] == (120, 115)
+    assert bass[-1] == (300, 0)
+
+
+def test_ticks_wrap():
+    start = TICKS_PERIOD - 300
+    bench = Bench({108: 0}, start=start)
+    bench.ramps.start(108, 100, 1000)
+    bench.run(start + 1100)
+
+    assert bench.sent == [(start + ms, 108, 100 * ms // 1000) for ms in range(INTERVAL_MS, 1001, INTERVAL_MS)]
+
+
+def test_ramp_key_runs_from_loop_stage(start_controller):
+    with open(os.path.join(SOURCE_DIR, "evm", "keymap.cfg")) as f:
+        keymap = f.read()
+    keymap = keymap.replace("key01=0:Arr.A:blue", "key01=5:FadeOut:blue") + "rmp00=FadeOut:VOLUME:0:400\n"
+    module, controller = start_controller("evm", keymap)
+    controller.midi_handler.cur_volume = 100
+    written = usb_midi.ports[1].written
+
+    controller._handle_key_press(1)
+    assert written == []
+
+    sent = []
+    for _ in range(500):
+        supervisor.advance(1)
+        controller.ramps.update()
+        while written:
+            sent.append((supervisor._now[0], written.pop(0)))
+
+    # CC11 on the MIDChan channel, down from 100 to 0 over 400 ms, a value every 20 ms
+    status = 0xB0 | controller.config.midi_out_channel
+    assert sent == [(ms, bytes((status, 11, 100 - 100 * ms // 400))) for ms in range(INTERVAL_MS, 401, INTERVAL_MS)]
+    assert controller.midi_handler.cur_volume == 0
@@ -0,0 +1,60 @@
+"""Setlist song lookup through the stride index, against the songs written to the file"""
+
+import pytest
+
+from evmcore import Setlist, SliderCC
+
+
+def write_setlist(drive, songs, comments=True):
+    """Write songs numbered from 0 with comment and blank lines between them, returns the file name"""
+
+    lines = ["# Setlist\n"]
+    for n in range(songs):
+        if comments and n % 7 == 3:
+            lines.append("\n# Set {}\n".format(n // 7))
+        lines.append("Song {}:Bank{}:LOWERS_CC={},VOICE1_CC={}:PLUGGED\r\n".format(n, n % 3, n % 128, 127 - n % 128))
+    drive.write("/setlist.cfg", "".join(lines))
+    return "/setlist.cfg"
+
+
+def expected(n):
+    return ("Song {}".format(n), "Bank{}".format(n % 3),
+            ((SliderCC.LOWERS_CC, n % 128), (SliderCC.VOICE1_CC, 127 - n % 128)), ("PLUGGED",))
+
+
+@pytest.mark.parametrize("songs, index_max, stride", [
+    (5000, 256, 32),
+    (5000, 64, 128),
+    (200, 256, 1),
+    (256, 256, 1),
+    (257, 256, 2),
+    (9, 4, 4),
+])
+def test_every_song_found_through_index(drive, songs, index_max, stride):
+    setlist = Setlist(write_setlist(drive, songs), index_max)
+
+    assert setlist.load()
+    assert setlist.count == songs
+    assert setlist.stride == stride
+    assert len(setlist.offsets) == (songs + stride - 1) // stride <= index_max
+
+    for n in range(songs):
+        assert setlist.select(n) == expected(n)
+        assert setlist.position == n
+
+
+def test_step_wraps(drive):
+    setlist = Setlist(write_setlist(drive, 5000), 256)
+    setlist.load()
+
+    assert setlist.step(-1) == expected(4999)
+    assert setlist.step(1) == expected(0)
+    assert setlist.step(33) == expected(33)
+    assert setlist.step(-34) == expected(4999)
+
+
+def test_no_setlist(drive):
+    setlist = Setlist("/setlist.cfg", 256)
+
+    assert not setlist.load()
+    assert setlist.select(0) is None
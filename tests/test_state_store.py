@@ -0,0 +1,129 @@
+"""StateStore records in a bytearray NVM, and the controller state saved when idle and restored at boot"""
+
+import microcontroller
+import pytest
+import supervisor
+from adafruit_seesaw.seesaw import Seesaw
+
+from evmcore import EncoderMode, ShiftKeyMode, StateStore
+
+OFFSET = 100
+ENCODERS = 4
+
+
+def layers(base, shift):
+    return [list(base), list(shift)]
+
+
+@pytest.fixture
+def nvm():
+    return bytearray(256)
+
+
+def test_round_trip(nvm):
+    volumes = layers((0, 64, 100, 127), (96, 1, 80, 33))
+    toggles = layers((False, True, False, True), (True, True, False, False))
+
+    store = StateStore(nvm, OFFSET, ENCODERS)
+    store.pack(EncoderMode.VOLUME, True, 3, volumes, toggles)
+    assert store.save()
+
+    # Only the record's bytes are written
+    assert nvm[:OFFSET] == bytes(OFFSET)
+    assert nvm[OFFSET + store.size:] == bytes(len(nvm) - OFFSET - store.size)
+
+    loaded = StateStore(nvm, OFFSET, ENCODERS)
+    assert loaded.load()
+    assert (loaded.encoder_mode(), loaded.shift_lock(), loaded.bank_index()) == (EncoderMode.VOLUME, True, 3)
+
+    restored_volumes = layers([0] * ENCODERS, [0] * ENCODERS)
+    restored_toggles = layers([False] * ENCODERS, [False] * ENCODERS)
+    loaded.restore_volumes(restored_volumes, restored_toggles)
+    assert restored_volumes == volumes
+    assert restored_toggles == toggles
+
+
+def test_round_trip_without_encoders(nvm):
+    store = StateStore(nvm, OFFSET, 0)
+    store.pack(EncoderMode.TEMPO, False, 1)
+    assert store.save()
+
+    loaded = StateStore(nvm, OFFSET, 0)
+    assert loaded.load()
+    assert (loaded.encoder_mode(), loaded.shift_lock(), loaded.bank_index()) == (EncoderMode.TEMPO, False, 1)
+
+
+@pytest.mark.parametrize("index", range(StateStore.HEADER_SIZE + 2 * ENCODERS))
+def test_bad_checksum_rejected(nvm, index):
+    store = StateStore(nvm, OFFSET, ENCODERS)
+    store.pack(EncoderMode.BANK, False, 2, layers((10, 20, 30, 40), (50, 60, 70, 80)), layers([True] * 4, [False] * 4))
+    store.save()
+
+    # Any one byte of the record changed, the checksum itself included
+    nvm[OFFSET + index] ^= 0x01
+
+    assert not StateStore(nvm, OFFSET, ENCODERS).load()
+
+
+def test_blank_and_other_layouts_rejected(nvm):
+    assert not StateStore(nvm, OFFSET, ENCODERS).load()
+
+    store = StateStore(nvm, OFFSET, ENCODERS)
+    store.pack(EncoderMode.ROTOR, False, 0, layers([0] * 4, [0] * 4), layers([False] * 4, [False] * 4))
+    store.save()
+
+    # A record saved for another encoder count is not read
+    assert not StateStore(nvm, OFFSET, 8).load()
+    assert not StateStore(nvm, OFFSET, 0).load()
+
+
+def test_written_only_when_changed(nvm):
+    volumes = layers((1, 2, 3, 4), (5, 6, 7, 8))
+    toggles = layers([False] * 4, [False] * 4)
+    store = StateStore(nvm, OFFSET, ENCODERS)
+
+    store.pack(EncoderMode.ROTOR, False, 0, volumes, toggles)
+    assert store.save()
+    store.pack(EncoderMode.ROTOR, False, 0, volumes, toggles)
+    assert not store.save()
+
+    volumes[1][3] = 9
+    store.pack(EncoderMode.ROTOR, False, 0, volumes, toggles)
+    assert store.save()
+    assert store.writes == 2
+
+
+def test_outside_nvm_is_not_available():
+    store = StateStore(bytearray(64), 60, ENCODERS)
+
+    store.pack(EncoderMode.ROTOR, False, 0, layers([0] * 4, [0] * 4), layers([False] * 4, [False] * 4))
+    assert not store.available()
+    assert not store.save()
+    assert not store.load()
+    assert not StateStore(None, 0, ENCODERS).load()
+
+
+def test_controller_state_survives_power_cycle(start_controller):
+    supervisor._now[0] = 1000
+    module, controller = start_controller("evmplus")
+
+    controller.state.encoder_mode = EncoderMode.VOLUME
+    controller.state.shift_mode = ShiftKeyMode.ACTIVE_LOCK
+    controller.state.quad_volumes[1][2] = 17
+    controller.quad_encoders_toggle[0][1] = True
+
+    # Saved once the keys and encoders have been idle long enough
+    controller.state.mark_activity()
+    controller._run_state()
+    assert microcontroller.nvm[controller.config.state_nvm] == 0
+    supervisor.advance(controller.config.state_quiet)
+    controller._run_state()
+    assert controller.state_store.writes == 1
+
+    Seesaw.boards.clear()
+    module, controller = start_controller("evmplus")
+
+    assert controller.state.encoder_mode == EncoderMode.VOLUME
+    assert controller.state.shift_mode == ShiftKeyMode.ACTIVE_LOCK
+    assert controller.state.quad_volumes[1][2] == 17
+    assert controller.quad_encoders_toggle[0][1]
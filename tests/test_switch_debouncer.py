@@ -0,0 +1,143 @@
+"""SwitchDebouncer edges from timed bulk GPIO reads of the quad encoder switches"""
+
+import pytest
+import supervisor
+import usb_midi
+from adafruit_seesaw.seesaw import Seesaw
+
+from conftest import load_profile
+from supervisor import TICKS_PERIOD
+
+# Switch pins of the Adafruit 5752 board, encoder 0 to encoder 3
+PINS = (12, 14, 17, 9)
+DEBOUNCE_MS = 20
+LONG_PRESS_MS = 800
+
+
+@pytest.fixture(scope="module")
+def evmplus():
+    return load_profile("evmplus")
+
+
+def gpio(*pressed):
+    """Bulk GPIO read with the switches at the given indexes pressed (pulled low)"""
+
+    bits = 0xFFFFFFFF
+    for i in pressed:
+        bits &= ~(1 << PINS[i])
+    return bits
+
+
+def feed(debouncer, timeline):
+    """Feed (ticks, pressed switches) reads and return the (ticks, switch, event) edges reported"""
+
+    edges = []
+    for ticks, pressed in timeline:
+        debouncer.update(gpio(*pressed), ticks % TICKS_PERIOD)
+        for i, event in enumerate(debouncer.events):
+            if event:
+                edges.append((ticks, i, event))
+    return edges
+
+
+def test_press_bounce_release(evmplus):
+    event = evmplus.SwitchEvent
+    debouncer = evmplus.SwitchDebouncer(PINS, DEBOUNCE_MS, LONG_PRESS_MS)
+
+    edges = feed(debouncer, [
+        (1000, ()), (1001, (0,)), (1004, ()), (1008, (0,)), (1015, ()), (1021, (0,)),
+        (1300, (0,)), (1301, ()), (1305, (0,)), (1310, ()), (1340, ()),
+    ])
+
+    assert edges == [(1001, 0, event.PRESS), (1301, 0, event.RELEASE)]
+    assert not debouncer.long_sent[0]
+
+
+def test_release_inside_debounce_is_taken_on_next_read(evmplus):
+    event = evmplus.SwitchEvent
+    debouncer = evmplus.SwitchDebouncer(PINS, DEBOUNCE_MS, LONG_PRESS_MS)
+
+    edges = feed(debouncer, [(1000, (1,)), (1010, ()), (1019, ()), (1020, ())])
+
+    assert edges == [(1000, 1, event.PRESS), (1020, 1, event.RELEASE)]
+
+
+def test_long_press_once_then_release(evmplus):
+    event = evmplus.SwitchEvent
+    debouncer = evmplus.SwitchDebouncer(PINS, DEBOUNCE_MS, LONG_PRESS_MS)
+
+    edges = feed(debouncer, [
+        (5000, (2,)), (5799, (2,)), (5800, (2,)), (6500, (2,)), (6600, ()),
+    ])
+
+    assert edges == [(5000, 2, event.PRESS), (5800, 2, event.LONG), (6600, 2, event.RELEASE)]
+    # Still set at the release, so the controller does not also toggle the part
+    assert debouncer.long_sent[2]
+
+    # The next press starts over
+    edges = feed(debouncer, [(7000, (2,)), (7100, ())])
+    assert edges == [(7000, 2, event.PRESS), (7100, 2, event.RELEASE)]
+    assert not debouncer.long_sent[2]
+
+
+def test_switches_are_independent(evmplus):
+    event = evmplus.SwitchEvent
+    debouncer = evmplus.SwitchDebouncer(PINS, DEBOUNCE_MS, LONG_PRESS_MS)
+
+    edges = feed(debouncer, [
+        (1000, (0,)), (1005, (0, 3)), (1500, (3,)), (1805, (3,)), (1900, ()),
+    ])
+
+    assert edges == [
+        (1000, 0, event.PRESS), (1005, 3, event.PRESS), (1500, 0, event.RELEASE),
+        (1805, 3, event.LONG), (1900, 3, event.RELEASE),
+    ]
+
+
+def test_ticks_wrap(evmplus):
+    event = evmplus.SwitchEvent
+    debouncer = evmplus.SwitchDebouncer(PINS, DEBOUNCE_MS, LONG_PRESS_MS)
+    start = TICKS_PERIOD - 10
+
+    # Bounce across the wrap is still ignored, and the long press is timed across it
+    edges = feed(debouncer, [
+        (start - 100, ()), (start, (0,)), (start + 5, ()), (start + 15, (0,)),
+        (start + LONG_PRESS_MS - 1, (0,)), (start + LONG_PRESS_MS, (0,)),
+        (start + 1000, ()),
+    ])
+
+    assert edges == [
+        (start, 0, event.PRESS),
+        (start + LONG_PRESS_MS, 0, event.LONG),
+        (start + 1000, 0, event.RELEASE),
+    ]
+
+
+def test_quad_switch_toggles_on_release_unless_held(start_controller):
+    supervisor._now[0] = 1000
+    module, controller = start_controller("evmplus")
+    board = Seesaw.boards[0x49]
+    toggles = controller.quad_encoders_toggle[0]
+    written = usb_midi.ports[1].written
+
+    def read(ms, pressed):
+        supervisor.advance(ms)
+        board.pins = gpio(0) if pressed else gpio()
+        written.clear()
+        controller._handle_quadencoder(controller.config)
+        return toggles[0], list(written)
+
+    # enc00 is LOWERS_CC (108) on MIDI channel 16 with the EncVol toggle volume of 80
+    assert read(100, True) == (False, [])
+    assert read(100, False) == (True, [bytes((0xBF, 108, 80))])
+    assert read(100, True) == (True, [])
+    assert read(100, False) == (False, [bytes((0xBF, 108, 0))])
+
+    # Held: the long press sets the toggle volume and the release leaves it alone
+    assert read(100, True) == (False, [])
+    assert read(LONG_PRESS_MS, True) == (True, [bytes((0xBF, 108, 80))])
+    assert read(100, False) == (True, [])
+
+
+def test_switch_pins_in_encoder_order(evmplus):
+    assert evmplus.QuadBoard.SWITCH_PINS == PINS
@@ -0,0 +1,148 @@
+"""Tempo detents and tap tempo against the EVM tempo known from its MIDI clock"""
+
+import time
+
+import pytest
+import supervisor
+import usb_midi
+from adafruit_midi.note_on import NoteOn
+
+from conftest import load_profile
+
+TEMPO_UP = bytes((0xF0, 0x26, 0x79, 0x03, 0x13, 0x7F, 0xF7))
+TEMPO_DOWN = bytes((0xF0, 0x26, 0x79, 0x03, 0x14, 0x7F, 0xF7))
+
+
+@pytest.fixture
+def controller(start_controller):
+    module, controller = start_controller("evm")
+    return controller
+
+
+def run_clock(controller, bpm, beats=2):
+    """Start the EVM MIDI clock and run it for some beats at bpm"""
+
+    start = supervisor._now[0]
+    controller.clock.realtime(0xFA, supervisor.ticks_ms())
+    for clock in range(1, beats * 24 + 1):
+        supervisor._now[0] = start + clock * 60000 // (bpm * 24)
+        controller.clock.realtime(0xF8, supervisor.ticks_ms())
+
+
+def tempo_steps(written):
+    """Tempo Up steps minus Tempo Down steps in the bytes written"""
+
+    sent = b"".join(written)
+    return sent.count(TEMPO_UP) - sent.count(TEMPO_DOWN)
+
+
+def tap(controller, monkeypatch, times_ms):
+    for ms in times_ms:
+        monkeypatch.setattr(time, "monotonic_ns", lambda ms=ms: ms * 1000000)
+        controller._process_tap()
+
+
+def test_tap_steps_from_running_clock_not_stale_target(controller, monkeypatch):
+    written = usb_midi.ports[1].written
+
+    # An earlier tap run set the EVM to 100 BPM, then the tempo was changed on the EVM itself
+    controller.tap_target = 100
+    run_clock(controller, 110)
+    assert controller.clock.bpm == 110
+
+    # Taps 500ms apart are 120 BPM: 10 steps up from the clock tempo
+    tap(controller, monkeypatch, (10000, 10500))
+    assert tempo_steps(written) == 10
+    assert controller.tap_target == 120
+
+
+def test_detents_step_from_running_clock(controller):
+    controller.tap_target = 100
+    run_clock(controller, 110)
+    controller.config.tempo_turn = 0
+
+    controller._process_tempo(3)
+
+    assert tempo_steps(usb_midi.ports[1].written) == 3
+    assert controller.tap_target == 113
+
+
+def test_tap_target_used_once_clock_stops(controller, monkeypatch):
+    run_clock(controller, 110)
+    controller.clock.realtime(0xFC, supervisor.ticks_ms())
+
+    # Without a running clock the last tempo set by the taps is the best known
+    tap(controller, monkeypatch, (10000, 10500))
+    tap(controller, monkeypatch, (10500 + 60000 // 130,))
+    assert controller.tap_target == controller.tap_tempo.bpm
+    assert tempo_steps(usb_midi.ports[1].written) == controller.tap_tempo.bpm - 110
+
+
+def test_detents_queue_tempo_for_display(controller):
+    run_clock(controller, 110)
+    display = controller.display
+
+    # Each detent only queues the text and the tempo, the display stage formats the label once
+    for _ in range(3):
+        controller._process_tempo(1)
+    assert (display.pending_text[3], display.pending_value[3], display.pending_suffix[3]) == ("TEMPO: ", 113, " BPM")
+
+    controller._update_display()
+    assert display.labels[3].text == "TEMPO: 113 BPM"
+
+
+def test_genos_encoder_applies_every_detent_of_a_pass(drive):
+    module = load_profile("generic")
+    controller = module.GenosController()
+    midi = controller.midi_handler.midi
+    written = usb_midi.ports[1].written
+
+    # Outside Tempo mode three detents turned between two loop passes send three C#2 encoder notes
+    controller.state.encoder_mode = module.EncoderMode.VOLUME
+    controller.macropad.encoder = 3
+    controller._handle_encoder()
+    notes = [message.note for message, channel in midi.sent if isinstance(message, NoteOn)]
+    assert notes == [0x31, 0x31, 0x31]
+    assert controller.state.encoder_position == 3
+    assert not controller.midi_handler.tempo_pending
+
+
+def test_genos_tempo_spin_is_one_sysex(drive):
+    module = load_profile("generic")
+    controller = module.GenosController()
+    midi = controller.midi_handler.midi
+    written = usb_midi.ports[1].written
+    assert controller.state.encoder_mode == module.EncoderMode.TEMPO
+
+    # A 30 detent spin over several reads of one loop pass, from 90 BPM, is one Tempo SysEx with the final tempo
+    for delta in (12, 10, 8):
+        controller._handle_encoder_change(delta)
+    assert written == []
+    controller.midi_handler.flush_tempo()
+    assert controller.midi_handler.cur_tempo == 120
+    assert written == [bytes((0xF0, 0x43, 0x7E, 0x01, 0x00, 0x1E, 0x42, 0x20, 0xF7))]
+    assert not [message for message, channel in midi.sent if isinstance(message, NoteOn)]
+
+    # Turned back through the loop pass path, nothing more to send until the next detents
+    written.clear()
+    controller.macropad.encoder = -5
+    controller._handle_encoder()
+    controller.midi_handler.flush_tempo()
+    controller.midi_handler.flush_tempo()
+    assert controller.midi_handler.cur_tempo == 115
+    assert len(written) == 1
+
+
+def test_genos_default_map_taps_tempo(drive, monkeypatch):
+    controller = load_profile("generic").GenosController()
+    written = usb_midi.ports[1].written
+
+    # The encoder switch locks the Shift layer, its last key is TAP
+    controller._handle_encoder_switch()
+    for ms in (10000, 10500):
+        monkeypatch.setattr(time, "monotonic_ns", lambda ms=ms: ms * 1000000)
+        controller._handle_key_press(11)
+
+    # Taps 500ms apart are 120 BPM, sent as one Tempo SysEx
+    assert controller.midi_handler.cur_tempo == 120
+    assert written == [bytes((0xF0, 0x43, 0x7E, 0x01, 0x00, 0x1E, 0x42, 0x20, 0xF7))]